@@ -0,0 +1,122 @@
+'''
+Provides persistent backends for the compile cache of Template.compile(), so
+generated code of dynamically compiled templates is shared by processes and
+survives restarts, instead of running the Parser and Compiler again.
+
+Keys are md5 hex digests of the template source bytes, compiler settings,
+compile options, Cheetah version and Python version, so they are the same in
+every process. Values are str made by dumpCompiled(), which contain the
+generated module code and the marshalled code object (marshal format and
+bytecode depend on the Python version, which is part of the key).
+
+A backend only needs two methods:
+
+get(key)
+  returns the cached value, or None
+set(key, val)
+  sets the value unconditionally
+'''
+import os
+import sys
+import marshal
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import md5
+
+from Cheetah.Version import Version
+
+# bump if the layout of cached values changed:
+_FORMAT = 1
+
+def genCacheKey(source, compilerSettings, *options):
+    """Generate a stable cache key.
+
+    source is the template source as str/unicode, compilerSettings is a dict,
+    and options are other values that affect the generated code, which must
+    have a stable repr().
+    """
+    if isinstance(source, unicode):
+        source = source.encode('utf-8')
+    settings = (compilerSettings or {}).items()
+    settings.sort()
+    m = md5(source)
+    m.update(repr((_FORMAT, Version, sys.version, settings, options)))
+    return m.hexdigest()
+
+def dumpCompiled(generatedModuleCode, outputEncoding, code=None):
+    """Make a cache value of generated module code, its encoding and the
+    compiled code object if any."""
+    return marshal.dumps((_FORMAT, generatedModuleCode, outputEncoding, code))
+
+def loadCompiled(val):
+    """Get (generatedModuleCode, outputEncoding, code object or None) from a
+    cache value, or None if the value is invalid."""
+    try:
+        item = marshal.loads(val)
+    except (ValueError, EOFError, TypeError):
+        return None
+    if not isinstance(item, tuple) or len(item)!=4 or item[0]!=_FORMAT:
+        return None
+    return item[1:]
+
+class AbstractCompileCache(object):
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, val):
+        raise NotImplementedError
+
+class FileCompileCache(AbstractCompileCache):
+    """Stores each compiled template as a file in a directory."""
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + '.cheetahc')
+
+    def get(self, key):
+        try:
+            f = open(self._path(key), 'rb')
+        except IOError:
+            return None
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def set(self, key, val):
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        path = self._path(key)
+        # write to a temp file first so readers never see a partial file:
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        f = open(tmp, 'wb')
+        try:
+            f.write(val)
+        finally:
+            f.close()
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # target exists on Windows, which was written by other process:
+            os.remove(tmp)
+
+class MemcachedCompileCache(AbstractCompileCache):
+    """Stores compiled templates in a memcache-style client, which has
+    get(key) and set(key, val, time) like python-memcached or the
+    memcache API of Google App Engine."""
+
+    def __init__(self, client, prefix='cheetah:', time=0):
+        self._client = client
+        self._prefix = prefix
+        self._time = time
+
+    def get(self, key):
+        return self._client.get(self._prefix + key)
+
+    def set(self, key, val):
+        self._client.set(self._prefix + key, val, self._time)
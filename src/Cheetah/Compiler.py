@@ -29,9 +29,12 @@ from Cheetah.Parser import Parser, ParseError, specialVarRE, \
      unicodeDirectiveRE, encodingDirectiveRE, escapedNewlineRE
 
 from Cheetah.NameMapper import NotFound, valueForName, valueFromSearchList, valueFromFrameOrSearchList
+from Cheetah.NameMapper import valueForNameChunks, valueFromSearchListChunks
 VFFSL=valueFromFrameOrSearchList
 VFSL=valueFromSearchList
 VFN=valueForName
+VFSLC=valueFromSearchListChunks
+VFNC=valueForNameChunks
 currentTime=time.time
 
 class Error(Exception): pass
@@ -43,6 +46,10 @@ _DEFAULT_COMPILER_SETTINGS = [
     ('allowSearchListAsMethArg', True, ''),
     ('useAutocalling', True, 'Detect and call callable objects in searchList, requires useNameMapper=True'),
     ('useStackFrames', True, 'Used for NameMapper.valueFromFrameOrSearchList rather than NameMapper.valueFromSearchList'),
+    # MODIFIED: split dotted names at compile time:
+    ('useNameMapperChunks', True, 'Pass dotted names split into chunks to NameMapper.valueFromSearchListChunks and NameMapper.valueForNameChunks, requires useStackFrames=False'),
+    # MODIFIED: optional optimizations of generated code:
+    ('optimizationLevel', 0, 'Optimize generated code: 1 leaves ## comments out of generated code so static text around them is written by one call, 2 also collects output of each outermost #for loop in a list which is joined once after the loop'),
     ('useErrorCatcher', False, 'Turn on the #errorCatcher directive for catching NameMapper errors, etc'),
     ('alwaysFilterNone', True, 'Filter out None prior to calling the #filter'),
     ('useFilters', True, 'If False, pass output through str()'),
@@ -246,10 +253,37 @@ class GenUtils(object):
         """
         defaultUseAC = self.setting('useAutocalling')
         useSearchList = self.setting('useSearchList')
+        useChunks = self.setting('useNameMapperChunks') and not self.setting('useStackFrames')
 
         nameChunks.reverse()
         name, useAC, remainder = nameChunks.pop()
         
+        if useChunks:
+            if not useSearchList:
+                firstDotIdx = name.find('.')
+                if firstDotIdx != -1:
+                    pythonCode = ('VFNC(' + name[:firstDotIdx] +
+                                  ',' + self._genNameChunks(name[firstDotIdx+1:]) +
+                                  ',' + repr(defaultUseAC and useAC) + ')'
+                                  + remainder)
+                else:
+                    pythonCode = name+remainder
+            else:
+                # same as the hack in NameMapper.valueFromSearchList:
+                if name.endswith('__raw__'):
+                    name = name[:-7]
+                pythonCode = ('VFSLC([locals()]+SL+[globals(), __builtin__],'
+                              + self._genNameChunks(name) + ','
+                              + repr(defaultUseAC and useAC) + ')'
+                              + remainder)
+            while nameChunks:
+                name, useAC, remainder = nameChunks.pop()
+                pythonCode = ('VFNC(' + pythonCode +
+                              ',' + self._genNameChunks(name) +
+                              ',' + repr(defaultUseAC and useAC) + ')'
+                              + remainder)
+            return pythonCode
+
         if not useSearchList:
             firstDotIdx = name.find('.')
             if firstDotIdx != -1 and firstDotIdx < len(name):
@@ -279,6 +313,12 @@ class GenUtils(object):
                           + remainder)
         return pythonCode
     
+    def _genNameChunks(self, name):
+        """Generate a tuple literal of dotted name split, e.g. 'a.b' ->
+        '("a","b",)', which is a constant in compiled code.
+        """
+        return '(' + ''.join(['"%s",' % chunk for chunk in name.split('.')]) + ')'
+
 ##################################################
 ## METHOD COMPILERS
 
@@ -315,6 +355,13 @@ class MethodCompiler(GenUtils):
 
         self._hasReturnStatement = False
         self._isGenerator = False
+
+        # MODIFIED: state of the #for loop whose output is collected:
+        self._collectingLoop = None
+        self._loopCount = 0
+        # indent levels of open try and closure blocks, which contain no
+        # collecting loop:
+        self._noCollectingIndentLevs = []
         
         
     def cleanupState(self):
@@ -341,6 +388,14 @@ class MethodCompiler(GenUtils):
             self._indentLev -=1
         else:
             raise Error('Attempt to dedent when the indentLev is 0')
+        # MODIFIED: mark end of collecting loop, which is finished by the next
+        # chunk unless it is 'else' of the loop:
+        loop = self._collectingLoop
+        if loop is not None and self._indentLev <= loop.indentLev:
+            loop.ended = True
+        levs = self._noCollectingIndentLevs
+        while levs and levs[-1] >= self._indentLev:
+            levs.pop()
 
     ## methods for final code wrapping
 
@@ -403,6 +458,9 @@ class MethodCompiler(GenUtils):
             filterArgs = ''
         if self.setting('includeRawExprInFilterArgs') and rawExpr:
             filterArgs += ', rawExpr=%s'%repr(rawExpr)
+            # MODIFIED: decide raw output at compile time, see Filters.WebSafe:
+            if not re.search(r'\braw\s*=', filterArgs):
+                filterArgs += ', raw=%r'%(rawExpr.find('__raw__')!=-1)
 
         if self.setting('alwaysFilterNone'):
             if rawExpr and rawExpr.find('\n')==-1 and rawExpr.find('\r')==-1:
@@ -432,6 +490,8 @@ class MethodCompiler(GenUtils):
         """Add the code for outputting the pending strConst without chopping off
         any whitespace from it.
         """
+        if self._collectingLoop is not None and self._collectingLoop.ended:
+            self._endCollectingLoop()
         if not self._pendingStrConstChunks:
             return
 
@@ -486,6 +546,9 @@ class MethodCompiler(GenUtils):
         self.addStrConst(text)
         
     def addMethComment(self, comm):
+        # MODIFIED: comments split static text into separate writes:
+        if self.setting('optimizationLevel') >= 1:
+            return
         offSet = self.setting('commentOffset')
         self.addChunk('#' + ' '*offSet + comm)
 
@@ -561,8 +624,55 @@ class MethodCompiler(GenUtils):
         self.addIndentingDirective(expr, lineCol=lineCol)
         
     def addFor(self, expr, lineCol=None):
+        # MODIFIED: collect output of the outermost loop in a list:
+        if (self.setting('optimizationLevel') >= 2
+            and self._collectingLoop is None
+            and not self._noCollectingIndentLevs):
+            self.commitStrConst()
+            self._startCollectingLoop()
         self.addIndentingDirective(expr, lineCol=lineCol)
 
+    def _startCollectingLoop(self):
+        class LoopDetails(object):
+            pass
+        loop = LoopDetails()
+        self._loopCount += 1
+        loop.ID = '_%d' % self._loopCount
+        loop.indentLev = self._indentLev
+        # code before the loop is inserted here when the loop ends:
+        loop.startIndex = len(self._methodBodyChunks)
+        loop.ended = False
+        loop.isSafe = True
+        self._collectingLoop = loop
+
+    def _endCollectingLoop(self):
+        """Insert code that collects the loop output by list.append() before
+        the loop, and code that writes the joined output after the loop.
+
+        Nothing is inserted if the loop contains code that may leave it with
+        the collecting transaction, like #return, #stop or #yield.
+        """
+        loop = self._collectingLoop
+        self._collectingLoop = None
+        if not loop.isSafe:
+            return
+        ID = loop.ID
+        ind = '\n' + self._indent * loop.indentLev
+        self._methodBodyChunks[loop.startIndex:loop.startIndex] = [
+            ind + '_orig_trans%(ID)s = trans' % locals(),
+            ind + 'trans = _loopCollector%(ID)s = CollectingTransaction()' % locals(),
+            ind + 'write = _loopCollector%(ID)s.response().write' % locals()]
+        self._methodBodyChunks.extend([
+            ind + 'trans = _orig_trans%(ID)s' % locals(),
+            ind + 'write = trans.response().write',
+            ind + 'write(_loopCollector%(ID)s.response().getvalue())' % locals(),
+            ind + 'del _loopCollector%(ID)s' % locals(),
+            ind + 'del _orig_trans%(ID)s' % locals()])
+
+    def _disableCollectingLoop(self):
+        if self._collectingLoop is not None:
+            self._collectingLoop.isSafe = False
+
     def addRepeat(self, expr, lineCol=None):
         #the _repeatCount stuff here allows nesting of #repeat directives        
         self._repeatCount = getattr(self, "_repeatCount", -1) + 1
@@ -580,6 +690,10 @@ class MethodCompiler(GenUtils):
         self.commitStrConst()
         if dedent:
             self.dedent()
+            # MODIFIED: 'else' of collecting loop, which is not ended:
+            loop = self._collectingLoop
+            if loop is not None and loop.ended and loop.indentLev==self._indentLev:
+                loop.ended = False
         if not expr[-1] == ':':
             expr = expr  + ':'
             
@@ -627,10 +741,15 @@ class MethodCompiler(GenUtils):
                 chunk += '=' + arg[1]
             argStringChunks.append(chunk)
         signature = "def " + functionName + "(" + ','.join(argStringChunks) + "):"
+        # MODIFIED: write must not be assigned in closure:
+        self._disableCollectingLoop()
+        self._noCollectingIndentLevs.append(self._indentLev)
         self.addIndentingDirective(signature)
         self.addChunk('#'+parserComment)
 
     def addTry(self, expr, lineCol=None):
+        # MODIFIED: exception may leave loop with the collecting transaction:
+        self._noCollectingIndentLevs.append(self._indentLev)
         self.addIndentingDirective(expr, lineCol=lineCol)
         
     def addExcept(self, expr, dedent=True, lineCol=None):
@@ -641,11 +760,13 @@ class MethodCompiler(GenUtils):
             
     def addReturn(self, expr):
         assert not self._isGenerator
+        self._disableCollectingLoop()
         self.addChunk(expr)
         self._hasReturnStatement = True
 
     def addYield(self, expr):
         assert not self._hasReturnStatement
+        self._disableCollectingLoop()
         self._isGenerator = True
         if expr.replace('yield', '').strip():
             self.addChunk(expr)
@@ -683,6 +804,7 @@ class MethodCompiler(GenUtils):
 
     def addPSP(self, PSP):
         self.commitStrConst()
+        self._disableCollectingLoop()
         autoIndent = False
         if PSP[0] == '=':
             PSP = PSP[1:]
@@ -924,6 +1046,7 @@ class MethodCompiler(GenUtils):
         return self.nextCacheID()
 
     def setTransform(self, transformer, isKlass):
+        self._disableCollectingLoop()
         self.addChunk('trans = TransformerTransaction()')
         self.addChunk('trans._response = trans.response()')
         self.addChunk('trans._response._filter = %s' % transformer)
@@ -1084,6 +1207,7 @@ class AutoMethodCompiler(MethodCompiler):
         self.addChunk('')
         
     def addStop(self, expr=None):
+        self._disableCollectingLoop()
         self.addChunk('return _dummyTrans and trans.response().getvalue() or ""')
 
     def addMethArg(self, name, defVal=None):
@@ -1328,7 +1452,8 @@ class ClassCompiler(GenUtils):
     def addAttribute(self, attribExpr):
         ## first test to make sure that the user hasn't used any fancy Cheetah syntax
         #  (placeholders, directives, etc.) inside the expression 
-        if attribExpr.find('VFN(') != -1 or attribExpr.find('VFFSL(') != -1:
+        if attribExpr.find('VFN(') != -1 or attribExpr.find('VFFSL(') != -1 \
+                or attribExpr.find('VFNC(') != -1 or attribExpr.find('VFSLC(') != -1:
             raise ParseError(self,
                              'Invalid #attr directive.' +
                              ' It should only contain simple Python literals.')
@@ -1625,6 +1750,7 @@ class ModuleCompiler(SettingsManager, GenUtils):
             "from Cheetah.Template import Template",
             "from Cheetah.DummyTransaction import *",
             "from Cheetah.NameMapper import NotFound, valueForName, valueFromSearchList, valueFromFrameOrSearchList",
+            "from Cheetah.NameMapper import valueForNameChunks, valueFromSearchListChunks",
             "from Cheetah.CacheRegion import CacheRegion",
             "import Cheetah.Filters as Filters",
             "import Cheetah.ErrorCatchers as ErrorCatchers",
@@ -1647,6 +1773,8 @@ class ModuleCompiler(SettingsManager, GenUtils):
             "VFFSL=valueFromFrameOrSearchList",
             "VFSL=valueFromSearchList",
             "VFN=valueForName",
+            "VFSLC=valueFromSearchListChunks",
+            "VFNC=valueForNameChunks",
             "currentTime=time.time",
             ]
         
@@ -83,6 +83,74 @@ class DummyTransaction(object):
         return self._response
 
 
+# MODIFIED: response whose write() is list.append(), used by loops compiled
+# with optimizationLevel 2:
+class CollectingResponse(DummyResponse):
+    '''
+        A Response class whose write() is append() of the chunk list, so
+        writing a chunk is not a call of Python method.
+    '''
+    def __init__(self):
+        super(CollectingResponse, self).__init__()
+        self.write = self._outputChunks.append
+
+
+class CollectingTransaction(DummyTransaction):
+    def __init__(self, *args, **kwargs):
+        super(CollectingTransaction, self).__init__(*args, **kwargs)
+        self._response = CollectingResponse()
+
+
+# MODIFIED: streaming response which writes to a file-like object:
+class StreamingResponse(DummyResponse):
+    '''
+        A Response class that encodes chunks and writes them to a file-like
+        object, like response.out of webapp, instead of keeping all chunks
+        until getvalue(). Chunks are buffered until bufferSize chars, so the
+        file-like object is not called for every small chunk.
+    '''
+    def __init__(self, out, encoding='utf-8', bufferSize=8192):
+        super(StreamingResponse, self).__init__()
+        self._out = out
+        self._encoding = encoding
+        self._bufferSize = bufferSize
+        self._bufferedSize = 0
+
+    def write(self, value):
+        if type(value) is not unicode:
+            value = self.safeConvert(value)
+        self._outputChunks.append(value)
+        self._bufferedSize += len(value)
+        if self._bufferedSize >= self._bufferSize:
+            self.flush()
+
+    def flush(self):
+        if self._outputChunks:
+            self._out.write(u''.join(self._outputChunks).encode(self._encoding))
+            self._outputChunks = []
+            self._bufferedSize = 0
+
+    def getvalue(self, outputChunks=None):
+        # everything was written to out:
+        self.flush()
+        return ''
+
+
+class StreamingTransaction(DummyTransaction):
+    '''
+        A Transaction class whose response writes encoded output to a
+        file-like object, see StreamingResponse. Pass it to respond() of a
+        template, and flush() its response at the end:
+
+            trans = StreamingTransaction(out)
+            t.respond(trans=trans)
+            trans.response().flush()
+    '''
+    def __init__(self, out, encoding='utf-8', bufferSize=8192):
+        super(StreamingTransaction, self).__init__()
+        self._response = StreamingResponse(out, encoding, bufferSize)
+
+
 class TransformerResponse(DummyResponse):
     def __init__(self, *args, **kwargs):
         super(TransformerResponse, self).__init__(*args, **kwargs)
@@ -10,6 +10,45 @@ import sys
 # '<', '>' or '&' since those will have been done already.
 webSafeEntities = {' ': '&nbsp;', '"': '&quot;'}
 
+# MODIFIED: escapes of WebSafe as (char, entity), copied from cgi.escape().
+# '&' must be the first:
+webSafeEscapes = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'), ('"', '&quot;'))
+
+# escaped short unicode values are memorized, since author names, titles 
+# and category labels are rendered again and again:
+WEBSAFE_MEMO_MAX_LEN = 64
+WEBSAFE_MEMO_SIZE = 1024
+_webSafeMemo = {}
+
+# escapes with additional chars, key is value of 'also':
+_webSafeAlsoEscapes = {}
+
+def _getWebSafeEscapes(also):
+    if not isinstance(also, basestring):
+        also = tuple(also)
+    escapes = _webSafeAlsoEscapes.get(also)
+    if escapes is None:
+        L = list(webSafeEscapes)
+        for k in also:
+            if k in webSafeEntities:
+                v = webSafeEntities[k]
+            else:
+                v = "&#%s;" % ord(k)
+            L.append((k, v))
+        escapes = _webSafeAlsoEscapes[also] = tuple(L)
+    return escapes
+
+def _escape(s, escapes):
+    '''
+    Escape s by one pass over escapes, and only chars that s contains are 
+    replaced. unicode.translate() is not used since it is much slower than 
+    replace() on Python 2.
+    '''
+    for k, v in escapes:
+        if k in s:
+            s = s.replace(k, v)
+    return s
+
 class Filter(object):
     """A baseclass for the Cheetah Filters."""
     
@@ -126,31 +165,35 @@ class MaxLen(Filter):
         return output
 
 class WebSafe(Filter):
-    """Escape HTML entities in $placeholders.
+    """Escape HTML entities in $placeholders, except placeholders that have 
+    '__raw__' in name.
     (Modified version)
+
+    Whether a placeholder is raw is decided by compiler and passed as 'raw', 
+    or by 'rawExpr' if the template was compiled before.
     """
-    def filter(self, val, **kw):
-        s = super(WebSafe, self).filter(val, **kw)
-        if 'rawExpr' in kw:
-            raw_expr = kw['rawExpr']
-            if raw_expr.find(u'__raw__')!=(-1):
-                return s
-        # These substitutions are copied from cgi.escape().
-        s = s.replace("&", "&amp;") # Must be done first!
-        s = s.replace("<", "&lt;")
-        s = s.replace(">", "&gt;")
-        s = s.replace("\"", "&quot;")
-        # Process the additional transformations if any.
-        if 'also' in kw:
-            also = kw['also']
-            entities = webSafeEntities   # Global variable.
-            for k in also:
-                if k in entities:
-                    v = entities[k]
-                else:
-                    v = "&#%s;" % ord(k)
-                s = s.replace(k, v)
-        return s
+    def filter(self, val, raw=None, rawExpr=None, also=None, **kw):
+        if type(val) is unicode:
+            s = val
+        elif val is None:
+            return u''
+        else:
+            s = super(WebSafe, self).filter(val, **kw)
+        if raw is None:
+            raw = rawExpr is not None and rawExpr.find(u'__raw__')!=(-1)
+        if raw:
+            return s
+        if also:
+            return _escape(s, _getWebSafeEscapes(also))
+        if type(s) is not unicode or len(s) > WEBSAFE_MEMO_MAX_LEN:
+            return _escape(s, webSafeEscapes)
+        escaped = _webSafeMemo.get(s)
+        if escaped is None:
+            escaped = _escape(s, webSafeEscapes)
+            if len(_webSafeMemo) >= WEBSAFE_MEMO_SIZE:
+                _webSafeMemo.clear()
+            _webSafeMemo[s] = escaped
+        return escaped
 
 
 class Strip(Filter):
@@ -143,6 +143,7 @@ __author__ = "Tavis Rudd <tavis@damnsimple.com>," +\
              "\nChuck Esterbrook <echuck@mindspring.com>"
 __revision__ = "$Revision: 1.32 $"[11:-2]
 import types
+import datetime
 from types import StringType, InstanceType, ClassType, TypeType
 from pprint import pformat
 import inspect
@@ -157,6 +158,8 @@ __all__ = ['NotFound',
            'valueFromSearchList',
            'valueFromFrameOrSearchList',
            'valueFromFrame',
+           'valueForNameChunks',
+           'valueFromSearchListChunks',
            ]
 
 if not hasattr(inspect.imp, 'get_suffixes'):
@@ -273,6 +276,176 @@ def valueFromSearchList(searchList, name, executeCallables=False):
                                 executeCallables=executeCallables)
     _raiseNotFoundException(key, searchList)
 
+## MODIFIED: fast path for names that are split into chunks at compile time.
+## How a key is looked up on an object, and whether a value is autocalled, 
+## are decided once per (type, key) and per type, but only for types whose 
+## instances can not change the decision. Other objects go through the same 
+## steps as _valueForName, so results are the same.
+
+# builtin types whose instances have no attributes of their own:
+_PLAIN_TYPES = frozenset([dict, list, tuple, str, unicode, int, long, float, 
+                          bool, types.NoneType, types.BuiltinFunctionType,
+                          datetime.datetime, datetime.date, datetime.time])
+
+# builtin base classes that look up attributes as object does:
+_GENERIC_GETATTR_TYPES = frozenset([object, dict, list, tuple, str, unicode,
+                                    int, long, float, types.ModuleType])
+
+# attributes of dict instance:
+_DICT_ATTRS = frozenset([name for name in dir(dict) if hasattr({}, name)])
+
+_LOOKUP_GENERIC = 0  # same as _valueForName
+_LOOKUP_ATTR = 1     # getattr(obj, key)
+_LOOKUP_ITEM = 2     # obj[key], and obj has 'has_key'
+_LOOKUP_NO_KEY = 3   # obj[key], and obj has no 'has_key'
+_LOOKUP_INSTANCE = 4 # obj.__dict__[key] if exists, otherwise as _LOOKUP_ITEM
+_LOOKUP_INSTANCE_NO_KEY = 5 # obj.__dict__[key] if exists, otherwise as _LOOKUP_NO_KEY
+
+_AUTOCALL_GENERIC = 0
+_AUTOCALL_NEVER = 1
+_AUTOCALL_ALWAYS = 2
+# functions and methods are called unless they have attribute 'mro', see 
+# _isInstanceOrClass, which can only be found in __dict__ of function:
+_AUTOCALL_FUNCTION = 3
+_AUTOCALL_METHOD = 4
+
+# clear strategies if too many types are created, e.g. by re-compiling:
+_MAX_STRATEGIES = 10000
+
+_lookupStrategies = {}
+_autocallStrategies = {}
+
+def _hasGenericGetattr(t):
+    if t is InstanceType or t is ClassType:
+        return False
+    for c in t.__mro__:
+        if c in _GENERIC_GETATTR_TYPES:
+            continue
+        if c.__module__=='__builtin__' or '__getattr__' in c.__dict__ or '__getattribute__' in c.__dict__:
+            return False
+    return True
+
+def _lookupStrategy(obj, key):
+    t = type(obj)
+    try:
+        return _lookupStrategies[(t, key)]
+    except KeyError:
+        pass
+    if t in _PLAIN_TYPES:
+        if hasattr(obj, key):
+            strategy = _LOOKUP_ATTR
+        else:
+            strategy = hasattr(obj, 'has_key') and _LOOKUP_ITEM or _LOOKUP_NO_KEY
+    elif _hasGenericGetattr(t) and hasattr(obj, '__dict__') and not hasattr(t, key):
+        # key is not a class attribute, so it can only be an instance attribute:
+        strategy = hasattr(t, 'has_key') and _LOOKUP_INSTANCE or _LOOKUP_INSTANCE_NO_KEY
+    else:
+        strategy = _LOOKUP_GENERIC
+    if len(_lookupStrategies) >= _MAX_STRATEGIES:
+        _lookupStrategies.clear()
+    _lookupStrategies[(t, key)] = strategy
+    return strategy
+
+def _autocallStrategy(obj):
+    t = type(obj)
+    try:
+        return _autocallStrategies[t]
+    except KeyError:
+        pass
+    if t in _PLAIN_TYPES:
+        if hasattr(obj, '__call__') and not _isInstanceOrClass(obj):
+            strategy = _AUTOCALL_ALWAYS
+        else:
+            strategy = _AUTOCALL_NEVER
+    elif t is types.FunctionType:
+        strategy = _AUTOCALL_FUNCTION
+    elif t is types.MethodType:
+        strategy = _AUTOCALL_METHOD
+    else:
+        strategy = _AUTOCALL_GENERIC
+    if len(_autocallStrategies) >= _MAX_STRATEGIES:
+        _autocallStrategies.clear()
+    _autocallStrategies[t] = strategy
+    return strategy
+
+def _hasKeyFast(obj, key):
+    if type(obj) is dict:
+        return key in obj or key in _DICT_ATTRS
+    strategy = _lookupStrategy(obj, key)
+    if strategy==_LOOKUP_ATTR:
+        return True
+    if strategy==_LOOKUP_NO_KEY:
+        return False
+    if strategy==_LOOKUP_ITEM:
+        return key in obj
+    if strategy==_LOOKUP_INSTANCE_NO_KEY:
+        return key in obj.__dict__
+    if strategy==_LOOKUP_INSTANCE:
+        return key in obj.__dict__ or key in obj
+    return hasKey(obj, key)
+
+def _valueForNameChunks(obj, nameChunks, executeCallables=False):
+    for key in nameChunks:
+        if type(obj) is dict:
+            # models passed as searchList are plain dicts:
+            if key in _DICT_ATTRS:
+                nextObj = getattr(obj, key)
+            else:
+                nextObj = obj[key]
+        else:
+            strategy = _lookupStrategy(obj, key)
+            if strategy==_LOOKUP_ATTR:
+                nextObj = getattr(obj, key)
+            elif strategy>=_LOOKUP_INSTANCE and key in obj.__dict__:
+                nextObj = obj.__dict__[key]
+            elif strategy==_LOOKUP_GENERIC:
+                try:
+                    nextObj = getattr(obj, key)
+                except AttributeError:
+                    try:
+                        nextObj = obj[key]
+                    except TypeError:
+                        _raiseNotFoundException(key, obj)
+            else:
+                try:
+                    nextObj = obj[key]
+                except TypeError:
+                    _raiseNotFoundException(key, obj)
+        if executeCallables:
+            strategy = _autocallStrategy(nextObj)
+            if strategy==_AUTOCALL_METHOD:
+                if type(nextObj.im_func) is types.FunctionType:
+                    call = not 'mro' in nextObj.im_func.__dict__
+                else:
+                    strategy = _AUTOCALL_GENERIC
+            if strategy==_AUTOCALL_GENERIC:
+                call = hasattr(nextObj, '__call__') and not _isInstanceOrClass(nextObj)
+            elif strategy==_AUTOCALL_FUNCTION:
+                call = not 'mro' in nextObj.__dict__
+            elif strategy!=_AUTOCALL_METHOD:
+                call = strategy==_AUTOCALL_ALWAYS
+            if call:
+                obj = nextObj()
+                continue
+        obj = nextObj
+    return obj
+
+def valueForNameChunks(obj, nameChunks, executeCallables=False):
+    """Same as valueForName but name is split into tuple of chunks."""
+    try:
+        return _valueForNameChunks(obj, nameChunks, executeCallables)
+    except NotFound, e:
+        _wrapNotFoundException(e, fullName='.'.join(nameChunks), namespace=obj)
+
+def valueFromSearchListChunks(searchList, nameChunks, executeCallables=False):
+    """Same as valueFromSearchList but name is split into tuple of chunks,
+    and '__raw__' is already removed."""
+    key = nameChunks[0]
+    for namespace in searchList:
+        if _hasKeyFast(namespace, key):
+            return _valueForNameChunks(namespace, nameChunks, executeCallables)
+    _raiseNotFoundException(key, searchList)
+
 def _namespaces(callerFrame, searchList=None):
     yield callerFrame.f_locals
     if searchList:
@@ -58,6 +58,7 @@ from Cheetah.Utils.Indenter import Indenter      # Used in Template.__init__ and
                                                  # placeholders
 from Cheetah.NameMapper import NotFound, valueFromSearchList
 from Cheetah.CacheStore import MemoryCacheStore, MemcachedCacheStore
+from Cheetah import CompileCache
 from Cheetah.CacheRegion import CacheRegion
 from Cheetah.Utils.WebInputMixin import _Converter, _lookup, NonNumericInputError
 
@@ -289,6 +290,8 @@ class Template(Servlet):
     #   class AdvCachingTemplate(Template):
     #       _CHEETAH_compileCache = MemoryOrFileCache()
     _CHEETAH_compileLock = Lock() # used to prevent race conditions
+    # MODIFIED: persistent backend shared by processes, see Cheetah.CompileCache:
+    _CHEETAH_persistentCompileCache = None
     _CHEETAH_defaultMainMethodName = None
     _CHEETAH_compilerSettings = None
     _CHEETAH_compilerClass = Compiler
@@ -340,6 +343,7 @@ class Template(Servlet):
                 cacheDirForModuleFiles=Unspecified,
                 commandlineopts=None,
                 keepRefToGeneratedCode=Unspecified,                
+                compileCache=Unspecified,
                 ):
         
         """
@@ -495,6 +499,14 @@ class Template(Servlet):
 
               See notes on cacheModuleFilesForTracebacks.
 
+            - compileCache (a backend in Cheetah.CompileCache, or None)
+              Default: Template._CHEETAH_persistentCompileCache=None
+
+              If set and the in-memory cache (see useCache) misses, generated
+              code and compiled code object are loaded from this backend by a
+              key that is stable between processes, so the Parser and Compiler
+              run only once for the same source, settings and options.
+
             - preprocessors
               Default: Template._CHEETAH_preprocessors=None
 
@@ -662,6 +674,9 @@ class Template(Servlet):
         if cacheDirForModuleFiles is Unspecified:
             cacheDirForModuleFiles = klass._CHEETAH_cacheDirForModuleFiles
 
+        if compileCache is Unspecified:
+            compileCache = klass._CHEETAH_persistentCompileCache
+
         if not isinstance(cacheDirForModuleFiles, (types.NoneType, basestring)):
             raise TypeError(errmsg %
                             ('cacheDirForModuleFiles', 'string or None'))
@@ -725,10 +740,20 @@ class Template(Servlet):
                 pass
         outputEncoding = 'ascii'
         compiler = None
+        compileCacheKey = None
+        compiledCode = None
+        generatedModuleCode = None
         if useCache and cacheHash and cacheHash in klass._CHEETAH_compileCache:
             cacheItem = klass._CHEETAH_compileCache[cacheHash]
             generatedModuleCode = cacheItem.code
-        else:
+        elif compileCache is not None and (source or isinstance(file, basestring)):
+            compileCacheKey, compiled = klass._loadFromCompileCache(
+                compileCache, source, file, compilerSettings, compilerClass,
+                moduleName, className, mainMethodName, baseclassName,
+                commandlineopts)
+            if compiled:
+                generatedModuleCode, outputEncoding, compiledCode = compiled
+        if generatedModuleCode is None:
             compiler = compilerClass(source, file,
                                      moduleName=moduleName,
                                      mainClassName=className,
@@ -742,6 +767,9 @@ class Template(Servlet):
             outputEncoding = compiler.getModuleEncoding()
 
         if not returnAClass:
+            if compileCacheKey and compiler:
+                klass._saveToCompileCache(compileCache, compileCacheKey,
+                                          generatedModuleCode, outputEncoding)
             # This is a bit of a hackish solution to make sure we're setting the proper 
             # encoding on generated code that is destined to be written to a file
             if not outputEncoding == 'ascii':
@@ -781,7 +809,9 @@ class Template(Servlet):
                     setattr(mod, baseclassName, baseclassValue)
                 ##
                 try:
-                    co = compile(generatedModuleCode, __file__, 'exec')
+                    co = compiledCode
+                    if co is None:
+                        co = compile(generatedModuleCode, __file__, 'exec')
                     exec(co, mod.__dict__)
                 except SyntaxError, e:
                     try:
@@ -802,6 +832,10 @@ class Template(Servlet):
             finally:
                 klass._CHEETAH_compileLock.release()
 
+            if compileCacheKey and compiledCode is None:
+                klass._saveToCompileCache(compileCache, compileCacheKey,
+                                          generatedModuleCode, outputEncoding, co)
+
             templateClass = getattr(mod, className)
 
             if (cacheCompilationResults
@@ -826,6 +860,50 @@ class Template(Servlet):
                 templateClass._CHEETAH_compilerInstance = compiler
             return templateClass
 
+    @classmethod
+    def _loadFromCompileCache(klass, compileCache, source, file,
+                              compilerSettings, compilerClass, moduleName,
+                              className, mainMethodName, baseclassName,
+                              commandlineopts):
+        """Returns (key, (generatedModuleCode, outputEncoding, code object
+        or None)) from the persistent compile cache, or (key, None) if not
+        found, or (None, None) if the cache can not be used.
+        """
+        try:
+            if not source:
+                f = open(file, 'rb')
+                try:
+                    source = f.read()
+                finally:
+                    f.close()
+            settings = DEFAULT_COMPILER_SETTINGS.items()
+            settings.sort()
+            shbang = commandlineopts and commandlineopts.shbang or None
+            key = CompileCache.genCacheKey(source, compilerSettings,
+                    file, moduleName, className, mainMethodName, baseclassName,
+                    compilerClass.__module__, compilerClass.__name__,
+                    shbang, settings)
+        except Exception, e:
+            logging.warn('Cannot make key of compile cache: %s' % e)
+            return None, None
+        try:
+            val = compileCache.get(key)
+        except Exception, e:
+            logging.warn('Cannot load from compile cache: %s' % e)
+            return key, None
+        if not val:
+            return key, None
+        return key, CompileCache.loadCompiled(val)
+
+    @classmethod
+    def _saveToCompileCache(klass, compileCache, key, generatedModuleCode,
+                            outputEncoding, code=None):
+        try:
+            compileCache.set(key, CompileCache.dumpCompiled(
+                generatedModuleCode, outputEncoding, code))
+        except Exception, e:
+            logging.warn('Cannot save to compile cache: %s' % e)
+
     @classmethod
     def subclass(klass, *args, **kws):
         """Takes the same args as the .compile() classmethod and returns a
@@ -1561,6 +1639,14 @@ class Template(Servlet):
     def _handleCheetahInclude(self, srcArg, trans=None, includeFrom='file', raw=False):        
         """Called at runtime to handle #include directives.
         """
+        # MODIFIED: a Template instance is rendered into the same transaction,
+        # so it can be embedded lazily instead of being rendered to a string:
+        if isinstance(srcArg, Template):
+            if raw:
+                trans.response().write(srcArg.respond())
+            else:
+                srcArg.respond(trans)
+            return
         _includeID = srcArg            
         if _includeID not in self._CHEETAH__cheetahIncludes:
             if not raw:
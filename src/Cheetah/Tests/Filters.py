@@ -65,6 +65,58 @@ def foo(self):
         template = str(template)
         assert template, (template, 'We should have some content here...')
 
+class WebSafeFilterTest(unittest.TestCase):
+    '''
+        Test the modified WebSafe filter
+    '''
+    def setUp(self):
+        Cheetah.Filters._webSafeMemo.clear()
+        self.filter = Cheetah.Filters.WebSafe().filter
+
+    def test_Escape(self):
+        assert self.filter(u'<a href="x">Tom & Jerry</a>') == u'&lt;a href=&quot;x&quot;&gt;Tom &amp; Jerry&lt;/a&gt;'
+        assert self.filter(u'&lt;') == u'&amp;lt;'
+        assert self.filter(None) == u''
+        assert self.filter(123) == u'123'
+        # str is escaped as str:
+        assert self.filter('a<b') == 'a&lt;b'
+
+    def test_NothingToEscape(self):
+        s = u'Michael Liao' * 10
+        assert self.filter(s) is s
+
+    def test_Memo(self):
+        s = u'Tom & Jerry'
+        assert self.filter(s) == u'Tom &amp; Jerry'
+        assert Cheetah.Filters._webSafeMemo[s] == u'Tom &amp; Jerry'
+        assert self.filter(s) is self.filter(s)
+        long = u'&' * (Cheetah.Filters.WEBSAFE_MEMO_MAX_LEN + 1)
+        assert self.filter(long) == u'&amp;' * len(long)
+        assert long not in Cheetah.Filters._webSafeMemo
+        for i in range(Cheetah.Filters.WEBSAFE_MEMO_SIZE + 10):
+            self.filter(u'<%d>' % i)
+        assert len(Cheetah.Filters._webSafeMemo) <= Cheetah.Filters.WEBSAFE_MEMO_SIZE
+
+    def test_Also(self):
+        assert self.filter(u'a b<c', also=u' ') == u'a&nbsp;b&lt;c'
+        assert self.filter(u"a'b", also=[u"'"]) == u'a&#39;b'
+
+    def test_Raw(self):
+        assert self.filter(u'<b>', raw=True) == u'<b>'
+        assert self.filter(u'<b>', raw=False, rawExpr=u'$x__raw__') == u'&lt;b&gt;'
+        # templates compiled without 'raw':
+        assert self.filter(u'<b>', rawExpr=u'$x__raw__') == u'<b>'
+        assert self.filter(u'<b>', rawExpr=u'$x') == u'&lt;b&gt;'
+
+    def test_Template(self):
+        template = '$x ${x__raw__} $x.upper()'
+        ns = {'x' : u'<i>', 'x__raw__' : u'<i>'}
+        t = Cheetah.Template.Template(template, searchList=[ns], filter='WebSafe')
+        assert unicode(t) == u'&lt;i&gt; <i> &lt;I&gt;', unicode(t)
+        code = Cheetah.Template.Template.compile(template, returnAClass=False, compilerSettings={'includeRawExprInFilterArgs' : True})
+        assert code.find('raw=True') != -1
+        assert code.find('raw=False') != -1
+
 
 if __name__ == '__main__':
     unittest.main()
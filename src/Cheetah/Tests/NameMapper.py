@@ -8,7 +8,8 @@ import os.path
 
 import unittest
 from Cheetah.NameMapper import NotFound, valueForKey, \
-     valueForName, valueFromSearchList, valueFromFrame, valueFromFrameOrSearchList
+     valueForName, valueFromSearchList, valueFromFrame, valueFromFrameOrSearchList, \
+     valueForNameChunks, valueFromSearchListChunks
 
 
 class DummyClass:
@@ -514,6 +515,90 @@ class VFFSL_3(VFFSL):
 class VFFSL_4(VFFSL):
     _searchListLength = 4
 
+## MODIFIED: same tests for names split at compile time:
+
+class VFNC(VFN):
+    def get(self, name, autocall=True):
+        return valueForNameChunks(self.namespace(), tuple(name.split('.')), autocall)
+
+class VFSLC(VFS):
+    def get(self, name, autocall=True):
+        return valueFromSearchListChunks(self.searchList(), tuple(name.split('.')), autocall)
+
+class VFSLC_2namespaces(VFSLC):
+    _searchListLength = 2
+    
+class VFSLC_3namespaces(VFSLC):
+    _searchListLength = 3
+
+class VFSLC_4namespaces(VFSLC):
+    _searchListLength = 4
+
+class NewStyleClass(object):
+    classVar1 = 123
+
+    def __init__(self):
+        self.instanceVar1 = 123
+        self.aDict = {'one': 'item1'}
+
+    def meth1(self, arg="doo"):
+        return arg
+
+    def _getProp(self):
+        return 'prop'
+
+    prop = property(_getProp)
+
+class NewStyleDict(dict):
+    def meth1(self, arg="doo"):
+        return arg
+
+class VFNC_NewStyle(unittest.TestCase):
+    """Chunks and strategies cached by type give the same results as
+    valueForName."""
+
+    def namespace(self):
+        d = NewStyleDict(one='item1', keys='key')
+        d.attr = 'attr'
+        return {'obj': NewStyleClass(), 'aDict': d, 'aFunc': dummyFunc, 
+                'aStr': 'blarg', 'aClass': NewStyleClass}
+
+    def result(self, func, *args):
+        try:
+            value = func(*args)
+        except Exception, e:
+            return type(e)
+        if type(value) == types.MethodType:
+            # bound methods are created by each lookup:
+            return (value.im_func, value.im_class)
+        return value
+
+    def test1(self):
+        names = ['obj.classVar1', 'obj.instanceVar1', 'obj.meth1', 'obj.prop',
+                 'obj.aDict.one', 'aDict.one', 'aDict.keys', 'aDict.meth1',
+                 'aDict.attr', 'aFunc', 'aStr.upper', 'aClass', 'aClass.meth1']
+        for i in range(3):
+            ns = self.namespace()
+            for name in names:
+                for autocall in (True, False):
+                    expected = self.result(valueForName, ns, name, autocall)
+                    got = self.result(valueForNameChunks, ns, tuple(name.split('.')), autocall)
+                    assert got == expected, name
+
+    def test2(self):
+        """Instance attribute that is set later"""
+        obj = NewStyleClass()
+        self.assertRaises(NotFound, valueForNameChunks, obj, ('later',))
+        obj.later = 'later'
+        assert valueForNameChunks(obj, ('later',)) == 'later'
+
+    def test3(self):
+        """NotFound and KeyError"""
+        ns = self.namespace()
+        self.assertRaises(NotFound, valueForNameChunks, ns, ('aStr', 'nothing'))
+        self.assertRaises(KeyError, valueForNameChunks, ns, ('aDict', 'nothing'))
+        self.assertRaises(NotFound, valueFromSearchListChunks, [ns], ('nothing',))
+
 if sys.platform.startswith('java'):
     del VFF, VFFSL, VFFSL_2, VFFSL_3, VFFSL_4
 
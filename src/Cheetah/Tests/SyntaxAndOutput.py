@@ -3048,6 +3048,54 @@ class WhitespaceAfterDirectiveTokens(OutputTest):
 
 
 
+class OptimizationLevel(OutputTest):
+    def _getCompilerSettings(self):
+        return {'optimizationLevel':2}
+
+    def _loopsCollected(self):
+        return self.genModuleCode().count('CollectingTransaction()')
+
+    def test1(self):
+        """static text around comments written by one call"""
+        self.verify("a\n## comment\nb#* comment *#c\n",
+                    "a\nbc\n")
+        assert self.genModuleCode().count("write(u'''")==1
+
+    def test2(self):
+        """output of outermost #for loop collected"""
+        self.verify("<ul>\n#for i in range(3)\n#for j in range(i)\n<li>$i$j</li>\n#end for\n#end for\n</ul>",
+                    "<ul>\n<li>10</li>\n<li>20</li>\n<li>21</li>\n</ul>")
+        assert self._loopsCollected()==1
+
+    def test3(self):
+        """#for loop with #else, #break and #continue"""
+        self.verify("#for i in range(5)\n#if i==1\n#continue\n#end if\n#if i==3\n#break\n#end if\n$i#slurp\n#else\nnever#slurp\n#end for\n!",
+                    "02!")
+        self.verify("#for i in range(2)\n$i#slurp\n#else\nE#slurp\n#end for\n!",
+                    "01E!")
+        assert self._loopsCollected()==1
+
+    def test4(self):
+        """loops at the same level and in #if/#else"""
+        self.verify("#if True\n#for i in range(2)\n$i#slurp\n#end for\n#else\nE\n#end if\n#for i in range(2): $i\n!",
+                    "010\n1\n!")
+        assert self._loopsCollected()==2
+
+    def test5(self):
+        """#capture, #call and #include in collected loop"""
+        self.verify("#for i in range(2)\n#capture x\n<$i>#slurp\n#end capture\n#call unicode.upper\nx$x#slurp\n#end call\n#include raw source=$x\n#end for\n!",
+                    "X<0><0>X<1><1>!")
+        assert self._loopsCollected()==1
+
+    def test6(self):
+        """loops with #stop or in #try are not collected"""
+        self.verify("#for i in range(3)\n$i\n#if i==1\n#stop\n#end if\n#end for\n",
+                    "0\n1\n")
+        assert self._loopsCollected()==0
+        self.verify("#try\n#for i in range(3)\n$i\n#if i==1\n#raise ValueError\n#end if\n#end for\n#except ValueError\nE\n#end try\n",
+                    "0\n1\nE\n")
+        assert self._loopsCollected()==0
+
 class DefmacroDirective(OutputTest):
     def _getCompilerSettings(self):
         def aMacro(src):
@@ -3220,6 +3268,22 @@ else:
     extraCompileKwArgsForDiffBaseclass = {'baseclass':object}
     
 
+def install_optimized():
+    """Run the test cases again with generated code optimized by
+    optimizationLevel 2, which must give the same output."""
+    klasses = [v for v in globals().values() if isinstance(v, type) and issubclass(v, OutputTest)]
+    for klass in klasses:
+        name = klass.__name__
+        src = r"""class %(name)s_Optimized(%(name)s):
+    def _getCompilerSettings(self):
+        settings = dict(%(name)s._getCompilerSettings(self))
+        settings['optimizationLevel'] = 2
+        return settings
+"""%locals()
+        exec(src, globals())
+        del name
+        del klass
+
 def install_eols():
     klasses = [v for v in globals().values() if isinstance(v, type) and issubclass(v, unittest.TestCase)]
     for klass in klasses:
@@ -3242,6 +3306,7 @@ def install_eols():
 ## if run from the command line ##
         
 if __name__ == '__main__':
+    install_optimized()
     install_eols()
     unittest.main()
 
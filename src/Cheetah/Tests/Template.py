@@ -9,6 +9,9 @@ import tempfile
 import shutil
 import unittest
 from Cheetah.Template import Template
+from Cheetah.Compiler import Compiler
+from Cheetah import CompileCache
+from Cheetah.DummyTransaction import StreamingTransaction
 
 majorVer, minorVer = sys.version_info[0], sys.version_info[1]
 versionTuple = (majorVer, minorVer)
@@ -174,6 +177,106 @@ class ClassMethods_compile(TemplateTest):
         assert klass._CHEETAH_isInCompilationCache
 
 
+## MODIFIED: tests of persistent compile cache:
+
+class CountingCompiler(Compiler):
+    instances = 0
+
+    def __init__(self, *args, **kws):
+        CountingCompiler.instances += 1
+        Compiler.__init__(self, *args, **kws)
+
+class DictClient(object):
+    """A memcache-style client."""
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, val, time=0):
+        self.data[key] = val
+
+class PersistentCompileCache(TemplateTest):
+
+    def compile(self, cache, source='$foo', **kws):
+        # in-memory cache is not used, as in a new process:
+        return Template.compile(source=source, compilerClass=CountingCompiler,
+                                useCache=False, compileCache=cache, **kws)
+
+    def check(self, cache):
+        CountingCompiler.instances = 0
+        klass = self.compile(cache)
+        assert str(klass(namespaces={'foo':1234}))=='1234'
+        assert CountingCompiler.instances==1
+        klass = self.compile(cache)
+        assert str(klass(namespaces={'foo':5678}))=='5678'
+        assert CountingCompiler.instances==1
+        # different source or settings:
+        self.compile(cache, source='$foo ')
+        self.compile(cache, compilerSettings={'useAutocalling': False})
+        assert CountingCompiler.instances==3
+        # generated code is also cached:
+        code = self.compile(cache, returnAClass=False)
+        assert CountingCompiler.instances==3
+        assert code.find('class DynamicallyCompiledCheetahTemplate')!=-1
+
+    def test_fileCache(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            self.check(CompileCache.FileCompileCache(os.path.join(tmpDir, 'cache')))
+            assert len(os.listdir(os.path.join(tmpDir, 'cache')))==3
+        finally:
+            shutil.rmtree(tmpDir, True)
+
+    def test_memcachedCache(self):
+        client = DictClient()
+        self.check(CompileCache.MemcachedCompileCache(client, prefix='test:'))
+        assert len(client.data)==3
+        # invalid value is ignored:
+        for key in client.data:
+            client.data[key] = 'bad'
+        CountingCompiler.instances = 0
+        self.compile(CompileCache.MemcachedCompileCache(client, prefix='test:'))
+        assert CountingCompiler.instances==1
+
+    def test_genCacheKey(self):
+        key = CompileCache.genCacheKey(u'$foo', {'a': 1, 'b': 2}, 'x')
+        assert key==CompileCache.genCacheKey('$foo', {'b': 2, 'a': 1}, 'x')
+        assert key!=CompileCache.genCacheKey('$foo', {'a': 1}, 'x')
+        assert key!=CompileCache.genCacheKey('$foo', {'a': 1, 'b': 2}, 'y')
+
+class FileLike(object):
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, s):
+        assert isinstance(s, str)
+        self.chunks.append(s)
+
+class StreamingOutput(TemplateTest):
+
+    def test_respond(self):
+        t = Template('#for i in range(100)\n<p>$i \xc3\xa9</p>\n#end for\n')
+        out = FileLike()
+        trans = StreamingTransaction(out, bufferSize=64)
+        assert t.respond(trans=trans)==''
+        trans.response().flush()
+        assert len(out.chunks)>1
+        assert ''.join(out.chunks)==str(t)
+
+    def test_includeTemplate(self):
+        inner = Template('<b>$x</b>', searchList=[{'x':'<i>'}], filter='WebSafe')
+        outer = Template('<div>#include $inner#</div><div>#include raw $inner#</div>',
+                         searchList=[{'inner':inner}])
+        assert str(outer)=='<div><b>&lt;i&gt;</b></div><div><b>&lt;i&gt;</b></div>'
+        out = FileLike()
+        trans = StreamingTransaction(out)
+        outer.respond(trans=trans)
+        trans.response().flush()
+        assert ''.join(out.chunks)==str(outer)
+
 class ClassMethods_subclass(TemplateTest):
 
     def test_basicUsage(self):
@@ -25,6 +25,7 @@ from Cheetah.Tests import Unicode
 from Cheetah.Tests import CheetahWrapper
 from Cheetah.Tests import Analyzer
 
+SyntaxAndOutput.install_optimized()
 SyntaxAndOutput.install_eols()
 
 suites = [
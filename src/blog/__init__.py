@@ -9,6 +9,9 @@ App "blog" that supports publishing posts and pages.
 
 from framework import store
 
+# cache themed pages for anonymous user in seconds:
+__page_cache__ = 3600
+
 GROUP_OPTIONS = 'blog.post.options'
 
 FEED_TITLE = 'feed_title'
@@ -16,11 +19,19 @@ FEED_PROXY = 'feed_proxy'
 FEED_ITEMS = 'feed_items'
 SHOW_ABSTRACT = 'show_abstract'
 
-def get_feed_url():
+# sharded counter of feed requests, buffered in memcache:
+FEED_COUNTER = 'blog_feed_requests'
+
+def get_feed_url(options=None):
     '''
     Get feed url
+    
+    Args:
+        options: options of blog, or None to read from store.
     '''
-    feed_proxy = store.get_setting(FEED_PROXY, GROUP_OPTIONS, '')
+    if options is None:
+        options = store.get_settings(GROUP_OPTIONS)
+    feed_proxy = options.get(FEED_PROXY, '')
     if not feed_proxy:
         feed_proxy = '/blog/feed'
     return feed_proxy
@@ -29,14 +40,15 @@ def get_feed_html():
     '''
     Get feed html in <head>...</head>.
     '''
-    feed_title = store.get_setting(FEED_TITLE, GROUP_OPTIONS, 'Posts')
-    feed_proxy = get_feed_url()
+    options = store.get_settings(GROUP_OPTIONS)
+    feed_title = options.get(FEED_TITLE, 'Posts')
+    feed_proxy = get_feed_url(options)
     return r'<link href="%s" title="%s" type="application/rss+xml" rel="alternate" />' % (feed_proxy, feed_title)
 
 def update_default_settings(options):
     '''
     Fill default settings if options do not contain.
     '''
-    for k, v in (('show_abstract', 'False'), (FEED_PROXY, ''), (FEED_ITEMS, '20'), (FEED_TITLE, 'Posts')):
+    for k, v in ((SHOW_ABSTRACT, 'True'), (FEED_PROXY, ''), (FEED_ITEMS, '20'), (FEED_TITLE, 'Posts')):
         if not k in options:
             options[k] = v
@@ -15,6 +15,7 @@ from framework.encode import encode_html
 
 import blog
 from blog import model
+from widget import model as widget_model
 
 from manage import AppMenu
 from manage import AppMenuItem
@@ -297,10 +298,15 @@ def _options(user, app, context):
         feed_items = context.get_argument(blog.FEED_ITEMS)
         show_abstract = context.get_argument(blog.SHOW_ABSTRACT)
         # save:
-        store.set_setting(blog.FEED_TITLE, feed_title, blog.GROUP_OPTIONS)
-        store.set_setting(blog.FEED_PROXY, feed_proxy, blog.GROUP_OPTIONS)
-        store.set_setting(blog.FEED_ITEMS, feed_items, blog.GROUP_OPTIONS)
-        store.set_setting(blog.SHOW_ABSTRACT, show_abstract, blog.GROUP_OPTIONS)
+        store.set_settings({
+                blog.FEED_TITLE : feed_title,
+                blog.FEED_PROXY : feed_proxy,
+                blog.FEED_ITEMS : feed_items,
+                blog.SHOW_ABSTRACT : show_abstract,
+        }, blog.GROUP_OPTIONS)
+        # feed link is in header of all blog pages and in subscribe widget 
+        # of all pages:
+        widget_model.invalidate_widget_fragments('subscribe')
         info = 'Your options are saved.'
     # load options:
     options = store.get_settings(blog.GROUP_OPTIONS)
@@ -308,6 +314,7 @@ def _options(user, app, context):
     return {
             '__view__' : 'manage_option',
             'options' : options,
+            'feed_requests' : store.get_count(blog.FEED_COUNTER),
             'info' : info,
     }
 
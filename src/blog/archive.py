@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Precomputed archives and sitemap of blog, which are built by cron job.
+
+All published posts and pages are summarized in the 'posts' index, and
+monthly archives, post ids by category and tag, and gzipped sitemap.xml
+are derived from it. Each index is stored as one BlogArchive entity with
+a copy in memcache, so archive pages and sitemap need only one read.
+
+The job is incremental: only posts modified since last run are read. A
+permanently deleted post can not be read, so its id is kept in the
+'deleted' list until the job removes its summary.
+'''
+
+import gzip
+import zlib
+import StringIO
+import cPickle as pickle
+
+from google.appengine.ext import db
+
+from framework import cache
+from framework import pagecache
+from framework import store
+
+from blog import model
+
+ARCHIVE_POSTS = 'posts'
+ARCHIVE_MONTHS = 'months'
+ARCHIVE_CATEGORIES = 'categories'
+ARCHIVE_TAGS = 'tags'
+ARCHIVE_SITEMAP = 'sitemap'
+
+# ids of permanently deleted posts that job has not removed yet:
+ARCHIVE_DELETED = 'deleted'
+
+CACHE_KEY_PREFIX = '__blog_archive__'
+
+# number of posts read by each query of job:
+BATCH_SIZE = 100
+
+# tag of cached pages that display archives:
+TAG_ARCHIVE = 'blog_archive'
+
+class BlogArchive(db.Model):
+    '''
+    A precomputed index of blog, and key name is index name.
+    '''
+    data = db.BlobProperty(required=True)
+    # modified date of the last post read, only for 'posts' index:
+    watermark = db.DateTimeProperty()
+    modified_date = db.DateTimeProperty(required=True, auto_now=True)
+
+def _encode(name, value):
+    if name==ARCHIVE_SITEMAP:
+        return value
+    return zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+def _decode(name, data):
+    if name==ARCHIVE_SITEMAP:
+        return str(data)
+    return pickle.loads(zlib.decompress(data))
+
+def _load(name):
+    a = BlogArchive.get_by_key_name(name)
+    if a is None:
+        return None
+    return _decode(name, a.data)
+
+def get_archive(name):
+    '''
+    Get an index by name from cache, or load it from datastore.
+
+    Args:
+        name: index name like ARCHIVE_MONTHS.
+    Returns:
+        Index object, or None if job was never run.
+    '''
+    return cache.get(CACHE_KEY_PREFIX + name, lambda: _load(name))
+
+def _summarize(post):
+    '''
+    Summarize a post as tuple (id, static, title, creation_date,
+    modified_date, category id or None, tags), or None if not published.
+    '''
+    if post.state!=model.POST_PUBLISHED:
+        return None
+    category = model.BlogPost.category.get_value_for_datastore(post)
+    if category is not None:
+        category = str(category)
+    return (post.id, post.static, post.title, post.creation_date, post.modified_date, category, list(post.tags))
+
+def apply_changes(summaries, posts):
+    '''
+    Update summaries by modified posts.
+
+    Args:
+        summaries: dict contains post id and summary.
+        posts: list of BlogPost objects.
+    Returns:
+        True if any summary changed.
+    '''
+    changed = False
+    for post in posts:
+        s = _summarize(post)
+        old = summaries.get(post.id)
+        if s==old:
+            continue
+        if s is None:
+            del summaries[post.id]
+        else:
+            summaries[post.id] = s
+        changed = True
+    return changed
+
+def remove_deleted(summaries, ids):
+    '''
+    Remove summaries of permanently deleted posts.
+
+    Args:
+        summaries: dict contains post id and summary.
+        ids: list of post ids.
+    Returns:
+        True if any summary removed.
+    '''
+    changed = False
+    for id in ids:
+        if id in summaries:
+            del summaries[id]
+            changed = True
+    return changed
+
+def mark_deleted(post_id):
+    '''
+    Add id of a permanently deleted post to the 'deleted' list, so its 
+    summary is removed by next run of job.
+    '''
+    def tx():
+        a = BlogArchive.get_by_key_name(ARCHIVE_DELETED)
+        ids = []
+        if a is not None:
+            ids = _decode(ARCHIVE_DELETED, a.data)
+        if post_id not in ids:
+            ids.append(post_id)
+            BlogArchive(key_name=ARCHIVE_DELETED, data=db.Blob(_encode(ARCHIVE_DELETED, ids))).put()
+    db.run_in_transaction(tx)
+
+def _clear_deleted(ids):
+    '''
+    Remove ids that job has handled from the 'deleted' list, and keep ids 
+    added during the job.
+    '''
+    def tx():
+        a = BlogArchive.get_by_key_name(ARCHIVE_DELETED)
+        if a is None:
+            return
+        left = [id for id in _decode(ARCHIVE_DELETED, a.data) if id not in ids]
+        if left:
+            a.data = db.Blob(_encode(ARCHIVE_DELETED, left))
+            a.put()
+        else:
+            a.delete()
+    db.run_in_transaction(tx)
+
+def render_sitemap(host, summaries):
+    '''
+    Render sitemap.xml of all posts and pages as gzipped str.
+    '''
+    L = [r'''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>%s/</loc><changefreq>daily</changefreq></url>''' % host]
+    items = summaries.values()
+    items.sort(key=lambda s: s[3], reverse=True)
+    for id, static, title, creation_date, modified_date, category, tags in items:
+        L.append(r'''
+  <url><loc>%s/blog/%s/%s</loc><lastmod>%s</lastmod></url>''' % (host, static and 'page' or 'post', id, modified_date.strftime('%Y-%m-%d')))
+    L.append('\n</urlset>\n')
+    buf = StringIO.StringIO()
+    f = gzip.GzipFile(filename='sitemap.xml', mode='wb', fileobj=buf)
+    f.write(''.join(L))
+    f.close()
+    return buf.getvalue()
+
+def build_indexes(host, summaries):
+    '''
+    Build all indexes from summaries.
+
+    Returns:
+        Dict contains index name and index object:
+        ARCHIVE_MONTHS: dict contains 'YYYY-MM' and list of (id, title, creation_date),
+        ARCHIVE_CATEGORIES: dict contains category id and list of post ids,
+        ARCHIVE_TAGS: dict contains tag (lower case) and list of post ids,
+        ARCHIVE_SITEMAP: gzipped sitemap.xml as str.
+        Posts in lists are ordered by creation date desc.
+    '''
+    months = {}
+    categories = {}
+    tags = {}
+    items = [s for s in summaries.itervalues() if not s[1]]
+    items.sort(key=lambda s: s[3], reverse=True)
+    for id, static, title, creation_date, modified_date, category, post_tags in items:
+        months.setdefault(creation_date.strftime('%Y-%m'), []).append((id, title, creation_date))
+        if category is not None:
+            categories.setdefault(category, []).append(id)
+        for tag in post_tags:
+            L = tags.setdefault(tag.lower(), [])
+            if not L or L[-1]!=id:
+                L.append(id)
+    return {
+            ARCHIVE_MONTHS : months,
+            ARCHIVE_CATEGORIES : categories,
+            ARCHIVE_TAGS : tags,
+            ARCHIVE_SITEMAP : render_sitemap(host, summaries),
+    }
+
+def _save(indexes, watermark):
+    entities = []
+    for name, value in indexes.iteritems():
+        a = BlogArchive(key_name=name, data=db.Blob(_encode(name, value)))
+        if name==ARCHIVE_POSTS:
+            a.watermark = watermark
+        entities.append(a)
+    db.put(entities)
+    # 'posts' index is only read by job:
+    d = {}
+    for name, value in indexes.iteritems():
+        if name!=ARCHIVE_POSTS:
+            d[CACHE_KEY_PREFIX + name] = value
+    cache.set_multi(d)
+
+def cron_update_archives(host, max_batches=50):
+    '''
+    Read posts modified since last run in batches, remove posts that are
+    deleted permanently, and rebuild indexes if any published post changed.
+    ONLY called by cron job!!!
+
+    Args:
+        host: host url like 'http://www.example.com' used in sitemap.
+        max_batches: max number of batches read in one run, and the rest
+            are read in next run.
+    Returns:
+        Number of posts read.
+    '''
+    a, d = BlogArchive.get_by_key_name([ARCHIVE_POSTS, ARCHIVE_DELETED])
+    summaries = {}
+    watermark = None
+    if a is not None:
+        summaries = _decode(ARCHIVE_POSTS, a.data)
+        watermark = a.watermark
+    deleted = []
+    if d is not None:
+        deleted = _decode(ARCHIVE_DELETED, d.data)
+    q = model.BlogPost.all().order('modified_date')
+    if watermark is not None:
+        # posts at watermark are read again, which does not change anything:
+        q = q.filter('modified_date >=', watermark)
+    changed = remove_deleted(summaries, deleted) or a is None
+    count = 0
+    cursor = None
+    for i in range(max_batches):
+        posts, cursor = store.get_by_cursor(q, cursor, BATCH_SIZE)
+        if apply_changes(summaries, posts):
+            changed = True
+        for post in posts:
+            if watermark is None or post.modified_date > watermark:
+                watermark = post.modified_date
+        count += len(posts)
+        if cursor is None:
+            break
+    if changed:
+        indexes = build_indexes(host, summaries)
+        indexes[ARCHIVE_POSTS] = summaries
+        _save(indexes, watermark)
+        pagecache.invalidate(TAG_ARCHIVE)
+    elif a is not None and a.watermark!=watermark:
+        a.watermark = watermark
+        a.put()
+    if deleted:
+        _clear_deleted(deleted)
+    return count
+
+def get_months():
+    '''
+    Get months that have posts.
+
+    Returns:
+        List of ('YYYY-MM', number of posts), ordered by month desc.
+    '''
+    months = get_archive(ARCHIVE_MONTHS) or {}
+    L = [(month, len(posts)) for month, posts in months.iteritems()]
+    L.sort(reverse=True)
+    return L
+
+def get_month_posts(month):
+    '''
+    Get posts of month as list of (id, title, creation_date).
+
+    Args:
+        month: 'YYYY-MM'.
+    '''
+    months = get_archive(ARCHIVE_MONTHS) or {}
+    return months.get(month, [])
+
+def get_post_ids_by_category(category_id):
+    '''
+    Get ids of published posts by category id.
+    '''
+    return (get_archive(ARCHIVE_CATEGORIES) or {}).get(category_id, [])
+
+def get_post_ids_by_tag(tag):
+    '''
+    Get ids of published posts by tag.
+    '''
+    return (get_archive(ARCHIVE_TAGS) or {}).get(tag.lower(), [])
+
+def get_sitemap():
+    '''
+    Get gzipped sitemap.xml as str, or None if job was never run.
+    '''
+    return get_archive(ARCHIVE_SITEMAP)
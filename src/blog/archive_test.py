@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+import gzip
+import StringIO
+import unittest
+from datetime import datetime
+
+from blog import archive
+
+def _summaries():
+    return {
+            1 : (1, False, 'First', datetime(2010, 1, 5), datetime(2010, 1, 5), 'c1', ['Python', 'GAE']),
+            2 : (2, False, 'Second', datetime(2010, 1, 20), datetime(2010, 2, 1), 'c1', ['python', 'Python']),
+            3 : (3, False, 'Third', datetime(2010, 2, 3), datetime(2010, 2, 3), None, []),
+            4 : (4, True, 'About', datetime(2009, 12, 1), datetime(2010, 3, 1), None, []),
+    }
+
+class Test(unittest.TestCase):
+
+    def test_build_indexes(self):
+        indexes = archive.build_indexes('http://www.example.com', _summaries())
+        months = indexes[archive.ARCHIVE_MONTHS]
+        # static page is not archived:
+        self.assertEquals(['2010-01', '2010-02'], sorted(months.keys()))
+        self.assertEquals([2, 1], [p[0] for p in months['2010-01']])
+        self.assertEquals({ 'c1' : [2, 1] }, indexes[archive.ARCHIVE_CATEGORIES])
+        self.assertEquals({ 'python' : [2, 1], 'gae' : [1] }, indexes[archive.ARCHIVE_TAGS])
+
+    def test_remove_deleted(self):
+        summaries = _summaries()
+        self.assertFalse(archive.remove_deleted(summaries, [5]))
+        self.assertTrue(archive.remove_deleted(summaries, [3, 4, 5]))
+        self.assertEquals([1, 2], sorted(summaries.keys()))
+
+    def test_render_sitemap(self):
+        data = archive.render_sitemap('http://www.example.com', _summaries())
+        xml = gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
+        self.assertTrue(xml.startswith('<?xml '))
+        self.assertTrue('<loc>http://www.example.com/blog/post/1</loc><lastmod>2010-01-05</lastmod>' in xml)
+        self.assertTrue('<loc>http://www.example.com/blog/page/4</loc><lastmod>2010-03-01</lastmod>' in xml)
+        self.assertEquals(5, xml.count('<url>'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,16 +7,25 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 Blog app that display blog posts.
 '''
 
+import gzip
+import logging
+import hashlib
+import StringIO
+import email.utils
+
 from framework.web import NotFoundError
 from framework.web import get
 from framework.web import post
 
+from framework import PermissionError
 from framework import store
+from framework import pagecache
 
 import blog
 from blog import model
+from blog import archive
 
-@get('/')
+@get('/', needs=('context',), page_cache=True)
 def get_all_public_posts(**kw):
     '''
     show all public posts of blog
@@ -43,17 +52,34 @@ def get_all_public_posts(**kw):
             'offset' : offset,
     }
 
-@get('/t/$')
-def get_posts_by_tag(tag_key):
-    tag = store.get_tag(tag_key)
+@get('/tag/$', needs=('context',), page_cache=True)
+def get_posts_by_tag(tag_key, **kw):
+    ctx = kw['context']
+    tag = model.get_tag(tag_key)
+    if tag is None:
+        raise NotFoundError()
+    offset = ctx.get_argument('offset', '')
+    if not offset:
+        offset = None
+    index = ctx.get_argument('index', '')
+    if index:
+        index = int(index)
+    else:
+        index = 1
+    posts, next = model.get_posts_by_tag(tag, 20, offset)
     return {
-            'title' : tag.tag_nicename,
+            '__theme__' : True,
+            '__view__' : 'posts',
+            '__title__' : 'Posts of %s' % tag.nicename,
+            '__header__' : blog.get_feed_html(),
             'tag' : tag,
-            'posts' : get_posts_by_tag(tag),
-            'feed' : blog_utils.get_feed()
+            'posts' : posts,
+            'index' : index,
+            'next' : next,
+            'offset' : offset,
     }
 
-@get('/cat/$')
+@get('/cat/$', needs=('context',), page_cache=True)
 def get_posts_by_category(cat_key, **kw):
     ctx = kw['context']
     category = model.get_category(cat_key)
@@ -79,7 +105,7 @@ def get_posts_by_category(cat_key, **kw):
             'offset' : offset,
     }
 
-@get('/post/$')
+@get('/post/$', page_cache=True)
 def get_post(key):
     '''
     Show a single published post.
@@ -94,11 +120,12 @@ def get_post(key):
             '__theme__' : True,
             '__view__' : 'post',
             '__title__' : post.title,
+            '__cache_tags__' : [post.id],
             'post' : post,
             'comments' : store.get_all_comments(post.id),
     }
 
-@get('/page/$')
+@get('/page/$', page_cache=True)
 def get_page(key):
     '''
     Show a single page.
@@ -116,6 +143,72 @@ def get_page(key):
             'page' : page,
     }
 
+@get('/archive', page_cache=True)
+def get_archives():
+    '''
+    Show months that have posts.
+    '''
+    return {
+            '__theme__' : True,
+            '__view__' : 'archive',
+            '__title__' : 'Archives',
+            '__cache_tags__' : [archive.TAG_ARCHIVE],
+            'month' : None,
+            'months' : archive.get_months(),
+            'posts' : [],
+    }
+
+@get('/archive/$', page_cache=True)
+def get_archive(month):
+    '''
+    Show posts of a month.
+    
+    Args:
+        month: month as 'YYYY-MM'.
+    '''
+    posts = archive.get_month_posts(month)
+    if not posts:
+        raise NotFoundError()
+    return {
+            '__theme__' : True,
+            '__view__' : 'archive',
+            '__title__' : 'Archives of %s' % month,
+            '__cache_tags__' : [archive.TAG_ARCHIVE],
+            'month' : month,
+            'months' : archive.get_months(),
+            'posts' : posts,
+    }
+
+@get('/sitemap.xml', needs=('request', 'response'))
+def sitemap(**kw):
+    '''
+    Send gzipped sitemap.xml built by cron job, or unzipped if client does 
+    not accept gzip.
+    '''
+    data = archive.get_sitemap()
+    if data is None:
+        raise NotFoundError()
+    response = kw['response']
+    response.content_type = 'application/xml'
+    if kw['request'].headers.get('Accept-Encoding', '').find('gzip')!=(-1):
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        data = gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
+    response.out.write(data)
+
+@get('/cron/archives', needs=('request', 'response', 'current_user'))
+def cron_update_archives(**kw):
+    '''
+    Called by cron task. Update archives and sitemap by posts modified since last run.
+    '''
+    current_user = kw['current_user']
+    if kw['request'].headers.get('X-AppEngine-Cron')!='true':
+        if current_user is None or not current_user.is_admin():
+            raise PermissionError('Only cron task or administrator can update archives.')
+    n = archive.cron_update_archives(kw['request'].host_url)
+    logging.info('Read %d modified post(s) for archives.' % n)
+    kw['response'].out.write('%d' % n)
+
 @post('/comment')
 def comment():
     ''' make a comment on a post or page '''
@@ -132,25 +225,21 @@ def comment():
     key = str(shared.create_comment(ref, content, name, link).key())
     return 'redirect:/blog/post/%s#%s' % (ref, key)
 
-@get('/feed')
-def feed(**kw):
+def _render_feed(host, options):
     '''
-    Generate rss feed.
+    Render rss feed as str.
+    
+    Returns:
+        A tuple (feed as str, modified date of newest post or None if no post).
     '''
-    host = kw['request'].host_url
-    options = store.get_settings(blog.GROUP_OPTIONS)
-    blog.update_default_settings(options)
     title = options[blog.FEED_TITLE]
     description = 'Subscribe RSS feed'
     hub = 'http://pubsubhubbub.appspot.com'
     link = options[blog.FEED_PROXY] or ('%s/blog/feed' % host)
     max = int(options[blog.FEED_ITEMS])
+    abstract = options[blog.SHOW_ABSTRACT]=='True'
     posts, cursor = model.get_posts(limit=max)
-    response = kw['response']
-    response.content_type = 'application/rss+xml'
-    response.charset = 'utf8'
-    out = response.out
-    out.write(r'''<?xml version="1.0" encoding="utf-8"?>
+    L = [r'''<?xml version="1.0" encoding="utf-8"?>
 <rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:content="http://purl.org/rss/1.0/modules/content/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:slash="http://purl.org/rss/1.0/modules/slash/">
   <channel>
     <atom:link rel="hub" href="%s"/>
@@ -158,9 +247,12 @@ def feed(**kw):
     <link>%s</link>
     <description>%s</description>
     <generator>expressme.org</generator>
-    <language>en</language>''' % (hub, title, link, description))
+    <language>en</language>''' % (hub, title, link, description)]
+    last_modified = None
     for post in posts:
-        out.write(r'''
+        if last_modified is None or post.modified_date > last_modified:
+            last_modified = post.modified_date
+        L.append(r'''
     <item>
       <title>%s</title>
       <link>%s/blog/post/%s</link>
@@ -173,9 +265,64 @@ def feed(**kw):
             post.id,
             post.author,
             post.creation_date.strftime('%a, %d %b %Y %H:%M:%S'),
-            post.content
+            abstract and post.excerpt or post.content
     ))
-    out.write(r'''
+    L.append(r'''
   </channel>
 </rss>
 ''')
+    return u''.join(L).encode('utf-8'), last_modified
+
+def _get_feed(host):
+    '''
+    Get rss feed from page cache, or render it if not found. The feed is 
+    tagged with 'blog' so it is re-rendered only if posts or options changed.
+    
+    Returns:
+        Page as dict like pagecache.get_page().
+    '''
+    key = pagecache.make_key('/blog/feed', host)
+    page = pagecache.get_page(key)
+    if page is None:
+        options = store.get_settings(blog.GROUP_OPTIONS)
+        blog.update_default_settings(options)
+        body, last_modified = _render_feed(host, options)
+        headers = [('ETag', '"%s"' % hashlib.md5(body).hexdigest())]
+        if last_modified is not None:
+            headers.append(('Last-Modified', last_modified.strftime('%a, %d %b %Y %H:%M:%S GMT')))
+        pagecache.set_page(key, body, 'application/rss+xml', headers, ['blog'])
+        page = { 'body' : body, 'content_type' : 'application/rss+xml', 'headers' : headers }
+    return page
+
+def _not_modified(request, headers):
+    '''
+    Check conditional GET by If-None-Match and If-Modified-Since.
+    '''
+    d = dict(headers)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = [etag.strip() for etag in if_none_match.split(',')]
+        return '*' in etags or d['ETag'] in etags
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if if_modified_since and 'Last-Modified' in d:
+        since = email.utils.parsedate(if_modified_since.split(';')[0])
+        if since is not None:
+            return since >= email.utils.parsedate(d['Last-Modified'])
+    return False
+
+@get('/feed', needs=('request', 'response'))
+def feed(**kw):
+    '''
+    Generate rss feed, and return 304 if feed is not modified.
+    '''
+    store.incr_count(blog.FEED_COUNTER, buffered=True)
+    page = _get_feed(kw['request'].host_url)
+    response = kw['response']
+    for name, value in page['headers']:
+        response.headers[name] = value
+    if _not_modified(kw['request'], page['headers']):
+        response.set_status(304)
+        return
+    response.content_type = page['content_type']
+    response.charset = 'utf8'
+    response.out.write(page['body'])
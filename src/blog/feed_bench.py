@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Load benchmark of /blog/feed that simulates feed readers polling a running
+dev server. Most readers send If-None-Match or If-Modified-Since they got
+from last poll, and the rest poll without condition.
+
+Usage: python blog/feed_bench.py [url] [pollers] [threads] [conditional_percent]
+
+Default url is http://localhost:8080/blog/feed.
+'''
+
+import sys
+import time
+import random
+import urllib2
+import threading
+
+class _NotRedirected(urllib2.HTTPErrorProcessor):
+    '''
+    Treat 304 as a normal response rather than an error.
+    '''
+    def http_response(self, request, response):
+        if response.code==304:
+            return response
+        return urllib2.HTTPErrorProcessor.http_response(self, request, response)
+
+_opener = urllib2.build_opener(_NotRedirected())
+
+def _poll(url, headers):
+    request = urllib2.Request(url)
+    for name, value in headers.iteritems():
+        request.add_header(name, value)
+    start = time.time()
+    response = _opener.open(request)
+    body = response.read()
+    response.close()
+    return response.code, len(body), time.time() - start, response.info()
+
+class _Poller(threading.Thread):
+
+    def __init__(self, url, polls, conditional, headers):
+        super(_Poller, self).__init__()
+        self.url = url
+        self.polls = polls
+        self.conditional = conditional
+        self.headers = headers
+        self.results = []
+
+    def run(self):
+        for i in range(self.polls):
+            headers = {}
+            if random.randint(1, 100) <= self.conditional:
+                headers = self.headers[random.randint(0, len(self.headers)-1)]
+            try:
+                code, size, elapsed, info = _poll(self.url, headers)
+            except Exception, e:
+                code, size, elapsed = 0, 0, 0.0
+            self.results.append((code, size, elapsed))
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values)-1, int(len(values) * p / 100.0))]
+
+def main(url='http://localhost:8080/blog/feed', pollers=2000, threads=20, conditional=90):
+    code, size, elapsed, info = _poll(url, {})
+    print 'GET %s: %d, %d bytes, %.1f ms' % (url, code, size, elapsed * 1000)
+    validators = []
+    if info.get('ETag'):
+        validators.append({ 'If-None-Match' : info.get('ETag') })
+    if info.get('Last-Modified'):
+        validators.append({ 'If-Modified-Since' : info.get('Last-Modified') })
+    if not validators:
+        print 'No ETag or Last-Modified returned, all polls are unconditional.'
+        validators.append({})
+    ts = [_Poller(url, pollers // threads, conditional, validators) for i in range(threads)]
+    start = time.time()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    total = time.time() - start
+    results = []
+    for t in ts:
+        results.extend(t.results)
+    codes = {}
+    transferred = 0
+    for code, size, elapsed in results:
+        codes[code] = codes.get(code, 0) + 1
+        transferred += size
+    latencies = [elapsed for code, size, elapsed in results if code]
+    latencies.sort()
+    print '%d polls by %d threads in %.2f s: %.1f polls/s' % (len(results), threads, total, len(results) / total)
+    for code in sorted(codes.keys()):
+        print '  status %3d: %d' % (code, codes[code])
+    print '  transferred: %d KB' % (transferred // 1024)
+    print '  latency p50 %.1f ms, p90 %.1f ms, p99 %.1f ms' % (_percentile(latencies, 50) * 1000, _percentile(latencies, 90) * 1000, _percentile(latencies, 99) * 1000)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(*([a for a in args[:1]] + [int(a) for a in args[1:]]))
@@ -3,9 +3,13 @@
 
 __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 
+import cPickle as pickle
+
 from google.appengine.ext import db
 
+from framework import cache
 from framework import store
+from framework import pagecache
 from framework import ApplicationError
 
 # post state constants:
@@ -17,13 +21,30 @@ POST_DELETED = 3
 
 CATEGORY_UNCATEGORIED = 'Uncategorized'
 
+HOT_TAGS_CACHE_KEY = '__blog_hot_tags__'
+HOT_TAGS_KEY_NAME = 'hot'
+HOT_TAGS_LIMIT = 100
+
+def _invalidate_pages():
+    '''
+    Invalidate cached pages of blog since posts, pages or categories are changed.
+    '''
+    pagecache.invalidate('blog')
+
 class BlogTag(db.Model):
     '''
-    a tag object
+    a tag object, and key name is 'tag:' + lower case name.
     '''
-    name = db.StringProperty(required=True)
+    name = db.StringProperty(required=True) # lower case
     nicename = db.StringProperty(required=True)
-    count = db.IntegerProperty(required=True, default=0)
+    count = db.IntegerProperty(required=True, default=0) # number of published posts
+
+class BlogTagCloud(db.Model):
+    '''
+    Materialized hot tags as pickled list of BlogTag protobufs, rebuilt 
+    when tag counts changed, and key name is HOT_TAGS_KEY_NAME.
+    '''
+    data = db.BlobProperty(required=True)
 
 class BlogCategory(store.BaseModel):
     '''
@@ -53,6 +74,104 @@ class BlogPost(store.BaseModel):
     def url(self):
         return '%s/%s' % (self.static and 'page' or 'post', self.id)
 
+def _tag_key_name(name):
+    return u'tag:' + name.lower()
+
+def _parse_tags(tags_str):
+    '''
+    Split tags by ',', and remove empty and duplicate (case-insensitive) tags.
+    '''
+    tags = []
+    names = set()
+    for t in tags_str.split(','):
+        t = t.strip()
+        if t and not t.lower() in names:
+            names.add(t.lower())
+            tags.append(t)
+    return tags
+
+def _counted_tags(post):
+    '''
+    Tags that counted by post, and only published posts are counted.
+    '''
+    if post.static or post.state!=POST_PUBLISHED:
+        return []
+    return list(post.tags)
+
+def tag_deltas(old_tags, new_tags):
+    '''
+    Compute changes of tag counts when tags of a post changed.
+    
+    Args:
+        old_tags: list of old tags.
+        new_tags: list of new tags.
+    Returns:
+        Dict contains lower case tag name and non-zero delta.
+    '''
+    deltas = {}
+    for t in old_tags:
+        deltas[t.lower()] = deltas.get(t.lower(), 0) - 1
+    for t in new_tags:
+        deltas[t.lower()] = deltas.get(t.lower(), 0) + 1
+    return dict([(name, delta) for name, delta in deltas.iteritems() if delta])
+
+def _get_tags_by_names(names):
+    '''
+    Get existing tags by lower case names with one batch get.
+    
+    Returns:
+        Dict contains lower case name and BlogTag object.
+    '''
+    if not names:
+        return {}
+    names = list(names)
+    tags = BlogTag.get_by_key_name([_tag_key_name(name) for name in names])
+    return dict([(name, tag) for name, tag in zip(names, tags) if tag is not None])
+
+def _apply_tag_deltas(deltas, existing, nicenames):
+    '''
+    Apply deltas to tags by one batch put, create tags if not exist, and 
+    rebuild hot tags.
+    
+    Args:
+        deltas: dict contains lower case name and delta.
+        existing: dict contains lower case name and existing BlogTag object.
+        nicenames: dict contains lower case name and nice name for new tags.
+    '''
+    if not deltas:
+        return
+    tags = []
+    for name, delta in deltas.iteritems():
+        tag = existing.get(name)
+        if tag is None:
+            tag = BlogTag(key_name=_tag_key_name(name), name=name, nicename=nicenames.get(name, name), count=0)
+            existing[name] = tag
+        tag.count = max(0, tag.count + delta)
+        tags.append(tag)
+    db.put(tags)
+    _rebuild_hot_tags()
+
+def _save_post(post, old_tags, tags=None):
+    '''
+    Save post and update tag counts by old and new tags.
+    
+    Args:
+        post: BlogPost object.
+        old_tags: tags counted by post before changed.
+        tags: new tags of post, or None if tags are not changed. Tags that 
+            already exist are replaced by their nice names.
+    '''
+    new_tags = tags
+    if new_tags is None:
+        new_tags = post.tags
+    nicenames = dict([(t.lower(), t) for t in list(old_tags) + list(new_tags)])
+    existing = _get_tags_by_names(nicenames.keys())
+    if tags is not None:
+        post.tags = [t.lower() in existing and existing[t.lower()].nicename or t for t in tags]
+    post.put()
+    _apply_tag_deltas(tag_deltas(old_tags, _counted_tags(post)), existing, nicenames)
+    _invalidate_pages()
+
 def update_page(id, user, state, title, content, allow_comment):
     '''
     Update a page.
@@ -66,6 +185,7 @@ def update_page(id, user, state, title, content, allow_comment):
         p.content = content
         p.allow_comment = allow_comment
         p.put()
+        _invalidate_pages()
         return p
     return None
 
@@ -95,25 +215,24 @@ def create_page(user, state, title, content, allow_comment=True):
             allow_comment = allow_comment
     )
     p.put()
+    _invalidate_pages()
     return p
 
 def update_post(id, user, state, title, content, category, tags_str, allow_comment):
     '''
     Update a post.
     '''
-    tags = [t.strip() for t in tags_str.split(',')]
-    tags = [t for t in tags if t]
     p = get_post(id, static=False, published_only=False)
     if p:
+        old_tags = _counted_tags(p)
         p.ref = user.id
         p.author = user.nicename
         p.state = state
         p.title = title
         p.content = content
         p.category = category
-        p.tags = tags
         p.allow_comment = allow_comment
-        p.put()
+        _save_post(p, old_tags, _parse_tags(tags_str))
         return p
     return None
 
@@ -133,8 +252,6 @@ def create_post(user, state, title, content, category, tags_str='', allow_commen
     Returns:
         The created BlogPost object.
     '''
-    tags = [t.strip() for t in tags_str.split(',')]
-    tags = [t for t in tags if t]
     # TODO: fix me...
     excerpt = content
     p = BlogPost(
@@ -145,11 +262,11 @@ def create_post(user, state, title, content, category, tags_str='', allow_commen
             excerpt = excerpt,
             content = content,
             category = category,
-            tags = tags,
+            tags = [],
             static = False,
             allow_comment = allow_comment
     )
-    p.put()
+    _save_post(p, [], _parse_tags(tags_str))
     return p
 
 def _query_posts(limit, cursor, ref_user=None, state=None, static=None, category=None, tag=None, order='-creation_date'):
@@ -171,13 +288,7 @@ def _query_posts(limit, cursor, ref_user=None, state=None, static=None, category
     if tag is not None:
         q = q.filter('tags =', tag)
     q = q.order(order)
-    if cursor:
-        q.with_cursor(cursor)
-    result = q.fetch(limit)
-    cursor = q.cursor()
-    if not store.has_more(q, cursor):
-        cursor = None
-    return result, cursor
+    return store.get_by_cursor(q, cursor, limit)
 
 def get_published_posts(limit=50, cursor=None):
     '''
@@ -201,10 +312,12 @@ def get_posts_by_tag(tag, limit=50, cursor=None):
     Return:
         Posts list and a cursor to indicate the next position.
     '''
-    if isinstance(tag, BlogTag):
-        tag = tag.tag_name
-    else:
-        tag = tag.lower()
+    if not isinstance(tag, BlogTag):
+        tag = get_tag_by_name(tag)
+        if tag is None:
+            return [], None
+    # posts store nice name of tag:
+    tag = tag.nicename
     return _query_posts(limit, cursor, state=POST_PUBLISHED, static=False, tag=tag)
 
 def get_pages(published_only=True):
@@ -241,6 +354,14 @@ def get_tag(key):
     '''
     return BlogTag.get(key)
 
+def get_tag_by_name(name):
+    '''
+    get tag object by name, case-insensitive.
+    
+    Return: BlogTag object, or None if no such tag.
+    '''
+    return BlogTag.get_by_key_name(_tag_key_name(name.strip()))
+
 def get_tags(limit=100):
     '''
     get tags order by tag name.
@@ -249,17 +370,31 @@ def get_tags(limit=100):
         limit: maximum number of tags. default to 100.
     Returns: list of BlogTag objects.
     '''
-    return BlogTag.all().order('tag_name').fetch(limit)
+    return BlogTag.all().order('name').fetch(limit)
+
+def _rebuild_hot_tags():
+    tags = BlogTag.all().filter('count >', 0).order('-count').fetch(HOT_TAGS_LIMIT)
+    tags.sort(key=lambda t: (-t.count, t.name))
+    data = [db.model_to_protobuf(t).Encode() for t in tags]
+    BlogTagCloud(key_name=HOT_TAGS_KEY_NAME, data=db.Blob(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))).put()
+    cache.set(HOT_TAGS_CACHE_KEY, data)
 
-def get_hot_tags(limit=100):
+def _load_hot_tags():
+    cloud = BlogTagCloud.get_by_key_name(HOT_TAGS_KEY_NAME)
+    if cloud is None:
+        return []
+    return pickle.loads(cloud.data)
+
+def get_hot_tags(limit=HOT_TAGS_LIMIT):
     '''
-    get hot tags.
+    get hot tags from materialized tag cloud, which needs only one read.
     
     Args:
         limit: maximum number of tags. default to 100.
-    Returns: list of BlogTag objects.
+    Returns: list of BlogTag objects ordered by count desc and name.
     '''
-    return BlogTag.all().filter('tag_count >', 0).order('-tag_count').order('tag_name').fetch(limit)
+    data = cache.get(HOT_TAGS_CACHE_KEY, _load_hot_tags)
+    return [db.model_from_protobuf(pb) for pb in data[:limit]]
 
 def create_category(name, description=''):
     '''
@@ -277,6 +412,7 @@ def create_category(name, description=''):
         raise ApplicationError('Maximum number (100) of categories exceeded.')
     cat = BlogCategory(name=name, description=description, count=0)
     cat.put()
+    _invalidate_pages()
     return cat
 
 def delete_category(key):
@@ -287,6 +423,7 @@ def delete_category(key):
     if len(posts)>0:
         raise ApplicationError('You cannot delete a category that contains posts.')
     category.delete()
+    _invalidate_pages()
 
 def get_category(key=None):
     '''
@@ -325,6 +462,7 @@ def undelete_post(key, static=False):
     if post and post.state==POST_DELETED:
         post.state = POST_DRAFT
         post.put()
+        _invalidate_pages()
         return True
     return False
 
@@ -341,6 +479,7 @@ def pending_post(key):
     if post and post.state==POST_DRAFT:
         post.state = POST_PENDING
         post.put()
+        _invalidate_pages()
         return True
     return False
 
@@ -355,8 +494,9 @@ def publish_post(key, static=False):
     '''
     post = get_post(key, static=static, published_only=False)
     if post and post.state==POST_DRAFT:
+        old_tags = _counted_tags(post)
         post.state = POST_PUBLISHED
-        post.put()
+        _save_post(post, old_tags)
         return True
     return False
 
@@ -371,8 +511,9 @@ def unpublish_post(key, static=False):
     '''
     post = get_post(key, static=static, published_only=True)
     if post:
+        old_tags = _counted_tags(post)
         post.state = POST_DRAFT
-        post.put()
+        _save_post(post, old_tags)
         return True
     return False
 
@@ -386,8 +527,9 @@ def approve_post(key):
     '''
     post = get_post(key, published_only=False)
     if post and post.state==POST_PENDING:
+        old_tags = _counted_tags(post)
         post.state = POST_PUBLISHED
-        post.put()
+        _save_post(post, old_tags)
         return True
     return False
     
@@ -405,12 +547,18 @@ def delete_post(key, static=False, permanent=False):
     post = get_post(key, static=static, published_only=False)
     if post:
         if not permanent and post.state!=POST_DELETED:
+            old_tags = _counted_tags(post)
             post.state = POST_DELETED
-            post.put()
+            _save_post(post, old_tags)
             return True
         # only DELETED post can be deleted permanently:
         elif permanent and post.state==POST_DELETED:
+            # archive job can not read a deleted post, so mark it first and 
+            # its summary is removed by next run:
+            from blog import archive
+            archive.mark_deleted(post.id)
             post.delete()
+            _invalidate_pages()
             return True
     return False
 
@@ -435,24 +583,25 @@ def get_post(key, static=False, published_only=True):
     return p
 
 def list_tags():
-    return BlogTag.all().filter('tag_count >', 0).order('tag_name').fetch(1000)
+    '''
+    list tags that used by published posts, order by name.
+    
+    Returns: list of BlogTag objects.
+    '''
+    return [t for t in BlogTag.all().order('name').fetch(1000) if t.count > 0]
 
 def create_tag(nicename, increase=1):
     '''
     Create or update a tag. If tag is not exist, new tag will be created.
     
     Args:
-        increase: increase of tag_count, default to 1.
+        nicename: tag name.
+        increase: increase of count, default to 1.
     Returns:
         tag object.
     '''
     nicename = nicename.strip()
     name = nicename.lower()
-    tag = BlogTag.all().filter('tag_name =', name).get()
-    if tag is None:
-        tag = BlogTag(tag_name=name, tag_nicename=nicename, tag_count=increase)
-        tag.put()
-    else:
-        tag.tag_count += increase
-        tag.put()
-    return tag
+    existing = _get_tags_by_names([name])
+    _apply_tag_deltas({ name : increase }, existing, { name : nicename })
+    return existing[name]
@@ -78,6 +78,28 @@ class Test(GaeTestCase):
         posts, cursor = model.get_published_posts(10, cursor)
         self.assertEquals(['test-%d' % d for d in range(10, 19, 2)], [str(p.title) for p in posts])
 
+    def test_tag_deltas(self):
+        self.assertEquals({}, model.tag_deltas(['a', 'B'], ['b', 'A']))
+        self.assertEquals({ 'a' : -1, 'c' : 1 }, model.tag_deltas(['a', 'b'], ['B', 'c']))
+
+    def test_tag_counts(self):
+        user = _create_user()
+        category = model.get_category()
+        p1 = model.create_post(user, model.POST_PUBLISHED, 'p1', 'c1', category, 'Python, GAE,python', True)
+        self.assertEquals(['Python', 'GAE'], p1.tags)
+        p2 = model.create_post(user, model.POST_DRAFT, 'p2', 'c2', category, 'PYTHON', True)
+        # nice name of existing tag is used:
+        self.assertEquals(['Python'], p2.tags)
+        self.assertEquals(1, model.get_tag_by_name('python').count)
+        model.publish_post(p2.id)
+        self.assertEquals(2, model.get_tag_by_name('python').count)
+        self.assertEquals([('python', 2), ('gae', 1)], [(t.name, t.count) for t in model.get_hot_tags()])
+        model.update_post(p1.id, user, model.POST_PUBLISHED, 'p1', 'c1', category, 'Java', True)
+        self.assertEquals([('java', 1), ('python', 1)], [(t.name, t.count) for t in model.get_hot_tags()])
+        self.assertEquals(['java', 'python'], [t.name for t in model.list_tags()])
+        posts, cursor = model.get_posts_by_tag('PYTHON')
+        self.assertEquals(['p2'], [p.title for p in posts])
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
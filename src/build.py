@@ -8,13 +8,32 @@ build.py
 
 - count lines of code
 
-- pre-compile all views for speed
+- pre-compile all views for speed, in parallel worker processes if 
+  multiprocessing is available, and skip views that are not changed
+
+- bundle css and js of each theme and app, and name bundles with content 
+  hash so they can be served with far-future expires
 
 - make package (.zip) file for publish.
 '''
 
 import re
 import os
+import sys
+import time
+import optparse
+import zipfile
+import hashlib
+import cPickle as pickle
+
+try:
+    import multiprocessing
+except ImportError:
+    # python 2.5 has no multiprocessing, compile views one by one:
+    multiprocessing = None
+
+from Cheetah.Version import Version as CHEETAH_VERSION
+from Cheetah.Compiler import DEFAULT_COMPILER_SETTINGS
 
 from framework import view
 
@@ -23,20 +42,54 @@ PACKAGE_EXCLUDES = (
         r'^\/[a-zA-Z0-9\_]+\/view\/.*$', # /*/view/**
         r'^.*\_test$',                   # *_test
         r'^.*\_test\.py',                # *_test.py
+        r'^.*\_bench\.py',               # *_bench.py
         r'^\/build\.py$',                # /build.py
+        r'^\/compiled\/build\_state$',   # /compiled/build_state
 )
 
+# file that stores content hash of sources of last build:
+BUILD_STATE = 'build_state'
+
+# dir of bundled css and js:
+BUNDLE_DIR = 'static/bundle'
+
+# number of worker processes to compile views, None = number of cpus:
+BUILD_WORKERS = None
+
+# number of slowest views printed after compile:
+REPORT_SLOWEST = 10
+
+class BuildError(StandardError):
+    pass
+
 REGEX_EXCLUDES = []
 for regex in PACKAGE_EXCLUDES:
     REGEX_EXCLUDES.append(re.compile(regex))
 
 def main():
     '''
-    Build ExpressMe by package() and deploy().
+    Build ExpressMe by package() and deploy(). Run 'python build.py --help' 
+    for options of compile budget.
     '''
-    root = os.path.split(__file__)[0]
+    parser = optparse.OptionParser(usage='python build.py [options]')
+    parser.add_option('--max-compile-ms', type='int', dest='max_ms', default=None, help='fail if a view takes longer to compile')
+    parser.add_option('--max-code-kb', type='int', dest='max_kb', default=None, help='fail if generated code of a view is larger')
+    parser.add_option('--workers', type='int', dest='workers', default=None, help='number of worker processes to compile views')
+    options, args = parser.parse_args()
+    if options.workers:
+        global BUILD_WORKERS
+        BUILD_WORKERS = options.workers
+    root = os.path.split(os.path.abspath(__file__))[0]
     count_line(root)
-    compile_view(root)
+    state = _load_state(root)
+    try:
+        compile_view(root, state, options.max_ms, options.max_kb)
+        build_assets(root, state)
+    except BuildError, e:
+        _save_state(root, state)
+        print 'BUILD FAILED: %s' % e
+        sys.exit(1)
+    _save_state(root, state)
     package(root)
 
 def count_line(root_path):
@@ -82,49 +135,353 @@ def _count_file(file_path):
 
 def package(root_path):
     '''
-    Compile all views and make a zip file.
+    Make a zip file of all files that need to deploy, and views should be 
+    compiled before.
+    '''
+    from version import get_version
+    zip_path = os.path.join(os.path.dirname(root_path), 'expressme-%s.zip' % get_version())
+    print 'make package %s...' % zip_path
+    z = zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED)
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames.sort()
+        filenames.sort()
+        for f in filenames:
+            path = os.path.join(dirpath, f)
+            if _filter(path, root_path):
+                z.write(path, path[len(root_path)+1:])
+                count += 1
+    z.close()
+    print 'total %d file(s) packaged.' % count
+
+###############################################################################
+# Build state for incremental build
+###############################################################################
+
+def _md5_file(path):
+    f = open(path, 'rb')
+    try:
+        return hashlib.md5(f.read()).hexdigest()
+    finally:
+        f.close()
+
+def _load_state(root_path):
+    '''
+    Load content hash of sources of last build as dict, or empty dict if not built before.
+    '''
+    path = os.path.join(root_path, 'compiled', BUILD_STATE)
+    if not os.path.isfile(path):
+        return {}
+    f = open(path, 'rb')
+    try:
+        try:
+            return pickle.load(f)
+        except Exception:
+            return {}
+    finally:
+        f.close()
+
+def _save_state(root_path, state):
+    _mkdirs(os.path.join(root_path, 'compiled'))
+    f = open(os.path.join(root_path, 'compiled', BUILD_STATE), 'wb')
+    try:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    finally:
+        f.close()
+
+###############################################################################
+# Compile views
+###############################################################################
+
+def _compiler_signature():
+    '''
+    Signature of Cheetah version and compiler settings, so all views are 
+    compiled again if any of them changed.
     '''
-    fs = os.listdir(root_path)
+    settings = DEFAULT_COMPILER_SETTINGS.copy()
+    settings.update(view.COMPILER_SETTINGS)
+    items = settings.items()
+    items.sort()
+    return hashlib.md5(repr((CHEETAH_VERSION, items))).hexdigest()
 
-def compile_view(root_path):
+def compile_view(root_path, state=None, max_ms=None, max_kb=None):
+    '''
+    Compile all views of apps and themes. Views that have the same content 
+    hash and compiler signature as last build are skipped, and others are 
+    compiled in worker processes.
+    
+    Args:
+        root_path: root dir.
+        state: build state of last build, which is updated after compile.
+        max_ms: max milliseconds to compile a view, default to None (no limit).
+        max_kb: max KB of generated code of a view, default to None (no limit).
+    Returns:
+        Number of views compiled.
+    Raises:
+        BuildError if any view exceeds max_ms or max_kb.
+    '''
+    if state is None:
+        state = {}
+    # relative target path -> (md5, signature, seconds, size):
+    hashes = state.setdefault('views', {})
+    signature = _compiler_signature()
+    start = time.time()
     all_appdirs = os.listdir(root_path)
     appdirs = [app for app in all_appdirs if not app.endswith('test') and os.path.isdir(os.path.join(root_path, app, 'view'))]
     appdirs.sort()
-    count = 0
+    tasks = []
+    skipped = 0
     for app in appdirs:
+        view_dirs = ['view']
         if app=='theme':
             import theme
-            themes = theme.get_themes(False)
-            for t in themes:
-                count += _compile_dir(root_path, app, view_dir=t)
+            view_dirs = theme.get_themes(False)
+        for view_dir in view_dirs:
+            for mod_name, src, target in _list_views(root_path, app, view_dir):
+                md5 = _md5_file(src)
+                last = hashes.get(target[len(root_path)+1:])
+                if last is not None and last[:2]==(md5, signature) and os.path.isfile(target):
+                    skipped += 1
+                else:
+                    tasks.append((app, view_dir, mod_name, target, md5))
+    for app, view_dir, mod_name, target, md5 in tasks:
+        _mkdirs(os.path.dirname(target))
+    compiled = _run_tasks(_compile_task, tasks)
+    for (app, view_dir, mod_name, target, md5), (content, seconds) in zip(tasks, compiled):
+        f = open(target, 'w')
+        f.write(content)
+        f.close()
+        hashes[target[len(root_path)+1:]] = (md5, signature, seconds, len(content))
+        print '  compiled %s/%s/%s.html' % (app, view_dir, mod_name)
+    # make sure __init__.py of each package under root_path/compiled:
+    compiled_root = os.path.join(root_path, 'compiled')
+    _mkdirs(compiled_root)
+    for dirpath, dirnames, filenames in os.walk(compiled_root):
+        _gen_init_py(dirpath)
+    print 'total %d view(s) compiled, %d view(s) not changed in %.2f s.' % (len(tasks), skipped, time.time() - start)
+    _report_views(hashes)
+    _check_budget(hashes, max_ms, max_kb)
+    return len(tasks)
+
+def _report_views(hashes):
+    '''
+    Print slowest views by compile time of last compiled.
+    '''
+    L = [(v[2], v[3], target) for target, v in hashes.iteritems() if len(v)==4]
+    if not L:
+        return
+    L.sort()
+    L.reverse()
+    print 'slowest %d view(s) to compile:' % min(REPORT_SLOWEST, len(L))
+    for seconds, size, target in L[:REPORT_SLOWEST]:
+        print '  %8.1f ms %8.1f KB  %s' % (seconds * 1000, size / 1024.0, target)
+
+def _check_budget(hashes, max_ms, max_kb):
+    '''
+    Check compile time and generated code size of all views, including views 
+    not changed, by values recorded when they were compiled.
+    '''
+    errors = []
+    targets = hashes.keys()
+    targets.sort()
+    for target in targets:
+        v = hashes[target]
+        if len(v)!=4:
+            continue
+        if max_ms is not None and v[2] * 1000 > max_ms:
+            errors.append('%s takes %.1f ms to compile (max %d ms)' % (target, v[2] * 1000, max_ms))
+        if max_kb is not None and v[3] > max_kb * 1024:
+            errors.append('%s generates %.1f KB code (max %d KB)' % (target, v[3] / 1024.0, max_kb))
+    if errors:
+        raise BuildError('%d view(s) exceed budget:\n  %s' % (len(errors), '\n  '.join(errors)))
+
+def _list_views(root_path, app, view_dir):
+    '''
+    List views as (mod_name, source path, target path).
+    '''
+    src_dir = os.path.join(root_path, app, view_dir)
+    target_dir = os.path.join(root_path, 'compiled', app, view_dir)
+    views = [v for v in os.listdir(src_dir) if v.endswith('.html') and os.path.isfile(os.path.join(src_dir, v))]
+    views.sort()
+    return [(v[:-5], os.path.join(src_dir, v), os.path.join(target_dir, '%s.py' % v[:-5])) for v in views]
+
+def _compile_task(task):
+    '''
+    Compile a view and return (content, seconds).
+    '''
+    app, view_dir, mod_name, target, md5 = task
+    start = time.time()
+    content = view.compile_template(app, mod_name, view_dir=view_dir)
+    return content, time.time() - start
+
+def _run_tasks(func, tasks):
+    '''
+    Run func for each task in worker processes and return results in the same order.
+    '''
+    if len(tasks) < 2 or multiprocessing is None or BUILD_WORKERS==1:
+        return [func(task) for task in tasks]
+    pool = multiprocessing.Pool(BUILD_WORKERS)
+    try:
+        return pool.map(func, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+###############################################################################
+# Bundle assets
+###############################################################################
+
+_RE_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'"\)]+)\1\s*\)''')
+_RE_CSS_STRING_OR_COMMENT = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.S)
+_RE_CSS_SPACES = re.compile(r'\s+')
+_RE_CSS_CHARSET = re.compile(r'@charset\s+[^;]*;\s*', re.I)
+_RE_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+
+def _absolute_css_urls(css, url):
+    '''
+    Make relative url() in css absolute, because bundle is in a different dir.
+    '''
+    base = url[:url.rfind('/')+1]
+    def repl(m):
+        u = m.group(2)
+        if u.startswith('/') or u.startswith('data:') or u.find('://')!=(-1):
+            return m.group(0)
+        return 'url(%s%s)' % (base, u)
+    return _RE_CSS_URL.sub(repl, css)
+
+def _minify_css_text(css):
+    css = _RE_CSS_SPACES.sub(' ', css)
+    css = _RE_CSS_PUNCTUATION.sub(r'\1', css)
+    return css.replace(';}', '}')
+
+def minify_css(css):
+    '''
+    Remove comments and unnecessary whitespaces of css. Quoted strings (e.g. 
+    content: "a  b" or url("a b.png")) are kept as they are.
+    '''
+    L = []
+    text = []
+    pos = 0
+    for m in _RE_CSS_STRING_OR_COMMENT.finditer(css):
+        text.append(css[pos:m.start()])
+        pos = m.end()
+        if m.group(1) is not None:
+            L.append(_minify_css_text(''.join(text)))
+            L.append(m.group(1))
+            text = []
+    text.append(css[pos:])
+    L.append(_minify_css_text(''.join(text)))
+    return ''.join(L).strip()
+
+def minify_js(js):
+    '''
+    Remove blank lines, indents and whole-line comments of js. Statements are 
+    never joined so it is safe for code without semicolons.
+    '''
+    L = []
+    for line in js.splitlines():
+        line = line.strip()
+        if line and not line.startswith('//'):
+            L.append(line)
+    return '\n'.join(L)
+
+def _bundle(root_path, name, urls):
+    '''
+    Concat and minify source files of urls.
+    '''
+    L = []
+    charset = None
+    for url in urls:
+        f = open(os.path.join(root_path, url[1:]), 'rb')
+        content = f.read()
+        f.close()
+        if name.endswith('.css'):
+            # only one @charset is allowed at the beginning of css:
+            m = _RE_CSS_CHARSET.search(content)
+            if m is not None and charset is None:
+                charset = m.group(0).strip()
+            content = _RE_CSS_CHARSET.sub('', content)
+            L.append(minify_css(_absolute_css_urls(content, url)))
         else:
-            count += _compile_dir(root_path, app)
-    # make sure __init__.py under root_path/compiled:
-    _gen_init_py(os.path.join(root_path, 'compiled'))
-    print 'total %d view(s) compiled.' % count
-
-def _compile_dir(root_path, app, view_dir='view'):
-    print 'compile views in "%s" for app "%s"...' % (view_dir, app)
-    all_views = os.listdir(os.path.join(root_path, app, view_dir))
-    views = [v for v in all_views if os.path.isfile(os.path.join(root_path, app, view_dir, v))]
+            L.append(minify_js(content))
+    if name.endswith('.css'):
+        if charset:
+            L.insert(0, charset)
+        return '\n'.join(L)
+    return ';\n'.join(L)
+
+def _bundle_assets(root_path, hashes, kind, owner, assets):
+    '''
+    Bundle assets of a theme or an app, and return (dict of asset name and 
+    list of bundle url, number of bundles made).
+    '''
+    manifest = {}
+    count = 0
+    for name in sorted(assets.keys()):
+        urls = list(assets[name])
+        md5 = hashlib.md5('\n'.join([_md5_file(os.path.join(root_path, url[1:])) for url in urls])).hexdigest()
+        last = hashes.get((kind, owner, name))
+        if last is not None and last[0]==md5 and os.path.isfile(os.path.join(root_path, last[1][1:])):
+            manifest[name] = [last[1]]
+            continue
+        content = _bundle(root_path, name, urls)
+        n = name.rfind('.')
+        url = '/%s/%s/%s/%s.%s%s' % (BUNDLE_DIR, kind, owner, name[:n], hashlib.md5(content).hexdigest()[:10], name[n:])
+        path = os.path.join(root_path, url[1:])
+        _mkdirs(os.path.dirname(path))
+        f = open(path, 'wb')
+        f.write(content)
+        f.close()
+        if last is not None and last[1]!=url and os.path.isfile(os.path.join(root_path, last[1][1:])):
+            os.remove(os.path.join(root_path, last[1][1:]))
+        hashes[(kind, owner, name)] = (md5, url)
+        manifest[name] = [url]
+        count += 1
+        print '  bundled %s for %s "%s": %d file(s) -> %s' % (name, kind, owner, len(urls), url)
+    return manifest, count
+
+def build_assets(root_path, state=None):
+    '''
+    Bundle css and js defined by '__assets__' of each theme and app, and 
+    write the asset manifest compiled/asset_manifest.py used by theme.render 
+    and view.get_app_assets. Bundles that sources are not changed are skipped.
+    
+    Args:
+        root_path: root dir.
+        state: build state of last build, which is updated after build.
+    Returns:
+        Number of bundles made.
+    '''
+    if state is None:
+        state = {}
+    hashes = state.setdefault('assets', {})
+    import theme
+    import appconfig
+    manifest = {}
+    app_manifest = {}
     count = 0
-    for v in views:
-        if v.endswith('.html'):
-            print '  compile "%s"...' % v
-            mod_name = v[:-5]
-            content = view.compile_template(app, mod_name, view_dir=view_dir)
-            content_dir = os.path.join(root_path, 'compiled', app, view_dir)
-            _mkdirs(content_dir)
-            _gen_init_py(content_dir)
-            file = os.path.join(content_dir, '%s.py' % mod_name)
-            f = open(file, 'w')
-            f.write(content)
-            f.close()
-            count += 1
-    app_dir = os.path.join(root_path, 'compiled', app)
-    _mkdirs(app_dir)
-    _gen_init_py(app_dir)
-    print '%d view(s) compiled.' % count
+    for th in theme.get_themes(False):
+        manifest[th], n = _bundle_assets(root_path, hashes, 'theme', th, theme.get_theme_info(th)['assets'])
+        count += n
+    for app in appconfig.apps:
+        assets = getattr(__import__(app), '__assets__', None)
+        if assets:
+            app_manifest[app], n = _bundle_assets(root_path, hashes, 'app', app, assets)
+            count += n
+    _mkdirs(os.path.join(root_path, 'compiled'))
+    f = open(os.path.join(root_path, 'compiled', 'asset_manifest.py'), 'w')
+    f.write(r'''#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# DO NOT modify this file because it was generated by 'build.py'
+#
+
+ASSETS = %r
+
+APP_ASSETS = %r
+''' % (manifest, app_manifest))
+    f.close()
+    print 'total %d bundle(s) made.' % count
     return count
 
 def _filter(path, root_path):
@@ -140,7 +497,10 @@ def _mkdirs(path):
     os.makedirs(path)
 
 def _gen_init_py(package_path):
-    file = open(os.path.join(package_path, '__init__.py'), 'w')
+    path = os.path.join(package_path, '__init__.py')
+    if os.path.isfile(path):
+        return
+    file = open(path, 'w')
     file.write(r'''#!/usr/bin/env python
 # -*- coding: utf-8 -*-
 #
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+import unittest
+
+import build
+
+class Test(unittest.TestCase):
+
+    def test_minify_css(self):
+        css = '''/* comment */
+a:link    {color: #2175ac; text-decoration:none}
+
+div.x > p, h1 { margin : 0px ; }
+'''
+        self.assertEquals('a:link{color: #2175ac;text-decoration:none}div.x>p,h1{margin : 0px}', build.minify_css(css))
+
+    def test_minify_css_keeps_strings(self):
+        css = '''q:before { content : "a  b ; }" ; }
+p {background:url( 'my  image.png' )} /* "not a string" */ em { font-family: 'A  B' , serif }
+'''
+        self.assertEquals('''q:before{content : "a  b ; }"}p{background:url( 'my  image.png' )}em{font-family: 'A  B',serif}''', build.minify_css(css))
+
+    def test_absolute_css_urls(self):
+        css = 'a {background:url(src/grid.png)} b {background:url("/image/x.png")} c {background:url(http://x.com/y.png)}'
+        self.assertEquals(
+                'a {background:url(/static/css/src/grid.png)} b {background:url("/image/x.png")} c {background:url(http://x.com/y.png)}',
+                build._absolute_css_urls(css, '/static/css/screen.css'))
+
+    def test_minify_js(self):
+        js = '''// comment
+function f() {
+    var url = 'http://www.expressme.org/';
+
+    return url
+}
+'''
+        self.assertEquals("function f() {\nvar url = 'http://www.expressme.org/';\nreturn url\n}", build.minify_js(js))
+
+    def test_check_budget(self):
+        hashes = {
+                'compiled/blog/view/a.py' : ('md5', 'sig', 0.02, 10 * 1024),
+                'compiled/blog/view/b.py' : ('md5', 'sig', 0.3, 30 * 1024),
+                'compiled/blog/view/c.py' : 'md5',
+        }
+        build._check_budget(hashes, None, None)
+        build._check_budget(hashes, 500, 40)
+        self.assertRaises(build.BuildError, lambda: build._check_budget(hashes, 100, None))
+        self.assertRaises(build.BuildError, lambda: build._check_budget(hashes, None, 20))
+
+    def test_compiler_signature(self):
+        from framework import view
+        sig = build._compiler_signature()
+        self.assertEquals(sig, build._compiler_signature())
+        view.COMPILER_SETTINGS['useStackFrames'] = False
+        try:
+            self.assertNotEquals(sig, build._compiler_signature())
+        finally:
+            del view.COMPILER_SETTINGS['useStackFrames']
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,40 +5,331 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 
 '''
 Simple functions to make ease of use memcache.
+
+Values are cached in two levels: a bounded LRU cache in current process
+(level 1) in front of memcache (level 2). Each value in memcache is stored
+with a version stamp, and the stamp is also stored under a small version
+key. A local copy is trusted for LOCAL_CHECK_INTERVAL seconds, then it is
+checked against the version key so set() or delete() on other instances
+invalidates it.
+
+Integer values are stored in memcache only, so incr() works as before.
+
+NOTE that values in local cache are shared by all callers in the same
+process, so do not modify the returned object.
 '''
 
+import time as _time
+import random
+import threading
+
 from google.appengine.api import memcache as memcache
 
+# maximum number of values in local cache:
+MAX_LOCAL_ITEMS = 1000
+
+# seconds that a local copy is trusted without checking version in memcache:
+LOCAL_CHECK_INTERVAL = 5
+
+# seconds of the lease that only one caller re-computes a missing value:
+LEASE_TIME = 10
+
+# how long (in seconds) to wait for the value computed by other caller:
+LEASE_WAIT = 1.0
+LEASE_POLL = 0.05
+
+VERSION_PREFIX = '__ver__'
+LEASE_PREFIX = '__lease__'
+
+class _Stamped(object):
+    '''
+    Value with version stamp that stored in memcache.
+    '''
+    def __init__(self, stamp, value):
+        self.stamp = stamp
+        self.value = value
+
+class _Node(object):
+    '''
+    Node of double linked list used by _LocalCache.
+    '''
+    __slots__ = ('prev', 'next', 'key', 'value', 'stamp', 'expires', 'checked')
+
+class _LocalCache(object):
+    '''
+    A bounded LRU cache with expires time.
+    '''
+
+    def __init__(self, max_items):
+        self._max_items = max_items
+        self._map = {}
+        self._lock = threading.Lock()
+        # head is the most recently used, and head.prev is the least:
+        self._head = _Node()
+        self._head.prev = self._head.next = self._head
+
+    def _unlink(self, node):
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+    def _link(self, node):
+        node.prev = self._head
+        node.next = self._head.next
+        self._head.next.prev = node
+        self._head.next = node
+
+    def get(self, key, now):
+        '''
+        Get node of key, or None if not found or expired.
+        '''
+        self._lock.acquire()
+        try:
+            node = self._map.get(key)
+            if node is None:
+                return None
+            if node.expires and node.expires < now:
+                self._unlink(node)
+                del self._map[key]
+                return None
+            self._unlink(node)
+            self._link(node)
+            return node
+        finally:
+            self._lock.release()
+
+    def put(self, key, value, stamp, expires, now):
+        self._lock.acquire()
+        try:
+            node = self._map.get(key)
+            if node is None:
+                node = _Node()
+                node.key = key
+                self._map[key] = node
+            else:
+                self._unlink(node)
+            self._link(node)
+            node.value = value
+            node.stamp = stamp
+            node.expires = expires
+            node.checked = now
+            while len(self._map) > self._max_items:
+                last = self._head.prev
+                self._unlink(last)
+                del self._map[last.key]
+        finally:
+            self._lock.release()
+
+    def remove(self, key):
+        self._lock.acquire()
+        try:
+            node = self._map.pop(key, None)
+            if node is not None:
+                self._unlink(node)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._map.clear()
+            self._head.prev = self._head.next = self._head
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._map)
+
+_local = _LocalCache(MAX_LOCAL_ITEMS)
+
+def _new_stamp():
+    return '%.6f-%d' % (_time.time(), random.randint(0, 999999))
+
+def _expires(time, now):
+    if time:
+        return now + time
+    return 0
+
+def _is_raw(value):
+    return value is None or isinstance(value, (int, long))
+
+def _to_memcache(mapping, time, now):
+    '''
+    Convert key-value pairs to the mapping stored in memcache, and update local cache.
+    '''
+    d = {}
+    for key, value in mapping.iteritems():
+        if _is_raw(value):
+            _local.remove(key)
+            d[key] = value
+        else:
+            stamp = _new_stamp()
+            _local.put(key, value, stamp, _expires(time, now), now)
+            d[key] = _Stamped(stamp, value)
+            d[VERSION_PREFIX + key] = stamp
+    return d
+
+def clear_local():
+    '''
+    Clear all values in local cache of current process.
+    '''
+    _local.clear()
+
 def set(key, value, time=0):
     '''
     Put the value into cache for a given key.
-    
+
     Args:
         key: key as str.
         value: value as object.
         time: expires time, default to 0 (forever).
     '''
-    memcache.set(key, value, time)
+    memcache.set_multi(_to_memcache({ key : value }, time, _time.time()), time)
+
+def set_multi(mapping, time=0):
+    '''
+    Put values into cache in one batch.
+
+    Args:
+        mapping: dict contains key as str and value as object.
+        time: expires time, default to 0 (forever).
+    '''
+    if mapping:
+        memcache.set_multi(_to_memcache(mapping, time, _time.time()), time)
+
+def add(key, value, time=0):
+    '''
+    Put the value into cache only if key is not in cache.
+
+    Args:
+        key: key as str.
+        value: value as object.
+        time: expires time, default to 0 (forever).
+    Returns:
+        True if added, False if key is already in cache.
+    '''
+    now = _time.time()
+    if _is_raw(value):
+        if memcache.add(key, value, time):
+            _local.remove(key)
+            return True
+        return False
+    stamp = _new_stamp()
+    if memcache.add(key, _Stamped(stamp, value), time):
+        memcache.set(VERSION_PREFIX + key, stamp, time)
+        _local.put(key, value, stamp, _expires(time, now), now)
+        return True
+    return False
 
 def delete(key):
     '''
     Delete a key from cache.
-    
+
     Args:
         key: key as str.
     '''
-    memcache.delete(key)
+    delete_multi([key])
+
+def delete_multi(keys):
+    '''
+    Delete keys from cache in one batch.
+
+    Args:
+        keys: list of key as str.
+    '''
+    L = []
+    for key in keys:
+        _local.remove(key)
+        L.append(key)
+        L.append(VERSION_PREFIX + key)
+    if L:
+        memcache.delete_multi(L)
+
+def get_multi(keys):
+    '''
+    Retrieve values from cache in one batch.
+
+    Args:
+        keys: list of key as str.
+    Returns:
+        Dict contains key and value that found in cache.
+    '''
+    now = _time.time()
+    result = {}
+    nodes = {}
+    fetch = []
+    for key in keys:
+        node = _local.get(key, now)
+        if node is None:
+            fetch.append(key)
+        elif now - node.checked < LOCAL_CHECK_INTERVAL:
+            result[key] = node.value
+        else:
+            # only check version of local copy:
+            nodes[key] = node
+            fetch.append(VERSION_PREFIX + key)
+    if not fetch:
+        return result
+    values = memcache.get_multi(fetch)
+    changed = []
+    for key, node in nodes.iteritems():
+        if values.get(VERSION_PREFIX + key)==node.stamp:
+            node.checked = now
+            result[key] = node.value
+        else:
+            changed.append(key)
+    if changed:
+        values.update(memcache.get_multi(changed))
+    for key in keys:
+        if key in result:
+            continue
+        value = values.get(key)
+        if isinstance(value, _Stamped):
+            _local.put(key, value.value, value.stamp, 0, now)
+            result[key] = value.value
+        else:
+            _local.remove(key)
+            if value is not None:
+                result[key] = value
+    return result
+
+def _compute(key, func_or_value, time):
+    '''
+    Compute missing value. Only the caller who holds the lease calls the
+    function, others wait for the value for a while.
+    '''
+    if not callable(func_or_value):
+        set(key, func_or_value, time)
+        return func_or_value
+    lease_key = LEASE_PREFIX + key
+    if not memcache.add(lease_key, 1, LEASE_TIME):
+        waited = 0.0
+        while waited < LEASE_WAIT:
+            _time.sleep(LEASE_POLL)
+            waited += LEASE_POLL
+            d = get_multi([key])
+            if key in d:
+                return d[key]
+        # the other caller may be failed, compute it anyway:
+        value = func_or_value()
+        set(key, value, time)
+        return value
+    try:
+        value = func_or_value()
+        set(key, value, time)
+    finally:
+        memcache.delete(lease_key)
+    return value
 
 def get(key, func_or_value=None, time=0):
     '''
-    Retrieve the value from cache for a given key. 
-    If value is not found in cache, and func_or_value is None, 
+    Retrieve the value from cache for a given key.
+    If value is not found in cache, and func_or_value is None,
     then the None will return.
-    If func_or_value is a function, cache will be updated with the 
+    If func_or_value is a function, cache will be updated with the
     value returned by function.
-    If func_or_value is not a function, then it must be a value, and 
+    If func_or_value is not a function, then it must be a value, and
     cache will be updated with the value.
-    
+
     Args:
         key: the key of the value.
         func_or_value: a function or value.
@@ -46,14 +337,34 @@ def get(key, func_or_value=None, time=0):
     Returns:
         value stored in cache, or None if not found.
     '''
-    value = memcache.get(key)
-    if value is None:
-        if callable(func_or_value):
-            value = func_or_value()
-        else:
-            value = func_or_value
-        memcache.set(key, value, time)
-    return value
+    d = get_multi([key])
+    if key in d:
+        return d[key]
+    if func_or_value is None:
+        return None
+    return _compute(key, func_or_value, time)
+
+def incr(key, delta=1, initial_value=None):
+    '''
+    Increment the value of a given key.
 
-def incr(key, delta=1):
-    memcache.incr(key, delta=delta)
+    Args:
+        key: key as str.
+        delta: delta to add, default to 1.
+        initial_value: if not None, used as initial value when key is not in cache.
+    Returns:
+        New value, or None if key is not in cache and initial_value is None.
+    '''
+    return memcache.incr(key, delta=delta, initial_value=initial_value)
+
+def offset_multi(mapping, initial_value=None):
+    '''
+    Add deltas (can be negative) to values of keys in one batch.
+
+    Args:
+        mapping: dict contains key as str and delta as int.
+        initial_value: if not None, used as initial value when key is not in cache.
+    Returns:
+        Dict contains key and new value, or None if key is not in cache and initial_value is None.
+    '''
+    return memcache.offset_multi(mapping, initial_value=initial_value)
@@ -6,6 +6,8 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import time
 import unittest
 
+from google.appengine.api import memcache
+
 from framework import gaeunit
 from framework import cache
 
@@ -43,6 +45,81 @@ class Test(gaeunit.GaeTestCase):
         time.sleep(1.2)
         self.assertEquals(None, cache.get(key))
 
+    def test_get_multi(self):
+        cache.set_multi({ 'm1' : 'a', 'm2' : ['b'], 'm3' : 3 })
+        self.assertEquals({ 'm1' : 'a', 'm2' : ['b'], 'm3' : 3 }, cache.get_multi(['m1', 'm2', 'm3', 'm4']))
+        # not in local cache:
+        cache.clear_local()
+        self.assertEquals({ 'm1' : 'a', 'm2' : ['b'] }, cache.get_multi(['m1', 'm2', 'm4']))
+        cache.delete_multi(['m1', 'm2'])
+        self.assertEquals({}, cache.get_multi(['m1', 'm2']))
+
+    def test_get_with_func(self):
+        L = []
+        def _load():
+            L.append(1)
+            return 'loaded'
+        self.assertEquals('loaded', cache.get('func', _load))
+        self.assertEquals('loaded', cache.get('func', _load))
+        cache.clear_local()
+        self.assertEquals('loaded', cache.get('func', _load))
+        self.assertEquals(1, len(L))
+        self.assertEquals('value', cache.get('value', 'value'))
+        self.assertEquals('value', cache.get('value'))
+
+    def test_lease(self):
+        # other caller is computing the value:
+        memcache.add(cache.LEASE_PREFIX + 'lease', 1, 10)
+        old_wait = cache.LEASE_WAIT
+        cache.LEASE_WAIT = 0.1
+        try:
+            self.assertEquals('computed', cache.get('lease', lambda: 'computed'))
+        finally:
+            cache.LEASE_WAIT = old_wait
+        # lease is released after computed:
+        cache.delete('lease')
+        memcache.delete(cache.LEASE_PREFIX + 'lease')
+        self.assertEquals('again', cache.get('lease', lambda: 'again'))
+        self.assertEquals(None, memcache.get(cache.LEASE_PREFIX + 'lease'))
+
+    def test_add(self):
+        self.assertTrue(cache.add('added', 1))
+        self.assertFalse(cache.add('added', 2))
+        self.assertEquals(1, cache.get('added'))
+        self.assertTrue(cache.add('added_obj', ['a']))
+        self.assertFalse(cache.add('added_obj', ['b']))
+        self.assertEquals(['a'], cache.get('added_obj'))
+
+    def test_version(self):
+        cache.set('ver', 'v1')
+        # updated by other instance:
+        memcache.set_multi({ 'ver' : cache._Stamped('other', 'v2'), cache.VERSION_PREFIX + 'ver' : 'other' })
+        self.assertEquals('v1', cache.get('ver'))
+        old_interval = cache.LOCAL_CHECK_INTERVAL
+        cache.LOCAL_CHECK_INTERVAL = 0
+        try:
+            self.assertEquals('v2', cache.get('ver'))
+            # deleted by other instance:
+            memcache.delete_multi(['ver', cache.VERSION_PREFIX + 'ver'])
+            self.assertEquals(None, cache.get('ver'))
+        finally:
+            cache.LOCAL_CHECK_INTERVAL = old_interval
+
+    def test_local_lru(self):
+        lc = cache._LocalCache(3)
+        for key in ('a', 'b', 'c'):
+            lc.put(key, key.upper(), None, 0, 0)
+        # 'a' is recently used:
+        self.assertEquals('A', lc.get('a', 0).value)
+        lc.put('d', 'D', None, 0, 0)
+        self.assertEquals(3, len(lc))
+        self.assertEquals(None, lc.get('b', 0))
+        self.assertEquals('A', lc.get('a', 0).value)
+        # expires:
+        lc.put('e', 'E', None, 10, 0)
+        self.assertEquals('E', lc.get('e', 5).value)
+        self.assertEquals(None, lc.get('e', 11))
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
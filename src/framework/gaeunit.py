@@ -62,6 +62,10 @@ class GaeTestCase(unittest.TestCase):
         _setup_env(appid)
         apiproxy_stub_map.apiproxy = _get_dev_apiproxy(appid)
 
+        # local cache must be cleared since memcache is new:
+        from framework import cache
+        cache.clear_local()
+
 def _get_app_id(app_yaml_file):
     '''
     Get application id from yaml file.
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Full-page output cache for anonymous GET requests, based on framework.cache.
+
+Each page is stored with the versions of its tags. Invalidate a tag makes
+a new version of the tag, so all pages stored with old version are treated
+as missed. A tag can be an app name (e.g. 'blog'), or a key of object 
+(e.g. ref of comments), and TAG_SITE is added to every page.
+
+An app enables page cache by defining '__page_cache__' (in seconds) in its 
+package, a route opts in by @get(pattern, page_cache=True), and a themed 
+page can add tags by '__cache_tags__' in model.
+'''
+
+import time
+import random
+import hashlib
+
+from framework import cache
+
+# tag that every cached page has:
+TAG_SITE = 'site'
+
+PAGE_KEY_PREFIX = '__page__'
+TAG_KEY_PREFIX = '__page_tag__'
+
+HITS_KEY = '__page_cache_hits__'
+MISSES_KEY = '__page_cache_misses__'
+
+# counters of current process:
+_local_stats = { 'hits' : 0, 'misses' : 0 }
+
+def make_key(path, query_string=''):
+    '''
+    Make cache key by path and query string.
+
+    Args:
+        path: request path like '/blog/post/123'.
+        query_string: query string without '?', default to ''.
+    Returns:
+        Cache key as str.
+    '''
+    url = path
+    if query_string:
+        url = '%s?%s' % (path, query_string)
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    return PAGE_KEY_PREFIX + hashlib.md5(url).hexdigest()
+
+def _new_version():
+    return '%.6f-%d' % (time.time(), random.randint(0, 999999))
+
+def _get_tag_versions(tags, create=False):
+    '''
+    Get versions of tags as dict in one batch, and create versions for missing tags if create is True.
+    '''
+    d = cache.get_multi([TAG_KEY_PREFIX + tag for tag in tags])
+    versions = {}
+    missing = {}
+    for tag in tags:
+        version = d.get(TAG_KEY_PREFIX + tag)
+        if version is None and create:
+            version = _new_version()
+            missing[TAG_KEY_PREFIX + tag] = version
+        versions[tag] = version
+    if missing:
+        cache.set_multi(missing)
+    return versions
+
+def invalidate(*tags):
+    '''
+    Invalidate all pages that have any of the tags.
+
+    Args:
+        tags: tag as str.
+    '''
+    version = _new_version()
+    d = {}
+    for tag in tags:
+        d[TAG_KEY_PREFIX + tag] = version
+    cache.set_multi(d)
+
+def _count(name, key):
+    _local_stats[name] += 1
+    cache.incr(key, initial_value=0)
+
+def get_page(key):
+    '''
+    Get cached page by key.
+
+    Args:
+        key: key made by make_key().
+    Returns:
+        Page as dict contains 'body', 'content_type' and 'headers', or None if not found.
+    '''
+    page = cache.get(key)
+    if page is not None and _get_tag_versions(page['tags'].keys())!=page['tags']:
+        page = None
+    if page is None:
+        _count('misses', MISSES_KEY)
+        return None
+    _count('hits', HITS_KEY)
+    return page
+
+def set_page(key, body, content_type=None, headers=None, tags=None, time=0):
+    '''
+    Put page into cache.
+
+    Args:
+        key: key made by make_key().
+        body: page content as str.
+        content_type: content type, default to None.
+        headers: list of (name, value) of response headers, default to None.
+        tags: list of tags, TAG_SITE is always added.
+        time: expires time, default to 0 (forever).
+    '''
+    all_tags = [TAG_SITE]
+    if tags:
+        all_tags.extend(tags)
+    versions = _get_tag_versions(all_tags, True)
+    cache.set(key, {
+            'body' : body,
+            'content_type' : content_type,
+            'headers' : headers or [],
+            'tags' : versions,
+    }, time)
+
+def get_stats():
+    '''
+    Get hit/miss counters.
+
+    Returns:
+        Dict contains 'hits' and 'misses' of all instances,
+        'local_hits' and 'local_misses' of current process.
+    '''
+    return {
+            'hits' : int(cache.get(HITS_KEY) or 0),
+            'misses' : int(cache.get(MISSES_KEY) or 0),
+            'local_hits' : _local_stats['hits'],
+            'local_misses' : _local_stats['misses'],
+    }
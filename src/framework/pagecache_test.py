@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+import unittest
+
+from framework.gaeunit import GaeTestCase
+from framework import pagecache
+
+class Test(GaeTestCase):
+
+    def test_make_key(self):
+        k1 = pagecache.make_key('/blog/post/123')
+        k2 = pagecache.make_key('/blog/post/123', 'offset=abc')
+        k3 = pagecache.make_key(u'/blog/post/123', '')
+        self.assertNotEquals(k1, k2)
+        self.assertEquals(k1, k3)
+        self.assertTrue(len(pagecache.make_key('/x' * 1000)) < 250)
+
+    def test_get_and_set_page(self):
+        key = pagecache.make_key('/blog/')
+        self.assertEquals(None, pagecache.get_page(key))
+        pagecache.set_page(key, '<html>blog</html>', 'text/html', [('X-Test', 'yes')], ['blog'])
+        page = pagecache.get_page(key)
+        self.assertEquals('<html>blog</html>', page['body'])
+        self.assertEquals('text/html', page['content_type'])
+        self.assertEquals([('X-Test', 'yes')], page['headers'])
+        stats = pagecache.get_stats()
+        self.assertEquals(1, stats['hits'])
+        self.assertEquals(1, stats['misses'])
+
+    def test_invalidate(self):
+        k1 = pagecache.make_key('/blog/post/1')
+        k2 = pagecache.make_key('/blog/post/2')
+        k3 = pagecache.make_key('/manage/')
+        pagecache.set_page(k1, 'post 1', tags=['blog', 'post-1'])
+        pagecache.set_page(k2, 'post 2', tags=['blog', 'post-2'])
+        pagecache.set_page(k3, 'manage', tags=['manage'])
+        # invalidate a single post:
+        pagecache.invalidate('post-1')
+        self.assertEquals(None, pagecache.get_page(k1))
+        self.assertEquals('post 2', pagecache.get_page(k2)['body'])
+        self.assertEquals('manage', pagecache.get_page(k3)['body'])
+        # invalidate app:
+        pagecache.invalidate('blog')
+        self.assertEquals(None, pagecache.get_page(k2))
+        self.assertEquals('manage', pagecache.get_page(k3)['body'])
+        # invalidate site:
+        pagecache.invalidate(pagecache.TAG_SITE)
+        self.assertEquals(None, pagecache.get_page(k3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,10 +9,13 @@ All storage-related class and functions.
 
 import datetime
 import random
+import cPickle as pickle
+import hashlib
 
 from google.appengine.ext import db as db
 
 from framework import cache
+from framework import pagecache
 from framework import ValidationError
 from framework import validator
 
@@ -66,18 +69,15 @@ def query_metadata(ref, name=None):
 
 def save_metadata(ref, **kw):
     '''
-    Save new meta data for specific reference.
+    Save new meta data for specific reference in one batch.
     '''
-    for name, value in kw:
-        MetaData(ref=ref, name=name, value=value).put()
+    db.put([MetaData(ref=ref, name=name, value=value) for name, value in kw.iteritems()])
 
 def delete_metadata(ref, names):
     '''
-    Delete meta data by names.
+    Delete meta data by names in one batch.
     '''
-    for meta in MetaData.all().filter('ref =', ref).fetch(MAX_METADATA):
-        if str(meta.name) in names:
-            meta.delete()
+    db.delete([meta for meta in MetaData.all().filter('ref =', ref).fetch(MAX_METADATA) if str(meta.name) in names])
 
 class MetaData(db.Model):
     '''
@@ -111,6 +111,36 @@ def get_user_by_key(key):
     '''
     return User.get(key)
 
+# cache key prefix of serialized user entity:
+USER_CACHE_KEY_PREFIX = '__user__'
+
+USER_CACHE_TIME = 3600
+
+def get_cached_user(key):
+    '''
+    Get user by key from cache, or None if not found. User is loaded from 
+    datastore only if it is not in cache, and a new User object is returned 
+    each time so it can be modified and put by caller.
+    '''
+    def load():
+        user = User.get(key)
+        if user is None:
+            return None
+        return db.model_to_protobuf(user).Encode()
+    data = cache.get(USER_CACHE_KEY_PREFIX + str(key), load, USER_CACHE_TIME)
+    if data is None:
+        return None
+    return db.model_from_protobuf(data)
+
+def get_cached_user_by_email(email):
+    '''
+    Get user by email from cache, or None if not found.
+    '''
+    return get_cached_user(db.Key.from_path(User.kind(), email))
+
+def _invalidate_users(users):
+    cache.delete_multi([USER_CACHE_KEY_PREFIX + user.id for user in users])
+
 def lock_or_unlock_users(keys, lock=True):
     '''
     Lock users by given keys or a single key.
@@ -123,13 +153,13 @@ def lock_or_unlock_users(keys, lock=True):
     users = []
     if  not isinstance(keys, list):
         keys = [keys]
-    for key in keys:
-        user = get_user_by_key(key)
+    for user in User.get(keys):
         if (user is not None) and (lock!=user.locked) and (not user.is_admin()):
             user.locked = lock
             users.append(user)
-    for user in users:
-        user.put()
+    if users:
+        db.put(users)
+        _invalidate_users(users)
     return len(users)
 
 def get_user_by_email(email):
@@ -154,10 +184,7 @@ def get_users(limit, cursor=None, role=None, order='-creation_date'):
     if role is not None:
         q = q.filter('role =', role)
     q = q.order(order)
-    result, next_cursor = get_by_cursor(q, cursor, limit)
-    if not has_more(q, next_cursor):
-        next_cursor = None
-    return result, next_cursor
+    return get_by_cursor(q, cursor, limit)
 
 def create_user(role, email, password, nicename):
     if role not in ROLES:
@@ -197,6 +224,15 @@ class User(BaseModel):
     nicename = db.StringProperty(default='')
     locked = db.BooleanProperty(required=True, default=False)
 
+    def put(self):
+        '''
+        Put user and remove it from cache, so password or locked changes 
+        take effect on next request.
+        '''
+        key = super(User, self).put()
+        _invalidate_users([self])
+        return key
+
     def is_admin(self):
         return self.role==ROLE_ADMINISTRATOR
 
@@ -207,36 +243,55 @@ class User(BaseModel):
 # Counter operation
 ###############################################################################
 
+# cache key of total of shards, which does not include buffered deltas:
 CACHE_KEY_PREFIX = '_sharded_counter_'
 
+# cached total of shards expires after seconds, so a total loaded while 
+# cron_flush_counts() is writing shards is not kept for long:
+CACHE_TIME = 60
+
+# cache key of deltas not yet written to shards:
+PENDING_KEY_PREFIX = '_sharded_counter_pending_'
+
+DEFAULT_SHARDS = 10
+
+def _shard_key_names(name, shards):
+    return [name + str(index) for index in range(shards)]
+
+def _load_count(name):
+    '''
+    Sum all shards of counter by one batch get, since shard names are 
+    deterministic from the number of shards.
+    '''
+    config = ShardedCounterConfig.get_by_key_name(name)
+    if config is None:
+        return 0
+    total = 0
+    for counter in ShardedCounter.get_by_key_name(_shard_key_names(name, config.shards)):
+        if counter is not None:
+            total += counter.count
+    return total
+
 def get_count(name):
     '''
-    Retrieve the value for a given sharded counter.
+    Retrieve the value for a given sharded counter, including deltas 
+    that are buffered but not flushed yet.
     
     Args:
         name: the name of the counter
     Returns:
         Integer value
     '''
-    total = cache.get(CACHE_KEY_PREFIX + name)
+    d = cache.get_multi([CACHE_KEY_PREFIX + name, PENDING_KEY_PREFIX + name])
+    total = d.get(CACHE_KEY_PREFIX + name)
     if total is None:
-        total = 0
-        for counter in ShardedCounter.all().filter('name =', name).fetch(1000):
-            total += counter.count
-        cache.set(CACHE_KEY_PREFIX + name, str(total))
-        return total
-    return int(total)
+        total = _load_count(name)
+        cache.set(CACHE_KEY_PREFIX + name, total, CACHE_TIME)
+    return int(total) + int(d.get(PENDING_KEY_PREFIX + name) or 0)
 
-def incr_count(name, delta=1):
-    '''
-    Increment the value for a given sharded counter.
-    
-    Args:
-        name: the name of the counter
-    '''
-    config = ShardedCounterConfig.get_or_insert(name, name=name)
+def _add_to_shard(name, shards, delta):
     def tx():
-        index = random.randint(0, config.shards-1)
+        index = random.randint(0, shards-1)
         shard_name = name + str(index)
         counter = ShardedCounter.get_by_key_name(shard_name)
         if counter is None:
@@ -244,7 +299,67 @@ def incr_count(name, delta=1):
         counter.count += delta
         counter.put()
     db.run_in_transaction(tx)
-    cache.incr(CACHE_KEY_PREFIX + name, delta=delta)
+
+def incr_count(name, delta=1, buffered=False):
+    '''
+    Increment the value for a given sharded counter.
+    
+    Args:
+        name: the name of the counter
+        delta: delta to add, default to 1.
+        buffered: if True, delta is buffered in memcache and written to 
+            shards by cron_flush_counts(), so only one memcache incr is 
+            made. Buffered deltas may be lost if memcache is flushed 
+            before written. Default to False.
+    
+    Raises:
+        ValueError if delta is negative and buffered is True, because 
+        memcache can not decrement a value below 0.
+    '''
+    if buffered:
+        if delta < 0:
+            raise ValueError('Buffered counter can not be decremented.')
+        pending = cache.incr(PENDING_KEY_PREFIX + name, delta=delta, initial_value=0)
+        # the first delta after buffer was created or flushed:
+        if pending==delta:
+            _register_buffered(name)
+    else:
+        config = ShardedCounterConfig.get_or_insert(name, name=name)
+        _add_to_shard(name, config.shards, delta)
+        cache.incr(CACHE_KEY_PREFIX + name, delta=delta)
+
+def _register_buffered(name):
+    '''
+    Mark counter as buffered so cron_flush_counts() can find it.
+    '''
+    config = ShardedCounterConfig.get_by_key_name(name)
+    if config is None or not config.buffered:
+        config = ShardedCounterConfig.get_or_insert(name, name=name)
+        config.buffered = True
+        config.put()
+
+def cron_flush_counts():
+    '''
+    Called by cron task. Write all buffered deltas to random shards.
+    
+    Returns:
+        Number of counters that were updated.
+    '''
+    configs = ShardedCounterConfig.all().filter('buffered =', True).fetch(1000)
+    pending = cache.get_multi([PENDING_KEY_PREFIX + config.name for config in configs])
+    n = 0
+    for config in configs:
+        key = PENDING_KEY_PREFIX + config.name
+        delta = int(pending.get(key) or 0)
+        if delta==0:
+            continue
+        _add_to_shard(config.name, config.shards, delta)
+        # take the delta away from buffer, increments after get_multi() are 
+        # kept, and cached total of shards is loaded again:
+        cache.offset_multi({ key : -delta })
+        cache.delete(CACHE_KEY_PREFIX + config.name)
+        n += 1
+    return n
 
 def incr_counter_shards(name, num):
     '''
@@ -267,7 +382,8 @@ class ShardedCounterConfig(db.Model):
     Tracks the number of shards for each named counter.
     '''
     name = db.StringProperty(required=True)
-    shards = db.IntegerProperty(required=True, default=10)
+    shards = db.IntegerProperty(required=True, default=DEFAULT_SHARDS)
+    buffered = db.BooleanProperty(required=True, default=False)
 
 class ShardedCounter(db.Model):
     '''
@@ -282,11 +398,120 @@ class ShardedCounter(db.Model):
 
 DEFAULT_GROUP = '__default__'
 
-def _get_setting(name, group):
+# maximum entities in a batch put or delete:
+MAX_BATCH = 500
+
+# cache key of snapshot version of group, and cache key of snapshot of group with version:
+SETTING_VERSION_KEY = '__setting_ver__%s'
+SETTING_SNAPSHOT_KEY = '__setting__%s__%d'
+
+def _delete_all(query):
+    '''
+    Delete all entities of a keys-only query in batches.
+    '''
+    while True:
+        keys = query.fetch(MAX_BATCH)
+        if not keys:
+            break
+        db.delete(keys)
+        if len(keys) < MAX_BATCH:
+            break
+
+def _check_group(group):
+    if not isinstance(group, basestring):
+        raise ValueError('Group must be basestring.')
+
+def _check_name(name):
+    if not isinstance(name, basestring):
+        raise ValueError('Name must be basestring.')
+
+def _get_legacy_settings(group):
+    '''
+    Get settings of group that saved as Setting entities before snapshot is used.
+    '''
+    d = {}
+    for setting in Setting.all().filter('group =', group).fetch(100):
+        # setting with key name overrides the one without:
+        if setting.key().name() or not setting.name in d:
+            d[setting.name] = setting.value
+    return d
+
+def _load_snapshots(groups):
+    '''
+    Load snapshots from datastore in one batch get.
+    
+    Returns:
+        Dict contains group as key, (version, settings) as value.
+    '''
+    r = {}
+    for group, sg in zip(groups, SettingGroup.get_by_key_name(groups)):
+        if sg is None:
+            r[group] = (0, _get_legacy_settings(group))
+        else:
+            r[group] = (sg.version, sg.get_settings())
+    return r
+
+def _cache_snapshots(snapshots):
     '''
-    Get setting object.
+    Put loaded snapshots into cache. Version key is added only if it is 
+    not in cache, so it never goes back to an old version.
     '''
-    return Setting.all().filter('name =', name).filter('group =', group).get()
+    d = {}
+    for group, (version, settings) in snapshots.iteritems():
+        d[SETTING_SNAPSHOT_KEY % (group, version)] = settings
+        cache.add(SETTING_VERSION_KEY % group, version)
+    cache.set_multi(d)
+
+def get_settings_multi(groups, use_cache=True):
+    '''
+    Get settings of groups. Only the version of each group is read from 
+    memcache, and snapshots of current versions are cached in process.
+    
+    Args:
+        groups: list of group as string.
+        use_cache: True if fetch from cache first. Default to True.
+    Returns:
+        Dict contains group as key, and settings as dict that contains 
+        setting name and value.
+    '''
+    for group in groups:
+        _check_group(group)
+    r = {}
+    missing = groups
+    if use_cache:
+        versions = cache.get_multi([SETTING_VERSION_KEY % group for group in groups])
+        keys = {}
+        for group in groups:
+            version = versions.get(SETTING_VERSION_KEY % group)
+            if version is not None:
+                keys[group] = SETTING_SNAPSHOT_KEY % (group, version)
+        snapshots = cache.get_multi(keys.values())
+        missing = []
+        for group in groups:
+            key = keys.get(group)
+            if key in snapshots:
+                r[group] = dict(snapshots[key])
+            else:
+                missing.append(group)
+    if missing:
+        snapshots = _load_snapshots(missing)
+        _cache_snapshots(snapshots)
+        for group, (version, settings) in snapshots.iteritems():
+            r[group] = dict(settings)
+    return r
+
+def get_settings(group=DEFAULT_GROUP, use_cache=True):
+    '''
+    Get settings as dict which belongs to specific group.
+    
+    Args:
+        group: setting group as string, default to DEFAULT_GROUP.
+        use_cache: True if fetch from cache first. Default to True.
+    Returns:
+        Dict contains key as setting name, value as setting value.
+    '''
+    _check_group(group)
+    return get_settings_multi([group], use_cache)[group]
 
 def get_setting(name, group=DEFAULT_GROUP, default_value=None):
     '''
@@ -299,14 +524,38 @@ def get_setting(name, group=DEFAULT_GROUP, default_value=None):
     Returns:
         Setting value as string or unicode.
     '''
-    if not isinstance(name, basestring):
-        raise ValueError('Name must be basestring.')
-    if not isinstance(group, basestring):
-        raise ValueError('Group must be basestring.')
-    setting = _get_setting(name, group)
-    if setting is None:
-        return default_value
-    return setting.value
+    _check_name(name)
+    return get_settings(group).get(name, default_value)
+
+def _update_snapshot(group, update):
+    '''
+    Update snapshot of group in transaction, bump version and put new 
+    snapshot into cache.
+    
+    Args:
+        group: setting group.
+        update: function that accept settings as dict and update it.
+    '''
+    legacy = None
+    if SettingGroup.get_by_key_name(group) is None:
+        legacy = _get_legacy_settings(group)
+    def tx():
+        sg = SettingGroup.get_by_key_name(group)
+        if sg is None:
+            sg = SettingGroup(key_name=group, version=0)
+            settings = legacy or {}
+        else:
+            settings = sg.get_settings()
+        update(settings)
+        sg.version += 1
+        sg.set_settings(settings)
+        sg.put()
+        return sg.version, settings
+    version, settings = db.run_in_transaction(tx)
+    cache.set_multi({
+            SETTING_SNAPSHOT_KEY % (group, version) : settings,
+            SETTING_VERSION_KEY % group : version,
+    })
 
 def delete_settings(group):
     '''
@@ -315,10 +564,9 @@ def delete_settings(group):
     Args:
         group: setting group as string.
     '''
-    if not isinstance(group, basestring):
-        raise ValueError('Group must be basestring.')
-    settings = Setting.all().filter('group =', group).fetch(100)
-    db.delete(settings)
+    _check_group(group)
+    _update_snapshot(group, lambda settings: settings.clear())
+    _delete_all(Setting.all(keys_only=True).filter('group =', group))
 
 def delete_setting(name, group=DEFAULT_GROUP):
     '''
@@ -330,13 +578,9 @@ def delete_setting(name, group=DEFAULT_GROUP):
     Returns:
         None
     '''
-    if not isinstance(name, basestring):
-        raise ValueError('Name must be basestring.')
-    if not isinstance(group, basestring):
-        raise ValueError('Group must be basestring.')
-    setting = _get_setting(name, group)
-    if setting is not None:
-        setting.delete()
+    _check_name(name)
+    _check_group(group)
+    _update_snapshot(group, lambda settings: settings.pop(name, None))
 
 def set_setting(name, value, group=DEFAULT_GROUP):
     '''
@@ -349,39 +593,68 @@ def set_setting(name, value, group=DEFAULT_GROUP):
     Returns:
         None
     '''
-    if not isinstance(name, basestring):
-        raise ValueError('Name must be basestring.')
-    if not isinstance(group, basestring):
-        raise ValueError('Group must be basestring.')
+    _check_name(name)
     if not isinstance(value, basestring):
         raise ValueError('Value must be basestring.')
-    setting = _get_setting(name, group)
-    if setting is None:
-        setting = Setting(name=name, group=group, value=value)
-    else:
-        setting.value = value
-    setting.put()
+    set_settings({ name : value }, group)
 
-def get_settings(group=DEFAULT_GROUP):
+def set_settings(settings, group=DEFAULT_GROUP):
     '''
-    Get settings (100 first) as dict which belongs to specific group.
+    Set settings of a group in one transaction.
     
     Args:
+        settings: dict contains setting name and value as string.
         group: setting group as string, default to DEFAULT_GROUP.
     Returns:
-        Dict contains key as setting name, value as setting value.
+        None
     '''
-    if not isinstance(group, basestring):
-        raise ValueError('Group must be basestring.')
-    settings = Setting.all().filter('group =', group).fetch(100)
-    d = {}
-    for setting in settings:
-        d[setting.name] = setting.value
-    return d
+    _check_group(group)
+    for name, value in settings.iteritems():
+        _check_name(name)
+        if not isinstance(value, basestring):
+            raise ValueError('Value must be basestring.')
+    _update_snapshot(group, lambda d: d.update(settings))
+
+def replace_settings(settings, group=DEFAULT_GROUP):
+    '''
+    Replace all settings of a group in one transaction. Settings not in 
+    the dict are removed.
+    
+    Args:
+        settings: dict contains setting name and value as string.
+        group: setting group as string, default to DEFAULT_GROUP.
+    Returns:
+        None
+    '''
+    _check_group(group)
+    for name, value in settings.iteritems():
+        _check_name(name)
+        if not isinstance(value, basestring):
+            raise ValueError('Value must be basestring.')
+    def update(d):
+        d.clear()
+        d.update(settings)
+    _update_snapshot(group, update)
+
+class SettingGroup(db.Model):
+    '''
+    Snapshot of all settings of a group, and key name is group.
+    '''
+    version = db.IntegerProperty(required=True, default=0)
+    snapshot = db.BlobProperty()
+
+    def get_settings(self):
+        if self.snapshot is None:
+            return {}
+        return pickle.loads(self.snapshot)
+
+    def set_settings(self, settings):
+        self.snapshot = db.Blob(pickle.dumps(settings, pickle.HIGHEST_PROTOCOL))
 
 class Setting(db.Model):
     '''
-    Settings that contains group, name and value.
+    Settings that contains group, name and value. It is replaced by 
+    SettingGroup and only read if group has no snapshot.
     '''
     name = db.StringProperty(required=True)
     group = db.StringProperty(required=True, default='__default__')
@@ -421,6 +694,7 @@ def create_comment(ref, email, name, content, ip, approval=True, pending_days=No
         pending_time = datetime.datetime.now() + datetime.timedelta(days=pending_days)
     c = Comment(ref=ref, email=email, name=name, content=content, ip=ip, approval=approval, pending_time=pending_time)
     c.put()
+    pagecache.invalidate(ref)
     return c
 
 def approve_comment(key):
@@ -431,6 +705,7 @@ def approve_comment(key):
     if (c is not None) and (not c.approval):
         c.approval = True
         c.put()
+        pagecache.invalidate(c.ref)
 
 def reject_comment(key):
     '''
@@ -441,6 +716,7 @@ def reject_comment(key):
         c.approval = False
         c.pending_time = None
         c.put()
+        pagecache.invalidate(c.ref)
 
 def delete_comment(key):
     '''
@@ -449,6 +725,7 @@ def delete_comment(key):
     c = Comment.get(key)
     if c is not None:
         c.delete()
+        pagecache.invalidate(c.ref)
 
 def delete_all_comments(ref_key):
     '''
@@ -465,9 +742,8 @@ def cron_delete_all_comments(ref_key):
     Delete all comments associated with the reference key. 
     ONLY called by cron job!!!
     '''
-    cs = Comment.all().filter('ref =', ref_key).fetch(1000)
-    for c in cs:
-        c.delete()
+    _delete_all(Comment.all(keys_only=True).filter('ref =', ref_key))
+    pagecache.invalidate(ref_key)
 
 class PendingDeleteComment(BaseModel):
     '''
@@ -491,16 +767,68 @@ class Comment(BaseModel):
 # Pagination operation
 ###############################################################################
 
-def get_by_page(query, page_index, page_size=20):
+# cache key prefix of cursor that starts a page:
+PAGE_CURSOR_KEY_PREFIX = '__page_cursor__'
+
+# expires time of cached page cursors, because page boundaries move when 
+# entities are added or removed:
+PAGE_CURSOR_CACHE_TIME = 600
+
+def _fetch_page(query, limit):
+    '''
+    Fetch limit+1 results in one query run, and trim the extra one which 
+    only tells there are more results.
+    
+    Returns:
+        A tuple that contains (results as list, cursor after the last 
+        result, or None if there is no more results).
+    '''
+    result = []
+    cursor = None
+    for entity in query.run(limit=limit+1):
+        if len(result)==limit:
+            return (result, cursor,)
+        result.append(entity)
+        if len(result)==limit:
+            # cursor points immediately after the last result pulled off:
+            cursor = query.cursor()
+    return (result, None,)
+
+def _page_cursor_key(signature, page_size, page_index):
+    if isinstance(signature, unicode):
+        signature = signature.encode('utf-8')
+    return '%s%s_%d_%d' % (PAGE_CURSOR_KEY_PREFIX, hashlib.md5(signature).hexdigest(), page_size, page_index)
+
+def _skip_pages(query, cursor, page_size, pages):
+    '''
+    Move forward from cursor for pages, and return cursors that start 
+    each of the following pages as list, which may be shorter than pages 
+    if reach the end of results.
+    '''
+    if cursor:
+        query.with_cursor(cursor)
+    cursors = []
+    n = 0
+    for entity in query.run(limit=page_size * pages):
+        n += 1
+        if n % page_size==0:
+            cursors.append(query.cursor())
+    return cursors
+
+def get_by_page(query, page_index, page_size=20, signature=None):
     '''
     Get query results by page, located by page index (starts from 1) and page size.
+    Cursors that start pages are cached with signature, so a page that 
+    was visited before is fetched in one query run from its cursor.
     
     Args:
         query: Query object.
         page_index: Page index, starts from 1.
         page_size: Page size, default to 20, maximum to 100.
+        signature: string that identifies the query (kind, filters and order), 
+            or None if do not cache cursors.
     Returns:
-        A tuple contains (results as list, next cursor position).
+        A tuple contains (results as list, next cursor position, or None if no more results).
     Raises:
         Value error if page index < 1, or page_size < 1, or page_size > 100, or page_index*page_size>1000.
     '''
@@ -510,9 +838,34 @@ def get_by_page(query, page_index, page_size=20):
         raise ValueError('Page size must be 1 to 100.')
     if page_index * page_size > 1000:
         raise ValueError('Results out of 1000.')
-    result = query.fetch(page_size, (page_index - 1) * page_size)
-    cursor = query.cursor()
-    return (result, cursor,)
+    # find the nearest page that has a known cursor:
+    known_index = 1
+    cursor = None
+    if page_index > 1 and signature is not None:
+        keys = [_page_cursor_key(signature, page_size, i) for i in range(2, page_index + 1)]
+        cursors = cache.get_multi(keys)
+        for i in range(page_index, 1, -1):
+            c = cursors.get(_page_cursor_key(signature, page_size, i))
+            if c:
+                known_index = i
+                cursor = c
+                break
+    if known_index < page_index:
+        skipped = _skip_pages(query, cursor, page_size, page_index - known_index)
+        if signature is not None and skipped:
+            d = {}
+            for n, c in enumerate(skipped):
+                d[_page_cursor_key(signature, page_size, known_index + n + 1)] = c
+            cache.set_multi(d, PAGE_CURSOR_CACHE_TIME)
+        if len(skipped) < page_index - known_index:
+            return ([], None,)
+        cursor = skipped[-1]
+    if cursor:
+        query.with_cursor(cursor)
+    result, next_cursor = _fetch_page(query, page_size)
+    if next_cursor and signature is not None:
+        cache.set(_page_cursor_key(signature, page_size, page_index + 1), next_cursor, PAGE_CURSOR_CACHE_TIME)
+    return (result, next_cursor,)
 
 def get_by_cursor(query, cursor=None, limit=20):
     '''
@@ -523,12 +876,11 @@ def get_by_cursor(query, cursor=None, limit=20):
         cursor: current cursor, default to None.
         limit: maximum results returned, default to 20.
     Returns:
-        A tuple that contains (results as list, next cursor position).
+        A tuple that contains (results as list, next cursor position, or None if no more results).
     '''
     if cursor:
         query.with_cursor(cursor)
-    result = query.fetch(limit)
-    return (result, query.cursor(),)
+    return _fetch_page(query, limit)
 
 def has_more(query, cursor):
     '''
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Benchmark of batch store operations against local datastore stub, 
+compared with the one-entity-per-call operations before.
+
+Usage: python framework/store_bench.py [comments]
+'''
+
+import sys
+import time
+
+from framework import gaeunit
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.ext import db
+
+class _RpcCounter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, service, call, request, response):
+        self.count += 1
+
+def _setup():
+    gaeunit.GaeTestCase('run').setUp()
+    counter = _RpcCounter()
+    apiproxy_stub_map.apiproxy.GetPreCallHooks().Append('rpc_counter', counter, 'datastore_v3')
+    return counter
+
+def _legacy_set_setting(store, name, value, group):
+    setting = store.Setting.all().filter('name =', name).filter('group =', group).get()
+    if setting is None:
+        setting = store.Setting(name=name, group=group, value=value)
+    else:
+        setting.value = value
+    setting.put()
+
+def _legacy_delete_all_comments(store, ref):
+    for c in store.Comment.all().filter('ref =', ref).fetch(1000):
+        c.delete()
+
+def _measure(counter, title, func):
+    counter.count = 0
+    start = time.time()
+    func()
+    print '  %-40s %5d rpc(s) %8.3f s' % (title, counter.count, time.time() - start)
+
+def main(comments=300):
+    counter = _setup()
+    from framework import store
+    import siteconfig
+    settings = {}
+    for key in siteconfig.Site.__slots__:
+        settings[key] = str(siteconfig.Site.defaults[key])
+    print 'save %d site settings:' % len(settings)
+    def _legacy_settings():
+        for k, v in settings.iteritems():
+            _legacy_set_setting(store, k, v, 'legacy_site')
+    _measure(counter, 'query + put per setting', _legacy_settings)
+    _measure(counter, 'store.set_settings()', lambda: store.set_settings(settings, 'batch_site'))
+
+    print 'read site settings 100 times:'
+    def _legacy_read():
+        for i in range(100):
+            for k in settings:
+                store.Setting.all().filter('name =', k).filter('group =', 'legacy_site').get()
+    def _snapshot_read():
+        for i in range(100):
+            store.get_settings('batch_site')
+    _measure(counter, 'query per setting', _legacy_read)
+    _measure(counter, 'store.get_settings() from snapshot', _snapshot_read)
+
+    print 'count 100 page views:'
+    def _incr(buffered):
+        for i in range(100):
+            store.incr_count('views', buffered=buffered)
+    _measure(counter, 'store.incr_count()', lambda: _incr(False))
+    _measure(counter, 'store.incr_count(buffered=True)', lambda: _incr(True))
+    _measure(counter, 'store.cron_flush_counts()', store.cron_flush_counts)
+
+    print 'purge %d comments:' % comments
+    for ref in ('legacy_ref', 'batch_ref'):
+        db.put([store.Comment(ref=ref, email='guest@example.com', name='Guest', content='No. %d' % i) for i in range(comments)])
+    _measure(counter, 'delete per comment', lambda: _legacy_delete_all_comments(store, 'legacy_ref'))
+    _measure(counter, 'store.cron_delete_all_comments()', lambda: store.cron_delete_all_comments('batch_ref'))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -43,6 +43,13 @@ class Test(GaeTestCase):
         store.cron_delete_all_comments(ref)
         self.assertEquals(0, len(store.get_all_comments(ref)))
 
+    def test_cron_delete_many_comments(self):
+        ref = 'many-comments'
+        for i in range(store.MAX_BATCH + 10):
+            store.Comment(ref=ref, email='guest@example.com', name='Guest', content='No. %d' % i).put()
+        store.cron_delete_all_comments(ref)
+        self.assertEquals(0, len(store.get_all_comments(ref)))
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
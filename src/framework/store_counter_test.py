@@ -6,6 +6,7 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import unittest
 import threading
 
+from framework import cache
 from framework import gaeunit
 from framework import store
 
@@ -56,6 +57,63 @@ class Test(gaeunit.GaeTestCase):
             t.join()
         self.assertEquals(1+2+3+4+5+6+7+8+9, store.get_count(name))
 
+    def test_batch_get_shards(self):
+        name = 'batch'
+        store.incr_counter_shards(name, 20)
+        for i in range(40):
+            store.incr_count(name)
+        cache.delete(store.CACHE_KEY_PREFIX + name)
+        self.assertEquals(40, store.get_count(name))
+
+    def test_buffered(self):
+        name = 'buffered'
+        for i in range(10):
+            store.incr_count(name, 2, buffered=True)
+        # counted but not written to shards:
+        self.assertEquals(20, store.get_count(name))
+        self.assertEquals(0, store._load_count(name))
+        self.assertEquals(1, store.cron_flush_counts())
+        self.assertEquals(20, store._load_count(name))
+        self.assertEquals(0, store.cron_flush_counts())
+        store.incr_count(name, 5, buffered=True)
+        store.incr_count(name, 1)
+        self.assertEquals(26, store.get_count(name))
+        store.cron_flush_counts()
+        cache.delete(store.CACHE_KEY_PREFIX + name)
+        self.assertEquals(26, store.get_count(name))
+
+    def test_buffered_one_rpc(self):
+        name = 'buffered_rpc'
+        store.incr_count(name, buffered=True)
+        calls = []
+        old = cache.incr
+        def incr(*args, **kw):
+            calls.append(args)
+            return old(*args, **kw)
+        cache.incr = incr
+        try:
+            for i in range(10):
+                store.incr_count(name, buffered=True)
+        finally:
+            cache.incr = old
+        self.assertEquals(10, len(calls))
+        self.assertEquals(11, store.get_count(name))
+
+    def test_buffered_negative_delta(self):
+        name = 'buffered_negative'
+        self.assertRaises(ValueError, lambda: store.incr_count(name, -1, buffered=True))
+        self.assertEquals(None, cache.get(store.PENDING_KEY_PREFIX + name))
+
+    def test_flush_reloads_total(self):
+        name = 'buffered_flush'
+        store.incr_count(name, 3, buffered=True)
+        # cached total of shards is 0 before flush:
+        self.assertEquals(3, store.get_count(name))
+        store.cron_flush_counts()
+        self.assertEquals(None, cache.get(store.CACHE_KEY_PREFIX + name))
+        self.assertEquals(3, store.get_count(name))
+        self.assertEquals(3, cache.get(store.CACHE_KEY_PREFIX + name))
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
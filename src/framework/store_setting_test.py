@@ -6,8 +6,11 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import unittest
 
 from framework.gaeunit import GaeTestCase
+from framework import cache
 from framework import store
 
+from google.appengine.api import memcache
+
 class Test(GaeTestCase):
 
     def test_set_setting(self):
@@ -66,6 +69,65 @@ class Test(GaeTestCase):
         store.delete_setting(name, group)
         self.assertEquals(None, store.get_setting(name, group))
 
+    def test_set_settings(self):
+        group = 'batch_grp'
+        store.set_settings(dict([('k%d' % i, 'v%d' % i) for i in range(16)]), group)
+        ss = store.get_settings(group)
+        self.assertEquals(16, len(ss))
+        for i in range(16):
+            self.assertEquals('v%d' % i, ss['k%d' % i])
+            self.assertEquals('v%d' % i, store.get_setting('k%d' % i, group))
+        # overwrite:
+        store.set_settings({ 'k0' : 'new' }, group)
+        self.assertEquals('new', store.get_setting('k0', group))
+        self.assertEquals(16, len(store.get_settings(group)))
+        self.assertRaises(ValueError, lambda: store.set_settings({ 'k' : 123 }, group))
+
+    def test_legacy_setting(self):
+        group = 'legacy_grp'
+        store.Setting(name='color', group=group, value='red').put()
+        self.assertEquals('red', store.get_setting('color', group))
+        self.assertEquals({ 'color' : 'red' }, store.get_settings(group))
+        store.set_setting('color', 'blue', group)
+        self.assertEquals('blue', store.get_setting('color', group))
+        self.assertEquals({ 'color' : 'blue' }, store.get_settings(group))
+        store.delete_setting('color', group)
+        self.assertEquals(None, store.get_setting('color', group))
+
+    def test_replace_settings(self):
+        group = 'replace_grp'
+        store.set_settings({ 'a' : '1', 'b' : '2' }, group)
+        store.replace_settings({ 'b' : '3', 'c' : '4' }, group)
+        self.assertEquals({ 'b' : '3', 'c' : '4' }, store.get_settings(group))
+
+    def test_snapshot(self):
+        group = 'snapshot_grp'
+        store.set_settings({ 'a' : '1', 'b' : '2' }, group)
+        store.set_setting('c', '3', group)
+        sg = store.SettingGroup.get_by_key_name(group)
+        self.assertEquals(2, sg.version)
+        self.assertEquals({ 'a' : '1', 'b' : '2', 'c' : '3' }, sg.get_settings())
+        # modify returned dict does not affect cached snapshot:
+        d = store.get_settings(group)
+        d['a'] = 'changed'
+        self.assertEquals('1', store.get_setting('a', group))
+        # load from datastore if cache is cleared:
+        memcache.flush_all()
+        cache.clear_local()
+        self.assertEquals({ 'a' : '1', 'b' : '2', 'c' : '3' }, store.get_settings(group))
+        # new version is visible immediately:
+        store.delete_setting('b', group)
+        self.assertEquals({ 'a' : '1', 'c' : '3' }, store.get_settings(group))
+        self.assertEquals({ 'a' : '1', 'c' : '3' }, store.get_settings(group, False))
+
+    def test_get_settings_multi(self):
+        store.set_settings({ 'x' : '1' }, 'grp_x')
+        store.set_settings({ 'y' : '2' }, 'grp_y')
+        d = store.get_settings_multi(['grp_x', 'grp_y', 'grp_z'])
+        self.assertEquals({ 'x' : '1' }, d['grp_x'])
+        self.assertEquals({ 'y' : '2' }, d['grp_y'])
+        self.assertEquals({}, d['grp_z'])
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
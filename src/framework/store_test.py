@@ -8,6 +8,8 @@ import unittest
 from google.appengine.ext import db as db
 
 from framework.gaeunit import GaeTestCase
+from framework import cache
+from framework import store
 from framework.store import BaseModel
 
 class TestModel(BaseModel):
@@ -30,6 +32,44 @@ class Test(GaeTestCase):
         self.assertFalse(m.id is None)
         self.assertEquals(m.id, str(m.key()))
 
+    def test_metadata(self):
+        ref = 'ref-123'
+        store.save_metadata(ref, website='http://www.expressme.org', twitter='expressme')
+        self.assertEquals({ 'website' : 'http://www.expressme.org', 'twitter' : 'expressme' }, store.query_metadata(ref))
+        self.assertEquals({ 'twitter' : 'expressme' }, store.query_metadata(ref, 'twitter'))
+        store.delete_metadata(ref, ['website'])
+        self.assertEquals({ 'twitter' : 'expressme' }, store.query_metadata(ref))
+
+    def test_get_by_cursor(self):
+        db.put([TestModel(name='m-%02d' % i) for i in range(25)])
+        q = TestModel.all().order('name')
+        ms, cursor = store.get_by_cursor(q, None, 10)
+        self.assertEquals(['m-%02d' % i for i in range(10)], [m.name for m in ms])
+        ms, cursor = store.get_by_cursor(TestModel.all().order('name'), cursor, 10)
+        self.assertEquals(['m-%02d' % i for i in range(10, 20)], [m.name for m in ms])
+        self.assertFalse(cursor is None)
+        ms, cursor = store.get_by_cursor(TestModel.all().order('name'), cursor, 10)
+        self.assertEquals(['m-%02d' % i for i in range(20, 25)], [m.name for m in ms])
+        self.assertTrue(cursor is None)
+        # exactly fit:
+        ms, cursor = store.get_by_cursor(TestModel.all().order('name'), None, 25)
+        self.assertEquals(25, len(ms))
+        self.assertTrue(cursor is None)
+
+    def test_get_by_page(self):
+        db.put([TestModel(name='m-%02d' % i) for i in range(25)])
+        for signature in (None, 'TestModel:name'):
+            ms, cursor = store.get_by_page(TestModel.all().order('name'), 3, 10, signature)
+            self.assertEquals(['m-%02d' % i for i in range(20, 25)], [m.name for m in ms])
+            self.assertTrue(cursor is None)
+            ms, cursor = store.get_by_page(TestModel.all().order('name'), 2, 10, signature)
+            self.assertEquals(['m-%02d' % i for i in range(10, 20)], [m.name for m in ms])
+            self.assertFalse(cursor is None)
+            ms, cursor = store.get_by_page(TestModel.all().order('name'), 4, 10, signature)
+            self.assertEquals([], ms)
+        # cursors are cached:
+        self.assertFalse(cache.get(store._page_cursor_key('TestModel:name', 10, 3)) is None)
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
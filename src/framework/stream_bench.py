@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Benchmark of rendering a large themed page: blog/view/posts.html embedded
+in a simple theme, rendered to string and written to response (before)
+vs. streamed to response with the app view included lazily (after).
+
+Peak memory is the growth of peak RSS while rendering, and each mode runs
+in a new process. Time to first byte is the time until the first write
+to response. The response discards written data, so only memory used by
+rendering is measured.
+
+Usage: PYTHONPATH=. python framework/stream_bench.py [size_mb]
+'''
+
+import sys
+import time
+import resource
+import subprocess
+
+from Cheetah.Template import Template
+
+from framework import view
+from framework.view_bench import _Category, _Post, _Utils
+
+_THEME = '''<html>
+<head><title>$title</title></head>
+<body>
+<div id="header">$title</div>
+<div id="app">
+%s
+</div>
+<div id="footer">Copyright&copy;2010</div>
+</body>
+</html>
+'''
+
+_THEME_BEFORE = _THEME % '${__app____raw__}'
+_THEME_AFTER = _THEME % '#include $__app__'
+
+class _Out(object):
+    '''
+    File-like response that only records time of first write and size.
+    '''
+    def __init__(self, start):
+        self.start = start
+        self.first = None
+        self.size = 0
+
+    def write(self, s):
+        if self.first is None:
+            self.first = time.time() - self.start
+        self.size += len(s)
+
+def _make_page(size_mb, theme):
+    category = _Category('cat-key', u'Café')
+    content = u'<p>%s</p>' % (u'Content with <b>html</b> and café. ' * 25)
+    posts = []
+    for n in range(size_mb * 1024 * 1024 / (len(content) + 400)):
+        p = _Post(n, category)
+        p.content = content
+        posts.append(p)
+    model = {
+            '__view__' : 'posts',
+            'posts' : posts,
+            'utils' : _Utils(),
+            'index' : 1,
+            'next' : None,
+            'offset' : None,
+    }
+    app = view.get_template_class('blog', 'posts')(searchList=[model], filter='WebSafe')
+    cls = Template.compile(source=theme, compilerSettings=view.COMPILER_SETTINGS)
+    return cls(searchList=[{ '__app__' : app, 'title' : 'Stream' }], filter='WebSafe')
+
+def _status(name):
+    f = open('/proc/self/status')
+    try:
+        for line in f:
+            if line.startswith(name + ':'):
+                return int(line.split()[1])
+    finally:
+        f.close()
+
+def _reset_max_rss():
+    '''
+    Reset peak RSS to current RSS (Linux 4.0+) so peak of setup is not 
+    counted, and return current RSS in KB.
+    '''
+    try:
+        f = open('/proc/self/clear_refs', 'w')
+        try:
+            f.write('5')
+        finally:
+            f.close()
+        return _status('VmRSS')
+    except (IOError, TypeError):
+        return _max_rss()
+
+def _max_rss():
+    try:
+        return _status('VmHWM')
+    except IOError:
+        # KB on Linux:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run(mode, size_mb):
+    t = _make_page(size_mb, mode=='before' and _THEME_BEFORE or _THEME_AFTER)
+    rss = _reset_max_rss()
+    start = time.time()
+    out = _Out(start)
+    if mode=='before':
+        out.write(str(t))
+    else:
+        view.stream(t, out)
+    elapsed = time.time() - start
+    print '%d %f %f %d' % (out.size, out.first, elapsed, _max_rss() - rss)
+
+def main(size_mb=5):
+    print 'render themed posts.html of about %d MB:' % size_mb
+    for mode, title in (('before', 'str() then write (before)'), ('after', 'stream() (after)')):
+        output = subprocess.Popen([sys.executable, __file__, '--run', mode, str(size_mb)], stdout=subprocess.PIPE).communicate()[0]
+        size, first, elapsed, rss = output.split()
+        print '  %-28s %6.2f MB, TTFB %8.1f ms, total %8.1f ms, peak memory +%6.1f MB' % (title, int(size) / 1024.0 / 1024.0, float(first) * 1000, float(elapsed) * 1000, int(rss) / 1024.0)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args and args[0]=='--run':
+        run(args[1], int(args[2]))
+    else:
+        main(*[int(arg) for arg in args])
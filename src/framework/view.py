@@ -5,12 +5,26 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 
 '''
 View rendering using Cheetah.
+
+Compiled template classes are kept in a registry shared by all requests, 
+so a render only instantiates a template and fills it. A class is loaded 
+from build output (compiled.<app>.<view_dir>.<view_name>), or compiled 
+on first use if build output is absent. Code compiled at runtime is kept 
+in memcache, so other instances load it instead of compiling again.
+
+A rendered template can be streamed to response by stream(), which writes 
+encoded chunks instead of making the whole page as a string.
 '''
 
 import os
 import logging
+import threading
+
+from google.appengine.api import memcache
 
 from Cheetah.Template import Template
+from Cheetah.CompileCache import MemcachedCompileCache
+from Cheetah.DummyTransaction import StreamingTransaction
 
 from framework import ApplicationError
 
@@ -20,6 +34,22 @@ class RenderError(ApplicationError):
     '''
     pass
 
+# check modified time of template file when rendering, so a changed template 
+# is re-compiled. Template files are not deployed, so it is off on server:
+CHECK_MODIFIED = not os.environ.get('SERVER_SOFTWARE', '').startswith('Google')
+
+# Cheetah compiler settings used to compile all views, both by 'build.py' and 
+# at runtime:
+COMPILER_SETTINGS = {}
+
+# persistent compile cache of views compiled at runtime, and keys are hashes 
+# of template content, settings and versions:
+COMPILE_CACHE = MemcachedCompileCache(memcache, prefix='__cheetah__')
+
+# compiled classes, key is (appname, view_dir, view_name), value is (class, mtime):
+_registry = {}
+_registry_lock = threading.Lock()
+
 def get_template_path(appname, view_name, view_dir='view', ext='.html'):
     '''
     Get template path by app name, view name, view dir and view file extension.
@@ -55,7 +85,58 @@ def compile_template(appname, view_name, view_dir='view'):
     '''
     view_path = get_template_path(appname, view_name, view_dir=view_dir)
     logging.info('Compiling view %s...' % view_path)
-    return Template.compile(file=view_path, source=None, returnAClass=False, moduleName='compiled.%s.%s.%s' % (appname, view_dir, view_name), className='CompiledTemplate')
+    return Template.compile(file=view_path, source=None, returnAClass=False, moduleName='compiled.%s.%s.%s' % (appname, view_dir, view_name), className='CompiledTemplate', compilerSettings=COMPILER_SETTINGS)
+
+def _get_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def get_template_class(appname, view_name, view_dir='view'):
+    '''
+    Get compiled template class from registry, or load it if not found or 
+    template file was modified.
+    
+    Args:
+        appname: app name.
+        view_name: view name of template.
+        view_dir: view dir name, default to 'view'.
+    Returns:
+        CompiledTemplate class.
+    '''
+    key = (appname, view_dir, view_name)
+    entry = _registry.get(key)
+    if entry is not None and not CHECK_MODIFIED:
+        return entry[0]
+    view_path = get_template_path(appname, view_name, view_dir=view_dir)
+    mtime = _get_mtime(view_path)
+    if entry is not None and entry[1]==mtime:
+        return entry[0]
+    _registry_lock.acquire()
+    try:
+        # may be loaded by other thread:
+        entry = _registry.get(key)
+        if entry is not None and entry[1]==mtime:
+            return entry[0]
+        cls = None
+        if entry is None:
+            cls = import_compiled_template('compiled.%s.%s.%s' % key)
+        if cls is None:
+            if mtime is None:
+                raise RenderError('Template is not found: %s' % view_path)
+            logging.info('Compiling view at runtime: %s' % view_path)
+            cls = Template.compile(file=view_path, className='CompiledTemplate', compilerSettings=COMPILER_SETTINGS, compileCache=COMPILE_CACHE)
+        _registry[key] = (cls, mtime)
+        return cls
+    finally:
+        _registry_lock.release()
+
+def clear_registry():
+    '''
+    Remove all compiled classes in registry.
+    '''
+    _registry.clear()
 
 def render(appname, model, view_dir='view'):
     '''
@@ -68,11 +149,42 @@ def render(appname, model, view_dir='view'):
     view_name = model.get('__view__')
     if view_name is None:
         raise RenderError('View is not set.')
-    cc = import_compiled_template('compiled.%s.%s.%s' % (appname, view_dir, view_name))
-    if cc is not None:
-        return cc(searchList=[model], filter='WebSafe')
-    view_path = get_template_path(appname, view_name, view_dir=view_dir)
-    logging.info('Render view at runtime: %s' % view_path)
-    if not os.path.isfile(view_path):
-        raise RenderError('Template is not found: %s' % view_path)
-    return Template(file=view_path, searchList=[model], filter='WebSafe')
+    cls = get_template_class(appname, view_name, view_dir)
+    return cls(searchList=[model], filter='WebSafe')
+
+def stream(t, out, encoding='utf-8'):
+    '''
+    Render a template by writing encoded chunks to a file-like object.
+
+    Args:
+        t: template object returned by render().
+        out: file-like object like response.out.
+        encoding: output encoding, default to 'utf-8'.
+    '''
+    trans = StreamingTransaction(out, encoding)
+    t.respond(trans=trans)
+    trans.response().flush()
+
+# app name -> { asset name : list of urls }:
+_app_assets = {}
+
+def get_app_assets(appname):
+    '''
+    Get css and js urls of app as dict contains asset name as key and list 
+    of urls as value. The content-hashed bundles made by 'build.py' are used 
+    if asset manifest exists, otherwise the source files of '__assets__' 
+    defined in app package.
+    '''
+    assets = _app_assets.get(appname)
+    if assets is None:
+        assets = {}
+        try:
+            from compiled import asset_manifest
+            assets.update(getattr(asset_manifest, 'APP_ASSETS', {}).get(appname, {}))
+        except ImportError:
+            pass
+        for name, urls in getattr(__import__(appname), '__assets__', {}).iteritems():
+            if name not in assets:
+                assets[name] = list(urls)
+        _app_assets[appname] = assets
+    return assets
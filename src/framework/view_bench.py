@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Benchmark of rendering blog/view/posts.html with a listing of posts, 
+compiled with dotted names passed as strings to NameMapper (before) vs. 
+split into chunks at compile time (after), and with optimizationLevel 2 
+which collects output of #for loops in a list.
+
+Usage: PYTHONPATH=. python framework/view_bench.py [posts] [loops]
+'''
+
+import sys
+import time
+import datetime
+
+from Cheetah.Template import Template
+
+from framework import view
+
+class _Category(object):
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+class _Post(object):
+
+    def __init__(self, n, category):
+        self.id = 'post-key-%d' % n
+        self.title = 'Post title %d' % n
+        self.category = category
+        self.creation_date = datetime.datetime(2010, 1, 1) + datetime.timedelta(hours=n)
+        self.content = '<p>Content of post %d with <b>html</b>.</p>' % n
+
+class _Utils(object):
+
+    def format_datetime(self, dt):
+        return dt.strftime('%Y-%m-%d %H:%M')
+
+def _compile(use_chunks, level=0):
+    settings = view.COMPILER_SETTINGS.copy()
+    settings['useNameMapperChunks'] = use_chunks
+    settings['optimizationLevel'] = level
+    return Template.compile(file=view.get_template_path('blog', 'posts'), className='CompiledTemplate', compilerSettings=settings)
+
+def _render(cls, model):
+    return str(cls(searchList=[model], filter='WebSafe'))
+
+def _measure(title, cls, model, loops):
+    # use the best of loops to reduce noise:
+    best = None
+    for i in range(loops):
+        start = time.time()
+        _render(cls, model)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print '  %-32s %8.3f ms/page' % (title, best * 1000)
+
+def main(posts=50, loops=50):
+    category = _Category('cat-key', 'Python')
+    model = {
+            '__view__' : 'posts',
+            'posts' : [_Post(n, category) for n in range(posts)],
+            'utils' : _Utils(),
+            'index' : 1,
+            'next' : None,
+            'offset' : None,
+    }
+    before = _compile(False)
+    after = _compile(True)
+    optimized = _compile(True, 2)
+    if _render(before, model)!=_render(after, model) or _render(after, model)!=_render(optimized, model):
+        print 'ERROR: different output!'
+    print 'render posts.html with %d posts:' % posts
+    _measure('name as string (before)', before, model, loops)
+    _measure('name chunks (after)', after, model, loops)
+    _measure('name chunks, optimizationLevel 2', optimized, model, loops)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
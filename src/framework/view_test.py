@@ -5,9 +5,27 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 
 import os
 import unittest
+import StringIO
+
+from Cheetah.Template import Template
 
 from framework import view
 
+class _CompileCache(object):
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+
+    def get(self, key):
+        val = self.cache.get(key)
+        if val is not None:
+            self.hits += 1
+        return val
+
+    def set(self, key, val):
+        self.cache.set(key, val)
+
 class Test(unittest.TestCase):
 
     def test_get_template_path(self):
@@ -40,6 +58,46 @@ class Test(unittest.TestCase):
         self.assertTrue(t.find('<h1>Life &amp; Style</h1>')>=0)
         self.assertTrue(t.find('<p>Life & Style</p>')>=0)
 
+    def test_stream(self):
+        model = {
+                '__view__' : 'main',
+                'title' : u'Life & Caf\u00e9',
+        }
+        out = StringIO.StringIO()
+        view.stream(view.render('http_test', model), out)
+        self.assertEquals(str(view.render('http_test', model)), out.getvalue())
+        self.assertTrue(out.getvalue().find('<h1>Life &amp; Caf\xc3\xa9</h1>')>=0)
+
+    def test_get_template_class(self):
+        view.clear_registry()
+        cls = view.get_template_class('http_test', 'main')
+        self.assertTrue(cls is view.get_template_class('http_test', 'main'))
+        self.assertTrue(cls is not view.get_template_class('http_test', 'custom', view_dir='custom_view'))
+        self.assertRaises(view.RenderError, view.get_template_class, 'http_test', 'undefined')
+        # re-compile if template is modified:
+        old = view.CHECK_MODIFIED
+        view.CHECK_MODIFIED = True
+        try:
+            view._registry[('http_test', 'view', 'main')] = (cls, 0)
+            view.get_template_class('http_test', 'main')
+            self.assertNotEquals(0, view._registry[('http_test', 'view', 'main')][1])
+        finally:
+            view.CHECK_MODIFIED = old
+
+    def test_compile_cache(self):
+        old = view.COMPILE_CACHE
+        view.COMPILE_CACHE = _CompileCache(old)
+        try:
+            for i in range(2):
+                # as a new instance:
+                view.clear_registry()
+                Template._CHEETAH_compileCache.clear()
+                cls = view.get_template_class('http_test', 'custom', view_dir='custom_view')
+                self.assertTrue(str(cls(searchList=[{ 'title' : 'Cache' }])).find('<h1>Cache</h1>')>=0)
+            self.assertEquals(1, view.COMPILE_CACHE.hits)
+        finally:
+            view.COMPILE_CACHE = old
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -8,6 +8,7 @@ Web MVC framework for AppEngine/WebOb.
 '''
 
 import re
+import sys
 import time
 import urllib
 import inspect
@@ -16,6 +17,8 @@ import logging
 from google.appengine.ext import webapp
 
 from framework import ApplicationError
+from framework import cache
+from framework import pagecache
 from framework import view
 
 import interceptor
@@ -24,6 +27,10 @@ import theme
 COOKIE_EXPIRES_MIN = 86400
 COOKIE_EXPIRES_MAX = 31536000
 
+# write rendered templates to response chunk by chunk, instead of rendering 
+# the whole page as string first. Pages put into page cache are not streamed:
+STREAM_RESPONSE = True
+
 class WebError(ApplicationError):
     pass
 
@@ -42,6 +49,257 @@ class Context(dict):
     def __setattr__(self, name, value):
         self[name] = value
 
+# names of keyword args that can be passed to controller function:
+KW_NAMES = ('environ', 'headers', 'cookies', 'request', 'response', 'context', 'current_user')
+
+_KW_GETTERS = {
+        'environ' : lambda ctx: ctx._handler.request.environ,
+        'headers' : lambda ctx: ctx._handler.request.headers,
+        'cookies' : lambda ctx: ctx._handler.request.cookies,
+        'request' : lambda ctx: ctx._handler.request,
+        'response' : lambda ctx: ctx._handler.response,
+        'context' : lambda ctx: ctx,
+        'current_user' : lambda ctx: ctx.current_user,
+}
+
+class RequestContext(Context):
+    '''
+    Context of a single request that bound to a Dispatcher. Functions are 
+    defined as methods so no closure is created for each request.
+    
+    Current user is detected by interceptors at the first time 
+    'current_user' is accessed, so request that never uses it does not 
+    run interceptors at all.
+    '''
+    def __init__(self, handler, plan=None):
+        super(RequestContext, self).__init__()
+        self.__dict__['_handler'] = handler
+        self.__dict__['_plan'] = plan
+        self.__dict__['_intercepted'] = False
+
+    def __getattr__(self, name):
+        if name=='current_user' and not self._intercepted:
+            self.intercept()
+        return super(RequestContext, self).__getattr__(name)
+
+    def intercept(self, kw=None):
+        '''
+        Run global and app interceptors only once, and 'current_user' set by 
+        interceptors is stored in context.
+        
+        Args:
+            kw: keyword args passed to interceptors, default to None (all 
+                keyword args except 'current_user').
+        '''
+        if self._intercepted:
+            if kw is not None:
+                kw['current_user'] = self['current_user']
+            return
+        self.__dict__['_intercepted'] = True
+        if kw is None:
+            kw = self.get_kw(KW_NAMES[:-1])
+        kw['current_user'] = None
+        if self._plan is not None:
+            self._plan.intercept(kw)
+        self['current_user'] = kw['current_user']
+
+    def get_kw(self, names=KW_NAMES):
+        '''
+        Get keyword args by names as dict.
+        
+        Args:
+            names: names of keyword args, default to KW_NAMES.
+        '''
+        kw = {}
+        for name in names:
+            kw[name] = _KW_GETTERS[name](self)
+        return kw
+
+    def get_argument(self, argument_name, default_value=None):
+        return self._handler.request.get(argument_name, default_value)
+
+    def get_arguments(self, argument_name):
+        return self._handler.request.get_all(argument_name)
+
+    def arguments(self):
+        return self._handler.request.arguments()
+
+    def get_cookie(self, name):
+        return self._handler._get_cookie(name)
+
+    def set_cookie(self, name, value, max_age=-1, path='/', secure=False):
+        self._handler._set_cookie(name, value, max_age, path, secure)
+
+    def delete_cookie(self, name, path='/', secure=False):
+        self._handler._set_cookie(name, 'deleted', 0, path, secure)
+
+class HandlerPlan(object):
+    '''
+    Everything of an app that is needed to handle a request, built once per process.
+    '''
+
+    __slots__ = ('appname', 'interceptors', 'new_context', 'page_cache', 'anonymous_checks')
+
+    def __init__(self, appname):
+        self.appname = appname
+        app = __import__(appname, fromlist=['interceptor'])
+        # global interceptor and app interceptor, both modules have a function 'intercept(kw)' 
+        # which is called by RequestContext when current user is needed:
+        self.interceptors = (interceptor, app.interceptor)
+        self.new_context = RequestContext
+        # seconds to cache themed pages for anonymous user, 0 = disabled:
+        self.page_cache = getattr(app, '__page_cache__', 0)
+        # functions 'is_anonymous(ctx)' of interceptors, or None if any 
+        # interceptor can not tell anonymous request without running:
+        checks = [getattr(m, 'is_anonymous', None) for m in self.interceptors]
+        self.anonymous_checks = None
+        if None not in checks:
+            self.anonymous_checks = tuple(checks)
+
+    def intercept(self, kw):
+        for m in self.interceptors:
+            m.intercept(kw)
+
+    def is_anonymous(self, ctx):
+        '''
+        Return True if current user is None. Interceptors run only if they 
+        have not run and any of them can not tell it (e.g. by cookies).
+        '''
+        if not ctx._intercepted and self.anonymous_checks is not None:
+            for check in self.anonymous_checks:
+                if not check(ctx):
+                    break
+            else:
+                return True
+        return ctx.current_user is None
+
+# app name -> HandlerPlan:
+_plans = {}
+
+def get_handler_plan(appname):
+    '''
+    Get HandlerPlan of app, which is created at the first time.
+    '''
+    plan = _plans.get(appname)
+    if plan is None:
+        plan = HandlerPlan(appname)
+        _plans[appname] = plan
+    return plan
+
+###############################################################################
+# Timings
+###############################################################################
+
+# functions that called with (appname, apppath, timings) after each request:
+_timing_hooks = []
+
+def add_timing_hook(hook):
+    '''
+    Add a timing hook that called after each handled request.
+    
+    Args:
+        hook: function as hook(appname, apppath, timings), timings is a dict 
+              contains time in seconds of 'routing', 'interceptors', 'handler' and 'render'.
+    '''
+    if hook not in _timing_hooks:
+        _timing_hooks.append(hook)
+
+def remove_timing_hook(hook):
+    '''
+    Remove a timing hook.
+    '''
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+def _report_timings(appname, apppath, timings):
+    for hook in _timing_hooks:
+        try:
+            hook(appname, apppath, timings)
+        except Exception:
+            logging.exception('Timing hook failed.')
+
+# per-endpoint counters stored in memcache as int:
+ENDPOINT_KEY_PREFIX = '__endpoint__'
+ENDPOINT_NAMES_KEY = '__endpoint_names__'
+ENDPOINT_FIELDS = ('count', 'interceptors', 'handler', 'render', 'total')
+
+# local counters are added to memcache after this number of requests:
+ENDPOINT_FLUSH_REQUESTS = 50
+
+# endpoint -> list of field values, times are in microseconds:
+_endpoint_stats = {}
+_endpoint_pending = {}
+_endpoint_names = set()
+_endpoint_requests = [0]
+
+def _endpoint_key(endpoint, field):
+    return '%s%s.%s' % (ENDPOINT_KEY_PREFIX, endpoint, field)
+
+def _count_endpoint(endpoint, timings):
+    '''
+    Add timings of a request to counters of endpoint, and flush counters to 
+    memcache every ENDPOINT_FLUSH_REQUESTS requests.
+    '''
+    values = [1, timings['interceptors'], timings['handler'], timings['render'], sum(timings.values())]
+    values = [values[0]] + [int(t * 1000000) for t in values[1:]]
+    for d in (_endpoint_stats, _endpoint_pending):
+        L = d.get(endpoint)
+        if L is None:
+            d[endpoint] = list(values)
+        else:
+            for i in range(len(values)):
+                L[i] += values[i]
+    _endpoint_requests[0] += 1
+    if _endpoint_requests[0] >= ENDPOINT_FLUSH_REQUESTS:
+        flush_endpoint_stats()
+
+def flush_endpoint_stats():
+    '''
+    Add local endpoint counters of current process to memcache in one batch.
+    '''
+    _endpoint_requests[0] = 0
+    if not _endpoint_pending:
+        return
+    mapping = {}
+    for endpoint, values in _endpoint_pending.iteritems():
+        for field, value in zip(ENDPOINT_FIELDS, values):
+            mapping[_endpoint_key(endpoint, field)] = value
+    new_names = [endpoint for endpoint in _endpoint_pending if endpoint not in _endpoint_names]
+    _endpoint_pending.clear()
+    try:
+        cache.offset_multi(mapping, initial_value=0)
+        if new_names:
+            names = cache.get(ENDPOINT_NAMES_KEY) or []
+            cache.set(ENDPOINT_NAMES_KEY, sorted(set(names) | set(new_names)))
+            _endpoint_names.update(new_names)
+    except Exception:
+        logging.exception('Flush endpoint counters failed.')
+
+def get_endpoint_stats(local=False):
+    '''
+    Get timing counters of each endpoint.
+    
+    Args:
+        local: True if only get counters of current process, default to False 
+               (counters of all instances stored in memcache).
+    Returns:
+        Dict contains endpoint name like 'blog.feed' as key and dict as value, 
+        which contains 'count', and total microseconds of 'interceptors', 
+        'handler', 'render' and 'total'.
+    '''
+    if local:
+        d = _endpoint_stats
+    else:
+        d = {}
+        names = cache.get(ENDPOINT_NAMES_KEY) or []
+        values = cache.get_multi([_endpoint_key(name, field) for name in names for field in ENDPOINT_FIELDS])
+        for name in names:
+            d[name] = [int(values.get(_endpoint_key(name, field), 0)) for field in ENDPOINT_FIELDS]
+    result = {}
+    for endpoint, L in d.iteritems():
+        result[endpoint] = dict(zip(ENDPOINT_FIELDS, L))
+    return result
+
 class Dispatcher(webapp.RequestHandler):
     '''
     Entry point of MVC tier. It handles URL with '/appname/apppath'. 
@@ -87,70 +345,122 @@ class Dispatcher(webapp.RequestHandler):
             apppath: URL that excludes the appname in prefix. For example, apppath of '/blog/view/123' is '/view/123'.
         '''
         logging.info(r'Handle app "%s", path=%s' % (appname, apppath))
-        for func in self._get_mapping(method, appname):
-            r = func.matches(apppath)
-            if r is not None:
-                # decode url parameter:
-                args = [urllib.unquote(arg) for arg in r]
-                # prepare environment as varkw:
-                kw = {
-                        'environ' : self.request.environ,
-                        'headers' : self.request.headers,
-                        'cookies' : self.request.cookies,
-                        'request' : self.request,
-                        'response' : self.response,
-                        'context' : Context(
-                                get_argument=lambda argument_name, default_value=None: self.request.get(argument_name, default_value),
-                                get_arguments=lambda argument_name: self.request.get_all(argument_name),
-                                arguments=lambda: self.request.arguments(),
-                                get_cookie=lambda name: self._get_cookie(name),
-                                set_cookie=lambda name, value, max_age=-1, path='/', secure=False: self._set_cookie(name, value, max_age, path, secure),
-                                delete_cookie=lambda name, path='/', secure=False: self._set_cookie(name, 'deleted', 0, path, secure)
-                        )
-                }
-                # global interceptor:
-                interceptor.intercept(kw)
-                # app interceptor:
-                app_inter = __import__(appname, fromlist=['interceptor']).interceptor
-                app_inter.intercept(kw)
-                if func.has_varkw():
-                    result = func(*args, **kw)
-                else:
-                    result = func(*args)
-                return self._response(kw, appname, result);
-        # 404 error:
-        self._error(404)
-
-    def _response(self, kw, appname, result):
+        t0 = time.time()
+        found = find_route(method, appname, apppath)
+        if found is None:
+            # 404 error:
+            return self._error(404)
+        func, r = found
+        plan = get_handler_plan(appname)
+        # decode url parameter:
+        args = [urllib.unquote(arg) for arg in r]
+        ctx = plan.new_context(self, plan)
+        needs = func.route.needs
+        kw = None
+        t1 = time.time()
+        if needs is None:
+            # prepare all environment as varkw and run interceptors:
+            kw = ctx.get_kw(KW_NAMES[:-1])
+            ctx.intercept(kw)
+        elif needs:
+            # only declared environment, and interceptors run if 'current_user' is declared:
+            kw = ctx.get_kw(needs)
+        t2 = time.time()
+        page = None
+        page_key = None
+        if plan.page_cache and func.route.page_cache and method=='get' and plan.is_anonymous(ctx):
+            page_key = pagecache.make_key(self.request.path, self.request.query_string)
+            page = pagecache.get_page(page_key)
+        if page is not None:
+            t3 = time.time()
+            self._render_page(page)
+        else:
+            if kw:
+                result = func(*args, **kw)
+            else:
+                result = func(*args)
+            t3 = time.time()
+            body = self._response(ctx, appname, result, page_key is not None)
+            if page_key is not None and isinstance(body, str) and result.get('__theme__', False)==True:
+                self._cache_page(page_key, appname, body, result, plan.page_cache)
+        timings = {
+                'routing' : t1 - t0,
+                'interceptors' : t2 - t1,
+                'handler' : t3 - t2,
+                'render' : time.time() - t3,
+        }
+        _count_endpoint('%s.%s' % (appname, func.__name__), timings)
+        if _timing_hooks:
+            _report_timings(appname, apppath, timings)
+
+    def _response(self, ctx, appname, result, cacheable=False):
         '''
         Handle result and send response.
         Args:
+            ctx: RequestContext of current request.
             appname: app name.
             result: result object that can be None, basestring or dict.
+            cacheable: True if rendered page may be put into page cache.
         '''
         if result is None:
             return
         if isinstance(result, basestring):
             return self._render_string(result)
         if isinstance(result, dict):
-            return self._render_template(kw, appname, result)
+            return self._render_template(ctx, appname, result, cacheable)
 
-    def _render_template(self, kw, appname, model):
+    def _render_template(self, ctx, appname, model, cacheable=False):
         '''
         Render a template using the given model.
         
         Args:
+            ctx: RequestContext of current request.
             model: model as dict.
+            cacheable: True if rendered page may be put into page cache, 
+                then the page is returned as string instead of streamed.
+        Returns:
+            Rendered page as string, or None if streamed.
         '''
         use_theme = model.get('__theme__', False)==True
         if use_theme:
-            t = theme.render(appname, model, **kw)
+            t = theme.render(appname, model, **ctx.get_kw())
         else:
             t = view.render(appname, model)
         content_type = model.get('__content_type__')
         if content_type:
             self.response.content_type = content_type
-        self.response.out.write(t)
+        if STREAM_RESPONSE and not cacheable:
+            view.stream(t, self.response.out)
+            return None
+        body = str(t)
+        self.response.out.write(body)
+        return body
+
+    def _cache_page(self, page_key, appname, body, model, time):
+        '''
+        Put rendered themed page into page cache unless it sets cookie. 
+        The page is tagged with app name and '__cache_tags__' of model, 
+        and it is not cached if model has '__cache__' : False.
+        '''
+        if not model.get('__cache__', True):
+            return
+        headers = self.response.headers.items()
+        for name, value in headers:
+            if name.lower()=='set-cookie':
+                return
+        tags = [appname]
+        tags.extend(model.get('__cache_tags__', []))
+        pagecache.set_page(page_key, body, model.get('__content_type__'), headers, tags, time)
+
+    def _render_page(self, page):
+        '''
+        Render a page from page cache.
+        '''
+        if page['content_type']:
+            self.response.content_type = page['content_type']
+        for name, value in page['headers']:
+            self.response.headers[name] = value
+        self.response.out.write(page['body'])
 
     def _render_string(self, result):
         '''
@@ -166,20 +476,6 @@ class Dispatcher(webapp.RequestHandler):
             return
         self.response.out.write(result)
 
-    def _get_mapping(self, method, appname):
-        '''
-        Get list of functions that matches the method and appname.
-        Args:
-            method: 'get' or 'post'.
-            appname: name of app.
-        Returns:
-            dict, url as key, function as value.
-        '''
-        attr = 'support_' + method
-        mod = __import__(appname, fromlist=['controller']).controller
-        all = [getattr(mod, f) for f in dir(mod)]
-        return [func for func in all if callable(func) and getattr(func, attr, False)]
-
     def _error(self, code, extra=None):
         '''
         Send HTTP error response.
@@ -251,8 +547,24 @@ class Dispatcher(webapp.RequestHandler):
 </body>
 </html>
 ''' % (exception.__class__.__name__, exception.message or '(no message)')
+        # discard partial page that may be streamed before exception:
+        self.response.clear()
+        self.response.set_status(500)
         self.response.out.write(html)
 
+def _compile_pattern(pattern, raw_mapping):
+    '''
+    Compile pattern to regular expression object.
+    Args:
+        pattern: pattern as string.
+        raw_mapping: True if using raw regular expression, otherwise False.
+    Returns:
+        Compiled regular expression object.
+    '''
+    if raw_mapping:
+        return re.compile('^' + pattern + '$')
+    return re.compile('^' + re.escape(pattern).replace(r'\$', '([^/]*)') + '$')
+
 def _matches(pattern, raw_mapping, url):
     '''
     Return match result by given pattern and url.
@@ -263,11 +575,7 @@ def _matches(pattern, raw_mapping, url):
     Returns:
         A tuple as matched result (maybe empty tuple), or None if not matched.
     '''
-    if raw_mapping:
-        p = re.compile('^' + pattern + '$')
-    else:
-        p = re.compile('^' + re.escape(pattern).replace(r'\$', '([^/]*)') + '$')
-    m = p.match(url)
+    m = _compile_pattern(pattern, raw_mapping).match(url)
     if m is not None:
         return m.groups()
     return None
@@ -284,76 +592,266 @@ def _has_varkw(func):
     argsspec = inspect.getargspec(func)
     return argsspec[2] is not None
 
-def get(pattern):
+###############################################################################
+# Route registry
+###############################################################################
+
+_REGEX_META = '.^$*+?{}[]()|'
+_REGEX_QUANTIFIERS = '*+?{'
+
+def _literal_prefix(pattern, raw_mapping):
+    '''
+    Get the literal prefix of a pattern that every matched url must start with.
+    Args:
+        pattern: pattern as string.
+        raw_mapping: True if using raw regular expression, otherwise False.
+    Returns:
+        Literal prefix as string, maybe ''.
+    '''
+    if not raw_mapping:
+        n = pattern.find('$')
+        if n==(-1):
+            return pattern
+        return pattern[:n]
+    if '|' in pattern:
+        return ''
+    L = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch=='\\':
+            if i + 1 >= len(pattern) or pattern[i+1].isalnum():
+                break
+            ch = pattern[i+1]
+            i += 2
+        elif ch in _REGEX_META:
+            break
+        else:
+            i += 1
+        if i < len(pattern) and pattern[i] in _REGEX_QUANTIFIERS:
+            # last char is optional or repeated:
+            break
+        L.append(ch)
+    return ''.join(L)
+
+class Route(object):
+    '''
+    A compiled url mapping of a decorated function.
+    '''
+
+    __slots__ = ('name', 'func', 'varkw', 'needs', 'page_cache', 'pattern', 'raw_mapping', 'regex', 'prefix', 'segments', 'first')
+
+    def __init__(self, name, func, varkw, pattern, raw_mapping, needs=None, page_cache=False):
+        self.name = name
+        self.func = func
+        self.varkw = varkw
+        # names of keyword args that passed to func, or None for all:
+        if not varkw:
+            needs = ()
+        elif needs is not None:
+            for need in needs:
+                if need not in KW_NAMES:
+                    raise ValueError('Invalid keyword arg name: %s' % need)
+            needs = tuple(needs)
+        self.needs = needs
+        # True if themed page of anonymous user can be put into page cache:
+        self.page_cache = page_cache
+        self.pattern = pattern
+        self.raw_mapping = raw_mapping
+        self.regex = _compile_pattern(pattern, raw_mapping)
+        self.prefix = _literal_prefix(pattern, raw_mapping)
+        # number of '/' and first literal segment, only for non-raw mapping:
+        self.segments = None
+        self.first = None
+        if not raw_mapping:
+            self.segments = pattern.count('/')
+            first = _first_segment(pattern)
+            if first is not None and first.find('$')==(-1):
+                self.first = first
+
+    def matches(self, url):
+        '''
+        Return a tuple as matched result (maybe empty tuple), or None if not matched.
+        '''
+        if not url.startswith(self.prefix):
+            return None
+        m = self.regex.match(url)
+        if m is not None:
+            return m.groups()
+        return None
+
+def _first_segment(url):
+    '''
+    Get first segment of url, e.g. 'post' of '/post/123', or None if url has only one segment.
+    '''
+    n = url.find('/', 1)
+    if n==(-1):
+        return None
+    return url[1:n]
+
+# module name -> { function name : Route }:
+_routes = {}
+
+# (module name, method) -> route index, rebuilt when module registers new route:
+_route_indexes = {}
+
+def _register(func):
+    '''
+    Register a decorated function as Route when its module is imported.
+    '''
+    module = func.__module__
+    if module not in _routes:
+        _routes[module] = {}
+    # the same name defined again replaces the old one, just like module attribute:
+    _routes[module][func.__name__] = func.route
+    for method in ('get', 'post'):
+        _route_indexes.pop((module, method), None)
+
+class _RouteIndex(object):
+    '''
+    Index of routes of a module for a http method. Routes are bucketed by 
+    number of segments and first literal segment, and keep the order of 
+    definition names so the first matched route is the same as dir() order.
+    '''
+
+    def __init__(self, routes):
+        self._raws = []
+        self._buckets = {}
+        self._cache = {}
+        for order, route in enumerate(routes):
+            if route.raw_mapping:
+                self._raws.append((order, route))
+            else:
+                key = (route.segments, route.first)
+                if key not in self._buckets:
+                    self._buckets[key] = []
+                self._buckets[key].append((order, route))
+
+    def candidates(self, url):
+        '''
+        Get candidate routes for url, ordered by definition names.
+        '''
+        segments = url.count('/')
+        first = _first_segment(url)
+        if (segments, first) not in self._buckets:
+            first = None
+        key = (segments, first)
+        routes = self._cache.get(key)
+        if routes is None:
+            L = []
+            L.extend(self._raws)
+            L.extend(self._buckets.get((segments, None), []))
+            if first is not None:
+                L.extend(self._buckets[key])
+            L.sort()
+            routes = [route for order, route in L]
+            self._cache[key] = routes
+        return routes
+
+def _get_route_index(module, method):
+    index = _route_indexes.get((module, method))
+    if index is None:
+        attr = 'support_' + method
+        d = _routes.get(module, {})
+        names = d.keys()
+        names.sort()
+        index = _RouteIndex([d[name] for name in names if getattr(d[name].func, attr, False)])
+        _route_indexes[(module, method)] = index
+    return index
+
+def find_route(method, appname, url):
+    '''
+    Find the first decorated function that matches the method, app name and url.
+    Args:
+        method: 'get' or 'post'.
+        appname: name of app.
+        url: url that excludes the appname in prefix.
+    Returns:
+        A tuple (function, matched result as tuple), or None if not found.
+    '''
+    module = appname + '.controller'
+    if module not in sys.modules:
+        __import__(appname, fromlist=['controller'])
+    for route in _get_route_index(module, method).candidates(url):
+        r = route.matches(url)
+        if r is not None:
+            return route.func, r
+    return None
+
+###############################################################################
+# Decorators
+###############################################################################
+
+def _decorate(f, pattern, support_get, support_post, raw_mapping, needs=None, page_cache=False):
+    '''
+    Make a wrapper of decorated function and register it as a route.
+    '''
+    def wrapper(*args, **kw):
+        return f(*args, **kw)
+    wrapper.pattern = pattern
+    wrapper.support_get = support_get
+    wrapper.support_post = support_post
+    wrapper.raw_mapping = raw_mapping
+    wrapper.__name__ = f.__name__
+    wrapper.__module__ = f.__module__
+    wrapper.__doc__ = f.__doc__
+    wrapper.route = Route(f.__name__, wrapper, _has_varkw(f), pattern, raw_mapping, needs, page_cache)
+    wrapper.matches = wrapper.route.matches
+    wrapper.has_varkw = lambda: wrapper.route.varkw
+    _register(wrapper)
+    return wrapper
+
+def get(pattern, needs=None, page_cache=False):
     '''
     decorator of @get() that support get only
     
     Args:
         pattern: string like '/$/$.html', default value: None
+        needs: names of keyword args that function needs, e.g. ('request', 'response'), 
+               default to None (all of KW_NAMES and interceptors always run).
+        page_cache: True if themed page for anonymous user is cached when app 
+               defines '__page_cache__', default to False.
     
     Returns:
         decorated function.
     '''
     def execute(f):
-        def _wrapper(*args, **kw):
-            return f(*args, **kw)
-        _wrapper.pattern = pattern
-        _wrapper.support_get = True
-        _wrapper.support_post = False
-        _wrapper.raw_mapping = False
-        _wrapper.__name__ = f.__name__
-        _wrapper.matches = lambda url: _matches(_wrapper.pattern, _wrapper.raw_mapping, url)
-        _wrapper.has_varkw = lambda: _has_varkw(f)
-        return _wrapper
+        return _decorate(f, pattern, True, False, False, needs, page_cache)
     return execute
 
-def post(pattern):
+def post(pattern, needs=None):
     '''
     decorator of @post() that support post only
     
     Args:
         pattern: string like '/$/$.html', default value: None
+        needs: names of keyword args that function needs, e.g. ('request', 'response'), 
+               default to None (all of KW_NAMES and interceptors always run).
     
     Returns:
         decorated function.
     '''
     def execute(f):
-        def wrapper(*args, **kw):
-            return f(*args, **kw)
-        wrapper.pattern = pattern
-        wrapper.support_get = False
-        wrapper.support_post = True
-        wrapper.raw_mapping = False
-        wrapper.__name__ = f.__name__
-        wrapper.matches = lambda url: _matches(wrapper.pattern, wrapper.raw_mapping, url)
-        wrapper.has_varkw = lambda: _has_varkw(f)
-        return wrapper
+        return _decorate(f, pattern, False, True, False, needs)
     return execute
 
-def mapping(pattern):
+def mapping(pattern, needs=None):
     '''
     decorator of @mapping() that support get and post
     
     Args:
         pattern: string like '/$/$.html', default value: None
+        needs: names of keyword args that function needs, e.g. ('request', 'response'), 
+               default to None (all of KW_NAMES and interceptors always run).
     
     Returns:
         decorated function.
     '''
     def execute(f):
-        def wrapper(*args, **kw):
-            return f(*args, **kw)
-        wrapper.pattern = pattern
-        wrapper.support_get = True
-        wrapper.support_post = True
-        wrapper.raw_mapping = False
-        wrapper.__name__ = f.__name__
-        wrapper.matches = lambda url: _matches(wrapper.pattern, wrapper.raw_mapping, url)
-        wrapper.has_varkw = lambda: _has_varkw(f)
-        return wrapper
+        return _decorate(f, pattern, True, True, False, needs)
     return execute
 
-def raw_mapping(pattern):
+def raw_mapping(pattern, needs=None):
     '''
     decorator of @raw_mapping() that support get and post. 
     WARNING: for regular express expert only! 
@@ -362,19 +860,11 @@ def raw_mapping(pattern):
     
     Args:
         url: regular expression string.
+        needs: names of keyword args that function needs, default to None (all).
     
     Returns:
         decorated function.
     '''
     def execute(f):
-        def wrapper(*args, **kw):
-            return f(*args, **kw)
-        wrapper.pattern = pattern
-        wrapper.support_get = True
-        wrapper.support_post = True
-        wrapper.raw_mapping = True
-        wrapper.__name__ = f.__name__
-        wrapper.matches = lambda url: _matches(wrapper.pattern, wrapper.raw_mapping, url)
-        wrapper.has_varkw = lambda: _has_varkw(f)
-        return wrapper
+        return _decorate(f, pattern, True, True, True, needs)
     return execute
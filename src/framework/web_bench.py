@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Micro-benchmark of url dispatch: the old dir() scan with regex compiled per 
+request vs. the precompiled route index.
+
+Usage: python framework/web_bench.py [routes] [loops]
+'''
+
+import sys
+import imp
+import time
+
+from framework import web
+
+APP = 'bench_app'
+
+def _make_controller(n):
+    '''
+    Make a fake controller module '<APP>.controller' with n routes.
+    '''
+    mod = imp.new_module(APP + '.controller')
+    pkg = imp.new_module(APP)
+    pkg.controller = mod
+    sys.modules[APP] = pkg
+    sys.modules[APP + '.controller'] = mod
+    patterns = ['/', '/feed', '/post/$', '/page/$', '/cat/$', '/t/$', '/archive/$/$', '/raw/(.+)/([0-9]+)']
+    for i in range(n - len(patterns)):
+        patterns.append('/section%d/$' % i)
+    urls = []
+    for i, pattern in enumerate(patterns):
+        raw = pattern.startswith('/raw/')
+        decorator = raw and web.raw_mapping or web.get
+        source = 'def f%03d(*args):\n    return %d\n' % (i, i)
+        d = { '__name__' : mod.__name__ }
+        exec source in d
+        func = decorator(pattern)(d['f%03d' % i])
+        setattr(mod, func.__name__, func)
+        if raw:
+            urls.append('/raw/abc/123')
+        else:
+            urls.append(pattern.replace('$', 'x%d' % i))
+    return mod, urls
+
+def _legacy_find(method, appname, url):
+    '''
+    The dispatch algorithm before route index.
+    '''
+    attr = 'support_' + method
+    mod = __import__(appname, fromlist=['controller']).controller
+    all = [getattr(mod, f) for f in dir(mod)]
+    for func in [func for func in all if callable(func) and getattr(func, attr, False)]:
+        r = web._matches(func.pattern, func.raw_mapping, url)
+        if r is not None:
+            return func, r
+    return None
+
+def _run(find, urls, loops):
+    start = time.time()
+    for i in xrange(loops):
+        for url in urls:
+            find('get', APP, url)
+    return time.time() - start
+
+def main(routes=60, loops=200):
+    mod, urls = _make_controller(routes)
+    # make sure both return the same result:
+    for url in urls:
+        if _legacy_find('get', APP, url)[0] is not web.find_route('get', APP, url)[0]:
+            raise AssertionError('Different route for %s' % url)
+    print 'dispatch %d urls x %d loops on a controller with %d routes:' % (len(urls), loops, routes)
+    old = _run(_legacy_find, urls, loops)
+    print '  dir() scan + re.compile: %.3f s' % old
+    new = _run(web.find_route, urls, loops)
+    print '  precompiled route index: %.3f s' % new
+    print '  speed up: %.1fx' % (old / new)
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -6,6 +6,7 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import unittest
 
 from framework.web import Context
+from framework.web import RequestContext
 
 class Test(unittest.TestCase):
 
@@ -26,6 +27,56 @@ class Test(unittest.TestCase):
         self.assertEquals('Engineer', ctx['title'])
         self.assertEquals('Engineer', ctx.title)
 
+    def test_request_context(self):
+        class _Request(object):
+            def get(self, name, default_value=None):
+                return { 'q' : 'abc' }.get(name, default_value)
+        class _Handler(object):
+            request = _Request()
+            cookies = {}
+            def _get_cookie(self, name):
+                return self.cookies.get(name)
+            def _set_cookie(self, name, value, max_age=-1, path='/', secure=False):
+                self.cookies[name] = value
+        ctx = RequestContext(_Handler())
+        self.assertEquals('abc', ctx.get_argument('q'))
+        self.assertEquals('x', ctx.get_argument('ref', 'x'))
+        self.assertEquals(None, ctx.get_cookie('sid'))
+        ctx.set_cookie('sid', '123')
+        self.assertEquals('123', ctx.get_cookie('sid'))
+        ctx.delete_cookie('sid')
+        self.assertEquals('deleted', ctx.get_cookie('sid'))
+        # handler is not a context value:
+        self.assertEquals(0, len(ctx))
+        ctx.url = 'http://www.expressme.org'
+        self.assertEquals('http://www.expressme.org', ctx['url'])
+
+    def test_lazy_current_user(self):
+        class _Plan(object):
+            calls = 0
+            def intercept(self, kw):
+                self.calls += 1
+                kw['current_user'] = 'Michael'
+        class _Request(object):
+            environ = {}
+            headers = {}
+            cookies = {}
+        class _Handler(object):
+            request = _Request()
+            response = None
+        plan = _Plan()
+        ctx = RequestContext(_Handler(), plan)
+        self.assertEquals(0, plan.calls)
+        self.assertEquals({ 'context' : ctx }, ctx.get_kw(('context',)))
+        self.assertEquals(0, plan.calls)
+        self.assertEquals('Michael', ctx.current_user)
+        self.assertEquals('Michael', ctx.current_user)
+        self.assertEquals(1, plan.calls)
+        kw = {}
+        ctx.intercept(kw)
+        self.assertEquals('Michael', kw['current_user'])
+        self.assertEquals(1, plan.calls)
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
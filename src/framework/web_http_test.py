@@ -6,6 +6,8 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import unittest
 
 from google.appengine.ext import webapp
+from framework import web
+from framework import pagecache
 from framework.web import Dispatcher
 
 import interceptor
@@ -54,6 +56,104 @@ class Test(unittest.TestCase):
         self.init_get('/http_test/args?q=Express%20Me&ref=&nl=en_US&nl=zh_CN')
         self.assertEquals(u'Express Me, , None, [en_US, zh_CN]', self.response.out.getvalue())
 
+    def test_timing_hook(self):
+        L = []
+        hook = lambda appname, apppath, timings: L.append((appname, apppath, timings))
+        web.add_timing_hook(hook)
+        try:
+            self.init_get('/http_test/hi/Michael')
+        finally:
+            web.remove_timing_hook(hook)
+        self.assertEquals(1, len(L))
+        appname, apppath, timings = L[0]
+        self.assertEquals('http_test', appname)
+        self.assertEquals('/hi/Michael', apppath)
+        keys = timings.keys()
+        keys.sort()
+        self.assertEquals(['handler', 'interceptors', 'render', 'routing'], keys)
+        # hook removed:
+        self.init_get('/http_test/hi/Michael')
+        self.assertEquals(1, len(L))
+
+    def _get_with_interceptor(self, url, intercept, cookie=None):
+        environ = {'REQUEST_METHOD' : 'GET'}
+        if cookie:
+            environ['HTTP_COOKIE'] = cookie
+        self.request = webapp.Request.blank(url, environ=environ)
+        self.response = webapp.Response()
+        self.dispatcher = Dispatcher()
+        self.dispatcher.initialize(self.request, self.response)
+        interceptor.intercept = intercept
+        self.dispatcher.get()
+
+    def test_lazy_interceptor(self):
+        L = []
+        def intercept(kw):
+            L.append(kw)
+            kw['current_user'] = 'Michael'
+        # route without varkw or declares no 'current_user' does not run interceptors:
+        self._get_with_interceptor('/http_test/hi/Michael', intercept)
+        self.assertEquals(0, len(L))
+        self._get_with_interceptor('/http_test/args?nl=en_US&nl=zh_CN', intercept)
+        self.assertEquals(0, len(L))
+        # route that needs all varkw:
+        self._get_with_interceptor('/http_test/user', intercept)
+        self.assertEquals(1, len(L))
+        self.assertEquals('<p>Michael</p>', self.response.out.getvalue())
+
+    def test_page_cache_probe(self):
+        L = []
+        def intercept(kw):
+            L.append(kw)
+            kw['current_user'] = 'Michael'
+        misses = lambda: pagecache.get_stats()['local_misses']
+        plan = web.get_handler_plan('http_test')
+        plan.page_cache = 60
+        try:
+            # route without page_cache is never probed:
+            before = misses()
+            self._get_with_interceptor('/http_test/hi/Michael', intercept)
+            self.assertEquals(before, misses())
+            # anonymous request is probed without running interceptors:
+            self._get_with_interceptor('/http_test/cached', intercept)
+            self.assertEquals(before + 1, misses())
+            self.assertEquals(0, len(L))
+            self.assertEquals('<p>Cached</p>', self.response.out.getvalue())
+            # request with sign in cookie runs interceptors and is not probed:
+            self._get_with_interceptor('/http_test/cached', intercept, 'auto_signin=abc')
+            self.assertEquals(before + 1, misses())
+            self.assertEquals(1, len(L))
+        finally:
+            plan.page_cache = 0
+
+    def test_exception_in_streamed_view(self):
+        try:
+            self.init_get('/http_test/broken')
+            self.fail('ValueError expected')
+        except ValueError, e:
+            # partial page is streamed before exception:
+            self.assertTrue(self.response.out.getvalue().startswith('<html>'))
+            self.dispatcher.handle_exception(e, False)
+        self.assertEquals(500, self.response.status)
+        body = self.response.out.getvalue()
+        self.assertTrue(body.startswith('<!DOCTYPE html'))
+        self.assertEquals(-1, body.find('Line 1 of a long page.'))
+        self.assertEquals(1, body.count('<html'))
+        self.assertTrue(body.find('ValueError: failed in view')!=(-1))
+
+    def test_needs(self):
+        self.assertEquals((), web.find_route('get', 'http_test', '/hi/Michael')[0].route.needs)
+        self.assertEquals(('context',), web.find_route('get', 'http_test', '/args')[0].route.needs)
+        self.assertRaises(ValueError, lambda: web.get('/x', needs=('user',))(lambda **kw: None))
+
+    def test_endpoint_stats(self):
+        before = web.get_endpoint_stats(True).get('http_test.hi', {}).get('count', 0)
+        self.init_get('/http_test/hi/Michael')
+        self.init_post('/http_test/hi/Michael')
+        d = web.get_endpoint_stats(True)['http_test.hi']
+        self.assertEquals(before + 2, d['count'])
+        self.assertTrue(d['total'] >= d['handler'])
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
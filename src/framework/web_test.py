@@ -6,6 +6,8 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import unittest
 
 from framework.web import _matches
+from framework.web import _literal_prefix
+from framework.web import find_route
 from framework.web import get
 from framework.web import post
 from framework.web import raw_mapping
@@ -121,6 +123,32 @@ class Test(unittest.TestCase):
         self.assertEquals(None, f.matches('/a/b'))
         self.assertEquals(None, f.matches('//123'))
 
+    def test_literal_prefix(self):
+        self.assertEquals('/say', _literal_prefix('/say', False))
+        self.assertEquals('/', _literal_prefix('/$/$', False))
+        self.assertEquals('/pro-', _literal_prefix('/pro-$/$/$/', False))
+        self.assertEquals('/', _literal_prefix('/(.+)/([0-9]+)', True))
+        self.assertEquals('/page/', _literal_prefix(r'\/page\/(.*)', True))
+        self.assertEquals('/a', _literal_prefix('/ab?c', True))
+        self.assertEquals('/a', _literal_prefix(r'/a\d+', True))
+        self.assertEquals('', _literal_prefix('/a|/b', True))
+
+    def test_find_route(self):
+        func, args = find_route('get', 'http_test', '/')
+        self.assertEquals('http_home', func.__name__)
+        self.assertEquals((), args)
+        func, args = find_route('get', 'http_test', '/hi/Michael')
+        self.assertEquals('hi', func.__name__)
+        self.assertEquals(('Michael',), args)
+        func, args = find_route('post', 'http_test', '/hello/world')
+        self.assertEquals('http_hello', func.__name__)
+        self.assertEquals(('world',), args)
+        # method not supported:
+        self.assertEquals(None, find_route('get', 'http_test', '/hello/world'))
+        # not found:
+        self.assertEquals(None, find_route('get', 'http_test', '/hi/a/b'))
+        self.assertEquals(None, find_route('get', 'http_test', '/not_exist'))
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -27,7 +27,25 @@ def hi(name):
 def http_redirect(target):
     return 'redirect:/about/%s' % target
 
-@get('/args')
+@get('/user')
+def http_user(**kw):
+    return '<p>%s</p>' % kw['current_user']
+
+@get('/cached', needs=(), page_cache=True)
+def http_cached(**kw):
+    return '<p>Cached</p>'
+
+def _fail():
+    raise ValueError('failed in view')
+
+@get('/broken')
+def http_broken():
+    return {
+            '__view__' : 'broken',
+            'fail' : _fail,
+    }
+
+@get('/args', needs=('context',))
 def http_args(**kw):
     ctx = kw['context']
     return u'%s, %s, %s, [%s, %s]' % (
@@ -9,3 +9,6 @@ App interceptor
 
 def intercept(kw):
     pass
+
+def is_anonymous(ctx):
+    return True
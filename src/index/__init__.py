@@ -2,3 +2,6 @@
 # -*- coding: utf-8 -*-
 
 __author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+# cache themed pages for anonymous user in seconds:
+__page_cache__ = 3600
@@ -12,12 +12,11 @@ from framework.web import get
 import blog
 from blog import model as blog_model
 
-@get('/')
+@get('/', needs=(), page_cache=True)
 def index(**kw):
     '''
     show recent posts of blog
     '''
-    ctx = kw['context']
     number = 20
     posts, next = blog_model.get_posts(number, None)
     return {
@@ -25,5 +24,6 @@ def index(**kw):
             '__view__' : 'index',
             '__title__' : 'Home',
             '__header__' : blog.get_feed_html(),
+            '__cache_tags__' : ['blog'],
             'posts' : posts,
     }
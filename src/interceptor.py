@@ -15,16 +15,27 @@ def _detect_current_user(kw):
     ctx = kw['context']
     auto_signin_cookie = ctx.get_cookie(cookie.AUTO_SIGNIN_COOKIE)
     if auto_signin_cookie:
-        user = cookie.validate_sign_in_cookie(auto_signin_cookie, store.get_user_by_key)
+        user = cookie.get_signed_in_user(auto_signin_cookie, store.get_cached_user)
         if user:
             kw['current_user'] = user
             return
+    # only user signed in with Google account has this cookie:
+    if ctx.get_cookie(cookie.IS_FROM_GOOGLE_COOKIE)!='yes':
+        return
     from google.appengine.api import users
     gu = users.get_current_user()
     if gu is not None:
         email = gu.email().lower()
-        user = store.get_user_by_email(email)
+        user = store.get_cached_user_by_email(email)
         if user:
             kw['current_user'] = user
 
+def _is_anonymous(ctx):
+    '''
+    Return True if request has no cookie of signed in user, so 
+    _detect_current_user is not needed to know the user is None.
+    '''
+    return not ctx.get_cookie(cookie.AUTO_SIGNIN_COOKIE) and ctx.get_cookie(cookie.IS_FROM_GOOGLE_COOKIE)!='yes'
+
 intercept = _detect_current_user
+is_anonymous = _is_anonymous
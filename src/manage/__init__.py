@@ -3,6 +3,13 @@
 
 __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 
+# css and js used by view/manage.html, which are bundled by 'build.py':
+__assets__ = {
+        'manage.css' : ('/static/css/blueprint/screen.css', '/manage/static/css/manage.css'),
+        'ie.css' : ('/static/css/blueprint/ie.css',),
+        'manage.js' : ('/static/js/jquery/jquery-1.4.3.min.js', '/manage/static/js/manage.js', '/manage/static/js/md5.js', '/manage/static/js/str.js'),
+}
+
 class AppMenu(object):
     '''
     A menu object displayed in management console.
@@ -75,6 +75,7 @@ def do_manage(**kw):
             'selected_menu' : selected_menu,
             'selected_menu_item' : selected_menu_item,
             'version' : get_version(),
+            'assets' : view.get_app_assets('manage'),
     }
     req = kw['request']
     embed_context = web.Context()
@@ -231,6 +232,48 @@ def signout(**kw):
         redirect = users.create_logout_url(redirect)
     return 'redirect:%s' % redirect
 
+@get('/cron/flush_counts')
+def cron_flush_counts(**kw):
+    '''
+    Called by cron task. Write buffered counter deltas to shards.
+    '''
+    current_user = kw['current_user']
+    if kw['request'].headers.get('X-AppEngine-Cron')!='true':
+        if current_user is None or not current_user.is_admin():
+            raise PermissionError('Only cron task or administrator can flush counters.')
+    n = store.cron_flush_counts()
+    logging.info('Flushed %d buffered counter(s).' % n)
+    kw['response'].out.write('%d' % n)
+
+@get('/endpoint_stats')
+def show_endpoint_stats(**kw):
+    '''
+    Show timing counters of each endpoint as plain text, only for administrator. 
+    Add '?local=1' to show counters of current instance only.
+    '''
+    current_user = kw['current_user']
+    if current_user is None or not current_user.is_admin():
+        raise PermissionError('Only administrator can view endpoint stats.')
+    local = kw['context'].get_argument('local')=='1'
+    if not local:
+        web.flush_endpoint_stats()
+    stats = web.get_endpoint_stats(local)
+    L = ['%-40s %8s %12s %12s %12s %12s' % ('endpoint', 'count', 'interceptors', 'handler', 'render', 'total')]
+    names = stats.keys()
+    names.sort()
+    for name in names:
+        d = stats[name]
+        count = max(d['count'], 1)
+        # average time in milliseconds:
+        L.append('%-40s %8d %12.2f %12.2f %12.2f %12.2f' % (name, d['count'],
+                d['interceptors'] / 1000.0 / count,
+                d['handler'] / 1000.0 / count,
+                d['render'] / 1000.0 / count,
+                d['total'] / 1000.0 / count))
+    response = kw['response']
+    response.content_type = 'text/plain'
+    response.out.write('\n'.join(L))
+
 @get('/register')
 def show_register(**kw):
     google_signin_url = _get_google_signin_url('/manage/g_signin')
@@ -11,9 +11,17 @@ import time
 import base64
 import hashlib
 
+from framework import cache
+
 AUTO_SIGNIN_COOKIE = 'auto_signin'
 IS_FROM_GOOGLE_COOKIE = 'is_from_google'
 
+# cache key prefix of validated sign in cookie:
+SESSION_KEY_PREFIX = '__session__'
+
+# max seconds that a session is cached:
+SESSION_CACHE_TIME = 86400
+
 def make_sign_in_cookie(key, passwd, expire_in_seconds):
     # make sign in cookie with following format:
     # base64(id_expires_md5(id_expires_passwd))
@@ -22,6 +30,23 @@ def make_sign_in_cookie(key, passwd, expire_in_seconds):
     md5 = hashlib.md5(','.join([id, expires, passwd])).hexdigest()
     return base64.b64encode(','.join([id, expires, md5]))
 
+def _parse_sign_in_cookie(value):
+    '''
+    Parse sign in cookie as tuple (key, expires, md5), or None if cookie is 
+    invalid or expired.
+    '''
+    dec = base64.b64decode(str(value))
+    ss = dec.split(',')
+    # ss = [key, expires, md5]
+    if len(ss)!=3:
+        return None
+    try:
+        if float(ss[1]) < time.time():
+            return None
+    except ValueError:
+        return None
+    return tuple(ss)
+
 def validate_sign_in_cookie(value, get_user):
     '''
     Validate sign in cookie.
@@ -33,19 +58,10 @@ def validate_sign_in_cookie(value, get_user):
     Returns:
         User object if sign in ok, None if cookie is invalid.
     '''
-    dec = base64.b64decode(str(value))
-    ss = dec.split(',')
-    # ss = [key, expires, md5]
-    if len(ss)!=3:
-        return None
-    key = ss[0]
-    expires = ss[1]
-    md5 = ss[2]
-    try:
-        if float(expires) < time.time():
-            return None
-    except ValueError:
+    ss = _parse_sign_in_cookie(value)
+    if ss is None:
         return None
+    key, expires, md5 = ss
     user = get_user(key)
     if user is None:
         return None
@@ -53,3 +69,43 @@ def validate_sign_in_cookie(value, get_user):
     if calc_md5!=md5:
         return None
     return user
+
+def _password_hash(user):
+    return hashlib.md5(str(user.password)).hexdigest()
+
+def get_signed_in_user(value, get_user):
+    '''
+    Get signed in user by cookie. A validated cookie is cached as session 
+    (key, expires, hash of password) until cookie expires, so the cookie is 
+    validated only once, and it becomes invalid when password is changed 
+    or user is locked.
+    
+    Args:
+        value: cookie value, a base64-encoded string.
+        get_user: function for get User object by key, which should be 
+            cached (e.g. store.get_cached_user) so no datastore read is needed.
+    
+    Returns:
+        User object if sign in ok, None if cookie is invalid.
+    '''
+    session_key = SESSION_KEY_PREFIX + hashlib.md5(str(value)).hexdigest()
+    session = cache.get(session_key)
+    if session is not None:
+        key, expires, passwd_hash = session
+        if expires >= time.time():
+            user = get_user(key)
+            if user is not None and not user.locked and _password_hash(user)==passwd_hash:
+                return user
+        cache.delete(session_key)
+        return None
+    ss = _parse_sign_in_cookie(value)
+    if ss is None:
+        return None
+    user = validate_sign_in_cookie(value, get_user)
+    if user is not None and user.locked:
+        return None
+    if user is not None:
+        expires = float(ss[1])
+        cache_time = min(SESSION_CACHE_TIME, int(expires - time.time()) + 1)
+        cache.set(session_key, (ss[0], expires, _password_hash(user)), cache_time)
+    return user
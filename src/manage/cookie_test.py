@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+import unittest
+
+from framework import gaeunit
+from framework import cache
+from manage import cookie
+
+class _User(object):
+
+    def __init__(self, key, password):
+        self.id = key
+        self.password = password
+        self.locked = False
+
+class _Users(object):
+
+    def __init__(self, *users):
+        self.users = dict([(u.id, u) for u in users])
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        return self.users.get(key)
+
+class Test(gaeunit.GaeTestCase):
+
+    def setUp(self):
+        super(Test, self).setUp()
+        cache.clear_local()
+
+    def test_validate(self):
+        users = _Users(_User('u1', 'pass1'))
+        value = cookie.make_sign_in_cookie('u1', 'pass1', 3600)
+        self.assertEquals('u1', cookie.validate_sign_in_cookie(value, users.get).id)
+        bad = cookie.make_sign_in_cookie('u1', 'bad-pass', 3600)
+        self.assertEquals(None, cookie.validate_sign_in_cookie(bad, users.get))
+        expired = cookie.make_sign_in_cookie('u1', 'pass1', -10)
+        self.assertEquals(None, cookie.validate_sign_in_cookie(expired, users.get))
+
+    def test_session(self):
+        u = _User('u1', 'pass1')
+        users = _Users(u)
+        value = cookie.make_sign_in_cookie('u1', 'pass1', 3600)
+        self.assertEquals(u, cookie.get_signed_in_user(value, users.get))
+        self.assertEquals(1, users.calls)
+        # validated by session:
+        self.assertEquals(u, cookie.get_signed_in_user(value, users.get))
+        self.assertEquals(u, cookie.get_signed_in_user(value, users.get))
+        self.assertEquals(3, users.calls)
+        # session is not created by invalid cookie:
+        bad = cookie.make_sign_in_cookie('u1', 'bad-pass', 3600)
+        self.assertEquals(None, cookie.get_signed_in_user(bad, users.get))
+        self.assertEquals(None, cookie.get_signed_in_user(bad, users.get))
+        # session becomes invalid after password changed:
+        u.password = 'pass2'
+        self.assertEquals(None, cookie.get_signed_in_user(value, users.get))
+        value2 = cookie.make_sign_in_cookie('u1', 'pass2', 3600)
+        self.assertEquals(u, cookie.get_signed_in_user(value2, users.get))
+        # user deleted:
+        del users.users['u1']
+        self.assertEquals(None, cookie.get_signed_in_user(value2, users.get))
+
+    def test_session_of_locked_user(self):
+        u = _User('u1', 'pass1')
+        users = _Users(u)
+        value = cookie.make_sign_in_cookie('u1', 'pass1', 3600)
+        self.assertEquals(u, cookie.get_signed_in_user(value, users.get))
+        # session becomes invalid after user locked:
+        u.locked = True
+        self.assertEquals(None, cookie.get_signed_in_user(value, users.get))
+        # locked user can not sign in again with the same cookie:
+        self.assertEquals(None, cookie.get_signed_in_user(value, users.get))
+        # sign in again after user unlocked:
+        u.locked = False
+        self.assertEquals(u, cookie.get_signed_in_user(value, users.get))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,7 +7,7 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 Load navigation menu.
 '''
 
-from framework import cache
+from framework import pagecache
 from framework import store
 
 NAV_GROUP = '__navigation__'
@@ -19,9 +19,7 @@ def get_navigation(use_cache=True):
     Args:
         use_cache: True if use cache, default to True.
     '''
-    if use_cache:
-        return cache.get(NAV_GROUP, _get_from_store, 3600)
-    return _get_from_store()
+    return _get_from_store(use_cache)
 
 def set_navigation(navs):
     '''
@@ -30,15 +28,16 @@ def set_navigation(navs):
     Args:
         navs: list contains ('title', 'url').
     '''
-    store.delete_settings(NAV_GROUP)
+    d = {}
     n = 0
     for title, url in navs:
-        store.set_setting(u'%02d%s' % (n, title,), url, NAV_GROUP)
+        d[u'%02d%s' % (n, title,)] = url
         n = n + 1
-    cache.delete(NAV_GROUP)
+    store.replace_settings(d, NAV_GROUP)
+    pagecache.invalidate(pagecache.TAG_SITE)
 
-def _get_from_store():
-    nav_dict = store.get_settings(NAV_GROUP)
+def _get_from_store(use_cache=True):
+    nav_dict = store.get_settings(NAV_GROUP, use_cache)
     if not nav_dict:
         nav_dict[u'00Home'] = u'/'
     # sort:
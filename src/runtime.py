@@ -17,6 +17,7 @@ class UserTimeZone(datetime.tzinfo):
     '''
 
     def __init__(self, name, utc_hour_offset, utc_min_offset, dst):
+        self.key = (name, utc_hour_offset, utc_min_offset, dst)
         self._name = name
         self._utcoffset = datetime.timedelta(hours=utc_hour_offset, minutes=utc_min_offset)
         self._dst = datetime.timedelta(hours=dst)
@@ -33,6 +34,20 @@ class UserTimeZone(datetime.tzinfo):
 # UTC time zone instance:
 _UTC_TZ = UserTimeZone(UTC_NAME, 0, 0, 0)
 
+# (name, utc_hour_offset, utc_min_offset, dst) -> UserTimeZone:
+_timezones = {}
+
+def get_timezone(name, utc_hour_offset, utc_min_offset, dst):
+    '''
+    Get UserTimeZone instance which is created only once for the same args.
+    '''
+    key = (name, utc_hour_offset, utc_min_offset, dst)
+    tz = _timezones.get(key)
+    if tz is None:
+        tz = UserTimeZone(name, utc_hour_offset, utc_min_offset, dst)
+        _timezones[key] = tz
+    return tz
+
 def get_timezone_list():
     '''
     Return timezone list that contains tuples (utc_hour_offset, utc_minute_offset, dst_hour, timezone name).
@@ -160,14 +175,112 @@ def format_time(naive_dt, tzinfo, format):
     new_dt = naive_dt.replace(tzinfo=_UTC_TZ).astimezone(tzinfo)
     return new_dt.strftime(format)
 
+# max number of formatted strings memorized by each Formatter:
+MAX_FORMATTED = 256
+
+# max number of cached Formatter:
+MAX_FORMATTERS = 100
+
+class Formatter(dict):
+    '''
+    Format naive datetime (in UTC) with time zone and formats. Recently 
+    formatted strings are memorized in a small LRU cache. 
+    
+    It is also a dict contains 'format_datetime', 'format_date' and 
+    'format_time' as functions, so it can be used as runtime utils.
+    '''
+
+    def __init__(self, tzinfo, date_format, time_format):
+        super(Formatter, self).__init__()
+        self.tzinfo = tzinfo
+        self._formats = {
+                'datetime' : '%s %s' % (date_format, time_format),
+                'date' : date_format,
+                'time' : time_format,
+        }
+        # (kind, naive_dt) -> [formatted, tick]:
+        self._memo = {}
+        self._tick = 0
+        self['format_datetime'] = self.format_datetime
+        self['format_date'] = self.format_date
+        self['format_time'] = self.format_time
+
+    def _evict(self):
+        '''
+        Remove the least recently used half of memorized strings.
+        '''
+        items = [(v[1], k) for k, v in self._memo.iteritems()]
+        items.sort()
+        for tick, k in items[:len(items) // 2]:
+            self._memo.pop(k, None)
+
+    def format(self, naive_dt, kind='datetime'):
+        '''
+        Format naive datetime.
+        
+        Args:
+            naive_dt: naive datetime in UTC.
+            kind: 'datetime', 'date' or 'time', default to 'datetime'.
+        Returns:
+            Formatted str.
+        '''
+        self._tick += 1
+        key = (kind, naive_dt)
+        v = self._memo.get(key)
+        if v is not None:
+            v[1] = self._tick
+            return v[0]
+        s = naive_dt.replace(tzinfo=_UTC_TZ).astimezone(self.tzinfo).strftime(self._formats[kind])
+        if len(self._memo) >= MAX_FORMATTED:
+            self._evict()
+        self._memo[key] = [s, self._tick]
+        return s
+
+    def format_many(self, naive_dts, kind='datetime'):
+        '''
+        Format a list of naive datetime, e.g. dates of all posts in a listing.
+        
+        Args:
+            naive_dts: list of naive datetime in UTC.
+            kind: 'datetime', 'date' or 'time', default to 'datetime'.
+        Returns:
+            List of formatted str.
+        '''
+        return [self.format(dt, kind) for dt in naive_dts]
+
+    def format_datetime(self, naive_dt):
+        return self.format(naive_dt, 'datetime')
+
+    def format_date(self, naive_dt):
+        return self.format(naive_dt, 'date')
+
+    def format_time(self, naive_dt):
+        return self.format(naive_dt, 'time')
+
+# (tz key, date_format, time_format) -> Formatter:
+_formatters = {}
+
 def get_runtime_utils(tzinfo, date_format=None, time_format=None):
+    '''
+    Get Formatter by time zone and formats, which is created only once for 
+    the same args.
+    
+    Args:
+        tzinfo: tzinfo object, usually got by site.get_tzinfo().
+        date_format: date format, default to '%Y-%m-%d'.
+        time_format: time format, default to '%H:%M:%S'.
+    Returns:
+        Formatter object.
+    '''
     if date_format is None:
         date_format = '%Y-%m-%d'
     if time_format is None:
         time_format = '%H:%M:%S'
-    datetime_format = '%s %s' % (date_format, time_format)
-    return {
-            'format_datetime' : lambda dt : format_datetime(dt, tzinfo, datetime_format),
-            'format_date' : lambda dt : format_date(dt, tzinfo, date_format),
-            'format_time' : lambda dt : format_time(dt, tzinfo, time_format),
-    }
+    key = (getattr(tzinfo, 'key', tzinfo), date_format, time_format)
+    formatter = _formatters.get(key)
+    if formatter is None:
+        if len(_formatters) >= MAX_FORMATTERS:
+            _formatters.clear()
+        formatter = Formatter(tzinfo, date_format, time_format)
+        _formatters[key] = formatter
+    return formatter
@@ -4,6 +4,7 @@
 __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 
 from datetime import datetime
+from datetime import timedelta
 import unittest
 
 import runtime
@@ -20,5 +21,31 @@ class Test(unittest.TestCase):
         self.assertEquals('2008-02-21 13:30:59', runtime.format_datetime(dt, tz1, '%Y-%m-%d %H:%M:%S'))
         self.assertEquals('2008-02-20 21:30:59', runtime.format_datetime(dt, tz2, '%Y-%m-%d %H:%M:%S'))
 
+    def test_get_timezone(self):
+        tz = runtime.get_timezone('UTC+8:00', 8, 0, 0)
+        self.assertTrue(tz is runtime.get_timezone('UTC+8:00', 8, 0, 0))
+        self.assertFalse(tz is runtime.get_timezone('UTC+9:00', 9, 0, 0))
+
+    def test_formatter(self):
+        tz = runtime.get_timezone('UTC+8:00', 8, 0, 0)
+        utils = runtime.get_runtime_utils(tz, '%Y-%m-%d', '%H:%M')
+        self.assertTrue(utils is runtime.get_runtime_utils(runtime.get_timezone('UTC+8:00', 8, 0, 0), '%Y-%m-%d', '%H:%M'))
+        self.assertFalse(utils is runtime.get_runtime_utils(tz))
+        dt = datetime(2008, 2, 21, 20, 30, 59)
+        self.assertEquals('2008-02-22 04:30', utils.format_datetime(dt))
+        self.assertEquals('2008-02-22', utils.format_date(dt))
+        self.assertEquals('04:30', utils.format_time(dt))
+        # used as dict:
+        self.assertEquals('2008-02-22 04:30', utils['format_datetime'](dt))
+        dts = [datetime(2008, 2, 21, i, 0, 0) for i in range(24)]
+        self.assertEquals([runtime.format_date(d, tz, '%Y-%m-%d') for d in dts], utils.format_many(dts, 'date'))
+        # memorized strings are bounded:
+        for i in range(runtime.MAX_FORMATTED * 3):
+            utils.format_datetime(datetime(2000, 1, 1, 0, 0, 0) + timedelta(minutes=i))
+            utils.format_datetime(dt)
+        self.assertTrue(len(utils._memo) <= runtime.MAX_FORMATTED)
+        self.assertTrue(('datetime', dt) in utils._memo)
+        self.assertEquals('2008-02-22 04:30', utils.format_datetime(dt))
+
 if __name__ == '__main__':
     unittest.main()
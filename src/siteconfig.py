@@ -7,7 +7,7 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 Load site info.
 '''
 
-from framework import cache
+from framework import pagecache
 from framework import store
 import runtime
 
@@ -56,7 +56,7 @@ class Site(object):
                 setattr(self, key, Site.defaults[key])
 
     def get_tzinfo(self):
-        return runtime.UserTimeZone(self.tz_name, int(self.tz_h_offset), int(self.tz_m_offset), int(self.tz_dst))
+        return runtime.get_timezone(self.tz_name, int(self.tz_h_offset), int(self.tz_m_offset), int(self.tz_dst))
 
 def get_site_settings(use_cache=True):
     '''
@@ -65,9 +65,7 @@ def get_site_settings(use_cache=True):
     Args:
         use_cache: True if use cache, default to True.
     '''
-    if use_cache:
-        return cache.get(SITE_GROUP, _get_from_store, 3600)
-    return _get_from_store()
+    return _get_from_store(use_cache)
 
 def set_site_settings(**kw):
     '''
@@ -76,14 +74,16 @@ def set_site_settings(**kw):
     Args:
         keyword args support 'title', 'subtitle', etc.
     '''
-    store.delete_settings(SITE_GROUP)
     site = Site(**kw)
+    # all settings are overwritten in one batch:
+    d = {}
     for key in site.__slots__:
-        store.set_setting(key, str(getattr(site, key)), SITE_GROUP)
-    cache.delete(SITE_GROUP)
+        d[key] = str(getattr(site, key))
+    store.set_settings(d, SITE_GROUP)
+    pagecache.invalidate(pagecache.TAG_SITE)
 
-def _get_from_store():
-    site_dict = store.get_settings(SITE_GROUP)
+def _get_from_store(use_cache=True):
+    site_dict = store.get_settings(SITE_GROUP, use_cache)
     kw = {}
     for k in site_dict.keys():
         kw[str(k)] = site_dict[k]
@@ -11,6 +11,7 @@ import os
 import logging
 
 from framework import view
+from widget import model as widget_model
 import navigation
 import siteconfig
 import runtime
@@ -37,9 +38,33 @@ def get_theme_info(theme_name):
             'designer' : getattr(mod, '__designer__', '(unknown)'),
             'description' : getattr(mod, '__description__', '(no description)'),
             'url' : getattr(mod, '__url__', None),
+            'assets' : getattr(mod, '__assets__', {}),
             'sidebars' : getattr(mod, '__sidebars__', 0),
     }
 
+# theme name -> { asset name : list of urls }:
+_assets = {}
+
+def get_theme_assets(theme_name):
+    '''
+    Get css and js urls of theme as dict contains asset name as key and list 
+    of urls as value. The content-hashed bundles made by 'build.py' are used 
+    if asset manifest exists, otherwise the source files of '__assets__'.
+    '''
+    assets = _assets.get(theme_name)
+    if assets is None:
+        assets = {}
+        try:
+            from compiled import asset_manifest
+            assets.update(asset_manifest.ASSETS.get(theme_name, {}))
+        except ImportError:
+            pass
+        for name, urls in get_theme_info(theme_name)['assets'].iteritems():
+            if name not in assets:
+                assets[name] = list(urls)
+        _assets[theme_name] = assets
+    return assets
+
 def get_current_theme():
     '''
     Get default theme
@@ -53,8 +78,6 @@ def render(appname, app_model, **kw):
     '''
     th = get_current_theme()
     logging.info('render using theme "%s"...' % th)
-    # load widget:
-    # TODO...
     # prepare model for theme:
     site = siteconfig.get_site_settings()
     tz = site.get_tzinfo()
@@ -62,6 +85,7 @@ def render(appname, app_model, **kw):
     app_model['utils'] = utils
     app_model['user'] = kw['current_user']
     app_model['site'] = site
+    # not rendered here, but by '#include $__app__' of theme template:
     embedded_app = view.render(appname, app_model)
     title = site.title
     app_title = app_model.get('__title__', None)
@@ -78,5 +102,9 @@ def render(appname, app_model, **kw):
             'title' : title,
             'site' : site,
             'navigations' : navigation.get_navigation(),
+            'assets' : get_theme_assets(th),
     }
+    # load widgets:
+    for n in range(get_theme_info(th)['sidebars']):
+        model['__bar%d__' % n] = ''.join(widget_model.render_sidebar(n))
     return view.render('theme', model, view_dir=th)
@@ -6,3 +6,11 @@ __designer__ = 'Michael Liao (askxuefeng@gmail.com)'
 __description__ = 'A Blue Max theme provided by Blue Sky'
 __url__ = 'http://www.expressme.org/'
 __sidebars__ = 2
+
+# css and js used by template.html, which are bundled by 'build.py':
+__assets__ = {
+        'screen.css' : ('/static/css/blueprint/screen.css',),
+        'print.css' : ('/static/css/blueprint/print.css',),
+        'ie.css' : ('/static/css/blueprint/ie.css',),
+        'custom.css' : ('/theme/blue_max/static/custom.css',),
+}
@@ -6,3 +6,11 @@ __designer__ = 'Michael Liao (askxuefeng@gmail.com)'
 __description__ = 'A simple, clear theme as default theme for ExpressMe.'
 __url__ = 'http://www.expressme.org/'
 __sidebars__ = 2
+
+# css and js used by template.html, which are bundled by 'build.py':
+__assets__ = {
+        'screen.css' : ('/static/css/blueprint/screen.css',),
+        'print.css' : ('/static/css/blueprint/print.css',),
+        'ie.css' : ('/static/css/blueprint/ie.css',),
+        'custom.css' : ('/theme/default/static/custom.css',),
+}
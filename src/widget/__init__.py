@@ -38,6 +38,7 @@ class WidgetSetting(object):
             raise ValueError('\'description\' must be str or unicode.')
         if not isinstance(pattern, str):
             raise ValueError('\'pattern\' must be str.')
+        self.key = key
         self.default = default
         self.required = required
         self.description = description
@@ -79,7 +80,7 @@ class WidgetCheckedSetting(WidgetSetting):
         Add label.
         '''
         default = kw.get('default', 'False')
-        super(WidgetCheckedSetting, self).__init__(default=default, required=kw.get('required', False), description=kw.get('description', ''), value=kw.get('value'), pattern='^(True|False)$')
+        super(WidgetCheckedSetting, self).__init__(key=kw.get('key', ''), default=default, required=kw.get('required', False), description=kw.get('description', ''), value=kw.get('value'), pattern='^(True|False)$')
         self.label = kw.get('label', '')
 
 class WidgetPasswordSetting(WidgetSetting):
@@ -90,7 +91,10 @@ class WidgetPasswordSetting(WidgetSetting):
 
 class WidgetModel(object):
 
-    title = WidgetSetting(description='Widget title (leave empty to hide title)', default='Widget')
+    # seconds to cache rendered html of a widget instance, 0 to disable:
+    __fragment_cache__ = 3600
+
+    title = WidgetSetting(key='title', description='Widget title (leave empty to hide title)', default='Widget')
 
     def handle_request(self, request, response, parameters):
         '''
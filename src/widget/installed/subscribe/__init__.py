@@ -17,11 +17,13 @@ class Widget(widget.WidgetModel):
     __description__ = 'Subscribe the feed to readers'
     __url__ = 'http://www.expressme.org/'
 
+    # feed url is changed by blog options:
+    __fragment_cache__ = 300
+
     @staticmethod
     def get_settings():
         return []
 
     def get_content__raw__(self):
-        feed = blog.model.get_feed_url()
-        url = framework.store.get_setting('blog_setting', 'feed_proxy', '/blog/feed')
+        url = blog.get_feed_url()
         return '<div><a href="%s"><img src="/widget/installed/subscribe/static/feed.gif" width="16" height="16" style="vertical-align:middle" /></a> <a href="%s" target="_blank">Subscribe to Feed</a></div>' % (url, url)
@@ -10,21 +10,35 @@ from google.appengine.ext import db
 
 from framework import store
 from framework import cache
+from framework import pagecache
 
 from widget import WidgetSetting
 
+# cache key of (id, name) of widget instances in a sidebar:
+SIDEBAR_KEY = '__widget_sidebar_%s__'
+
+# cache key of rendered html of a widget instance:
+FRAGMENT_KEY = '__widget_fragment_%s__'
+
+# installed widgets that discovered once per process:
+_catalog = None
+
 def get_installed_widgets():
     '''
     Get installed widgets as dict containing key=package_name, value=class object.
+    Widgets are discovered only once in a process.
     '''
-    installed_path = os.path.join(os.path.split(__file__)[0], 'installed')
-    packages = os.listdir(installed_path)
-    valid_packages = [pkg for pkg in packages if os.path.isfile(os.path.join(installed_path, pkg, '__init__.py'))]
-    d = {}
-    for pkg_name in valid_packages:
-        cls = __import__('widget.installed.%s' % pkg_name, fromlist=['Widget']).Widget
-        d[pkg_name] = cls
-    return d
+    global _catalog
+    if _catalog is None:
+        installed_path = os.path.join(os.path.split(__file__)[0], 'installed')
+        packages = os.listdir(installed_path)
+        valid_packages = [pkg for pkg in packages if os.path.isfile(os.path.join(installed_path, pkg, '__init__.py'))]
+        d = {}
+        for pkg_name in valid_packages:
+            cls = __import__('widget.installed.%s' % pkg_name, fromlist=['Widget']).Widget
+            d[pkg_name] = cls
+        _catalog = d
+    return dict(_catalog)
 
 def load_widget_class(name):
     return __import__('widget.installed.%s' % name, fromlist='Widget').Widget
@@ -60,36 +74,48 @@ def create_widget_instance(name, sidebar):
         raise StandardError('Maximum widgets exceeded in a sidebar.')
     w = WidgetInstance(name=name, sidebar=sidebar, display_order=count)
     w.put()
+    cache.delete(SIDEBAR_KEY % sidebar)
+    pagecache.invalidate(pagecache.TAG_SITE)
     return w
 
+def _settings_group(id):
+    return 'widget_instance_%s' % id
+
+def _get_layout(sidebar, use_cache=True):
+    '''
+    Get (id, name) of widget instances in a sidebar ordered by display order.
+    '''
+    def _load():
+        instances = WidgetInstance.all().filter('sidebar =', sidebar).order('display_order').fetch(100)
+        return [(instance.id, instance.name) for instance in instances]
+    if use_cache:
+        return cache.get(SIDEBAR_KEY % sidebar, _load)
+    return _load()
+
 def get_widget_instances(sidebar, use_cache=True):
     '''
     Get widget instances of the given sidebar.
     
     Args:
       sidebar: index of the sidebar, 0-9.
-      use_cache: True if fetch from cache first. Default to True.
+      use_cache: True if fetch instance keys from cache first. Default to True.
     Returns:
       List of widget instances, as well as each instance has:
         settings: instance settings as dict,
         widget_class: widget class object.
     '''
-    def _load():
-        instances = WidgetInstance.all().filter('sidebar =', sidebar).order('display_order').fetch(100)
-        widgets = get_installed_widgets()
-        r = []
-        for instance in instances:
-            if instance.name in widgets:
-                instance.widget_class = widgets[instance.name]
-                instance.settings = get_widget_instance_settings(instance, instance.widget_class)
-                instance.widget = instance.widget_class()
-                for k, v in instance.settings.iteritems():
-                    instance.widget[k] = v
-                r.append(instance)
-        return r
+    widgets = get_installed_widgets()
     if use_cache:
-        return cache.get('__widget_sidebar_%s__' % sidebar, _load)
-    return _load()
+        keys = [id for id, name in _get_layout(sidebar) if name in widgets]
+        instances = [instance for instance in WidgetInstance.get(keys) if instance is not None]
+    else:
+        instances = WidgetInstance.all().filter('sidebar =', sidebar).order('display_order').fetch(100)
+        instances = [instance for instance in instances if instance.name in widgets]
+    settings = store.get_settings_multi([_settings_group(instance.id) for instance in instances])
+    for instance in instances:
+        instance.widget_class = widgets[instance.name]
+        instance.settings = settings[_settings_group(instance.id)]
+    return instances
 
 def get_widget_instance_settings(widget_instance, widget_class):
     '''
@@ -102,11 +128,69 @@ def get_widget_instance_settings(widget_instance, widget_class):
     Return:
       Dict (name=value) as settings of WidgetInstance.
     '''
-    d = store.get_settings('widget_instance_%s' % widget_instance.id)
-    settings = get_widget_class_settings(widget_class)
-    
+    return store.get_settings(_settings_group(widget_instance.id))
+
+def _get_default_settings(widget_class):
+    '''
+    Get default settings of widget class as dict.
+    '''
+    d = {}
+    for attr in dir(widget_class):
+        setting = getattr(widget_class, attr)
+        if isinstance(setting, WidgetSetting):
+            d[attr] = setting.default
+    if hasattr(widget_class, 'get_settings'):
+        for setting in widget_class.get_settings():
+            d[setting.key] = setting.default
     return d
 
+def render_widget(id, widget_class, settings):
+    '''
+    Render a widget instance as html.
+    
+    Args:
+      id: widget instance id.
+      widget_class: widget class object.
+      settings: instance settings as dict.
+    Returns:
+      Html fragment as str or unicode.
+    '''
+    d = _get_default_settings(widget_class)
+    d.update(settings)
+    w = widget_class()
+    w.load(id, d)
+    return w.render()
+
+def render_sidebar(sidebar):
+    '''
+    Render all widget instances of a sidebar. Rendered html of each instance 
+    is cached with the time defined by '__fragment_cache__' of widget class, 
+    so all fragments are fetched by one cache.get_multi().
+    
+    Args:
+      sidebar: index of the sidebar, 0-9.
+    Returns:
+      List of html fragments ordered by display order.
+    '''
+    widgets = get_installed_widgets()
+    layout = [(id, name) for id, name in _get_layout(sidebar) if name in widgets]
+    fragments = cache.get_multi([FRAGMENT_KEY % id for id, name in layout])
+    missing = [(id, name) for id, name in layout if not FRAGMENT_KEY % id in fragments]
+    if missing:
+        settings = store.get_settings_multi([_settings_group(id) for id, name in missing])
+        # group fragments by cache time:
+        to_cache = {}
+        for id, name in missing:
+            widget_class = widgets[name]
+            html = render_widget(id, widget_class, settings[_settings_group(id)])
+            fragments[FRAGMENT_KEY % id] = html
+            time = getattr(widget_class, '__fragment_cache__', 0)
+            if time:
+                to_cache.setdefault(time, {})[FRAGMENT_KEY % id] = html
+        for time, mapping in to_cache.iteritems():
+            cache.set_multi(mapping, time)
+    return [fragments[FRAGMENT_KEY % id] for id, name in layout]
+
 def save_widget_instance_settings(instance, setting_as_dict):
     '''
     Update instance settings.
@@ -117,11 +201,9 @@ def save_widget_instance_settings(instance, setting_as_dict):
     Returns:
       None
     '''
-    group = 'widget_instance_%s' % instance.id
-    cache.delete('__widget_sidebar_%s__' % instance.sidebar)
-    store.delete_settings(group)
-    for k, v in setting_as_dict.items():
-        store.set_setting(k, v, group)
+    store.replace_settings(setting_as_dict, _settings_group(instance.id))
+    cache.delete(FRAGMENT_KEY % instance.id)
+    pagecache.invalidate(pagecache.TAG_SITE)
 
 def delete_widget_instance(key):
     '''
@@ -134,9 +216,25 @@ def delete_widget_instance(key):
     '''
     instance = WidgetInstance.get(key)
     if instance is not None:
-        cache.delete('__widget_sidebar_%s__' % instance.sidebar)
         instance.delete()
-        store.delete_settings('widget_instance_%s' % key)
+        store.delete_settings(_settings_group(key))
+        cache.delete_multi([FRAGMENT_KEY % key, SIDEBAR_KEY % instance.sidebar])
+        pagecache.invalidate(pagecache.TAG_SITE)
+
+def invalidate_widget_fragments(name):
+    '''
+    Remove cached html of all instances of a widget and invalidate all 
+    cached pages, when data shown by the widget is changed outside.
+    
+    Args:
+      name: widget name, e.g. 'subscribe'.
+    Returns:
+      None
+    '''
+    keys = WidgetInstance.all(keys_only=True).filter('name =', name).fetch(1000)
+    if keys:
+        cache.delete_multi([FRAGMENT_KEY % str(key) for key in keys])
+    pagecache.invalidate(pagecache.TAG_SITE)
 
 def get_widget_class_settings(widget_class):
     '''
@@ -6,6 +6,8 @@ __author__ = 'Michael Liao (askxuefeng@gmail.com)'
 import unittest
 
 from framework.gaeunit import GaeTestCase
+from framework import cache
+from framework import pagecache
 from widget import model
 
 class Test(GaeTestCase):
@@ -36,6 +38,41 @@ class Test(GaeTestCase):
         self.assertEquals(0, instances[1].sidebar)
         self.assertEquals(1, instances[1].display_order)
 
+    def test_render_sidebar(self):
+        html = model.create_widget_instance('html', 1)
+        model.save_widget_instance_settings(html, { 'title' : 'Snippet', 'html' : '<p>Hello</p>' })
+        model.create_widget_instance('html', 1)
+        fragments = model.render_sidebar(1)
+        self.assertEquals(2, len(fragments))
+        self.assertTrue(fragments[0].find('<h3 class="widget-title">Snippet</h3>')>=0)
+        self.assertTrue(fragments[0].find('<p>Hello</p>')>=0)
+        # default settings:
+        self.assertTrue(fragments[1].find('Your html snippet goes here')>=0)
+        # fragment is cached:
+        self.assertEquals(fragments[0], cache.get(model.FRAGMENT_KEY % html.id))
+        # saving settings only invalidates its fragment:
+        model.save_widget_instance_settings(html, { 'title' : '', 'html' : '<p>Bye</p>' })
+        self.assertEquals(None, cache.get(model.FRAGMENT_KEY % html.id))
+        fragments = model.render_sidebar(1)
+        self.assertTrue(fragments[0].find('<p>Bye</p>')>=0)
+        self.assertTrue(fragments[0].find('widget-title')==(-1))
+        model.delete_widget_instance(html.id)
+        self.assertEquals(1, len(model.render_sidebar(1)))
+
+    def test_invalidate_widget_fragments(self):
+        s1 = model.create_widget_instance('subscribe', 2)
+        s2 = model.create_widget_instance('subscribe', 3)
+        model.render_sidebar(2)
+        model.render_sidebar(3)
+        pagecache.set_page(pagecache.make_key('/blog/'), '<html/>', time=3600)
+        self.assertNotEquals(None, cache.get(model.FRAGMENT_KEY % s1.id))
+        self.assertNotEquals(None, cache.get(model.FRAGMENT_KEY % s2.id))
+        model.invalidate_widget_fragments('subscribe')
+        self.assertEquals(None, cache.get(model.FRAGMENT_KEY % s1.id))
+        self.assertEquals(None, cache.get(model.FRAGMENT_KEY % s2.id))
+        # all cached pages are invalidated:
+        self.assertEquals(None, pagecache.get_page(pagecache.make_key('/blog/')))
+
 if __name__ == '__main__':
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
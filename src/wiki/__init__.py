@@ -10,8 +10,11 @@ Wiki app
 from datetime import datetime
 
 from google.appengine.ext import db
+from framework import store
 from manage import shared
 
+from wiki import parser
+
 WIKI_EDITABLE = 0  # wiki is open to edit
 WIKI_PROTECTED = 1 # wiki can be edit, but need approval by admin
 WIKI_LOCKED = 2    # wiki cannot be edit
@@ -35,6 +38,107 @@ class WikiPage(db.Model):
     wiki_date = db.DateTimeProperty()
     wiki_modified = db.DateTimeProperty()
     wiki_state = db.IntegerProperty(required=True, default=WIKI_EDITABLE)
+    # rendered html, None if need to render again:
+    wiki_html = db.TextProperty()
+    # titles of internal links in rendered html:
+    wiki_links = db.StringListProperty()
+
+class WikiTitle(db.Model):
+    '''
+    Index of visible wiki pages, and key name is 'title:' + wiki title.
+    '''
+    pass
+
+class WikiIndexState(db.Model):
+    '''
+    Progress of rebuild_title_index(), and key name is TITLE_INDEX.
+    '''
+    cursor = db.TextProperty()
+    built = db.BooleanProperty(required=True, default=False)
+
+TITLE_INDEX = 'title_index'
+
+# number of pages read by each query of rebuild_title_index():
+REBUILD_BATCH_SIZE = 100
+
+# True if title index is built, cached once it is built:
+_title_index_built = False
+
+def is_title_index_built():
+    '''
+    Is title index built for all pages, so links can be resolved by it.
+    '''
+    global _title_index_built
+    if not _title_index_built:
+        state = WikiIndexState.get_by_key_name(TITLE_INDEX)
+        _title_index_built = state is not None and state.built
+    return _title_index_built
+
+def _title_key_name(title):
+    return u'title:' + title
+
+def get_exist_titles(titles):
+    '''
+    Get titles of visible wiki pages by one batch get.
+    
+    Args:
+        titles: list of wiki title, unicode.
+    
+    Returns:
+        Set of titles that page exists and visible.
+    '''
+    if not titles:
+        return set()
+    titles = list(titles)
+    indexes = WikiTitle.get_by_key_name([_title_key_name(title) for title in titles])
+    return set([title for title, index in zip(titles, indexes) if index is not None])
+
+def _update_title_index(page):
+    '''
+    Update title index of page, and invalidate html of pages that link to 
+    it if page is created or deleted.
+    '''
+    key_name = _title_key_name(page.wiki_title)
+    visible = page.is_saved() and page.wiki_state<WIKI_PENDING
+    exist = WikiTitle.get_by_key_name(key_name) is not None
+    if visible==exist:
+        return
+    if visible:
+        WikiTitle(key_name=key_name).put()
+    else:
+        db.delete(db.Key.from_path('WikiTitle', key_name))
+    _invalidate_linked_pages(page.wiki_title)
+
+def _invalidate_linked_pages(title):
+    '''
+    Clear rendered html of pages that link to title.
+    '''
+    pages = WikiPage.all().filter('wiki_links =', title).fetch(1000)
+    for page in pages:
+        page.wiki_html = None
+    if pages:
+        db.put(pages)
+
+def render_wiki(page):
+    '''
+    Get rendered html of wiki page. Page is rendered and saved only if html 
+    is not rendered yet, and all internal links are resolved by one batch get. 
+    Html is not saved until title index is built, because links to pages 
+    that are not indexed yet are rendered as missing.
+    
+    Args:
+        page: WikiPage object.
+    
+    Returns:
+        Html as unicode.
+    '''
+    if page.wiki_html is None:
+        links = []
+        page.wiki_html = parser.parse(page.wiki_content, resolve_links=get_exist_titles, links=links)
+        page.wiki_links = links
+        if is_title_index_built():
+            page.put()
+    return page.wiki_html
 
 def has_wiki(title):
     '''
@@ -46,8 +150,7 @@ def has_wiki(title):
     Returns:
         True if exist, otherwise False.
     '''
-    list = WikiPage.all().filter('wiki_title =', title).filter('wiki_state <', WIKI_PENDING).fetch(1)
-    return len(list)>0
+    return title in get_exist_titles([title])
 
 def get_wiki(title):
     '''
@@ -90,10 +193,12 @@ def edit_wiki(user, title, content):
             page.wiki_history = history
             page.wiki_modified = now
             page.wiki_content = content
+            page.wiki_html = None
             # change pending state to visible:
             if page.wiki_state==WIKI_PENDING:
                 page.wiki_state = WIKI_EDITABLE
             page.put()
+            _update_title_index(page)
         return page.wiki_state!=WIKI_PENDING
     # create a new wiki page:
     approved = user.user_role<=shared.USER_ROLE_EDITOR
@@ -103,4 +208,48 @@ def edit_wiki(user, title, content):
     if not approved:
         page.wiki_state = WIKI_PENDING
     page.put()
+    _update_title_index(page)
     return page.wiki_state!=WIKI_PENDING
+
+def delete_wiki(title):
+    '''
+    Delete a wiki page.
+    
+    Args:
+        title: page title, unicode.
+    '''
+    pages = WikiPage.all().filter('wiki_title =', title).fetch(10)
+    if pages:
+        db.delete(pages)
+        db.delete(db.Key.from_path('WikiTitle', _title_key_name(title)))
+        _invalidate_linked_pages(title)
+
+def rebuild_title_index(max_batches=50):
+    '''
+    Build title index for pages that created before index is used, and clear 
+    html of all pages that may be rendered with missing links. Pages are read 
+    in batches, and the rest are read in next call.
+    
+    Args:
+        max_batches: max number of batches read in one call.
+    
+    Returns:
+        True if all pages are indexed, False if need to call again.
+    '''
+    state = WikiIndexState.get_or_insert(TITLE_INDEX)
+    if state.built:
+        return True
+    q = WikiPage.all()
+    cursor = state.cursor
+    for i in range(max_batches):
+        pages, cursor = store.get_by_cursor(q, cursor, REBUILD_BATCH_SIZE)
+        titles = [WikiTitle(key_name=_title_key_name(page.wiki_title)) for page in pages if page.wiki_state<WIKI_PENDING]
+        for page in pages:
+            page.wiki_html = None
+        db.put(titles + pages)
+        if cursor is None:
+            break
+    state.cursor = cursor
+    state.built = cursor is None
+    state.put()
+    return state.built
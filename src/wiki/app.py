@@ -15,7 +15,6 @@ from framework.web import raw_mapping
 from framework import store
 
 import wiki
-from wiki import parser
 
 WIKI_SETTINGS = '__wiki__'
 
@@ -42,7 +41,7 @@ def get_page(utf8title, **kw):
     content = ''
     page = wiki.get_wiki(title)
     if page is not None:
-        content = parser.parse(page.content, wiki.has_wiki)
+        content = wiki.render_wiki(page)
     editable = page is not None and context.user is not None
     if editable:
         editable = page.wiki_state!=wiki.WIKI_LOCKED or context.user.user_role==manage.USER_ROLE_ADMINISTRATOR
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Cron task of wiki app.
+'''
+
+import logging
+
+from framework.web import get
+
+from framework import PermissionError
+
+import wiki
+
+@get('/cron/title_index', needs=('request', 'response', 'current_user'))
+def cron_rebuild_title_index(**kw):
+    '''
+    Called by cron task or administrator. Build title index of pages saved 
+    before the index is used, until all pages are indexed.
+    '''
+    current_user = kw['current_user']
+    if kw['request'].headers.get('X-AppEngine-Cron')!='true':
+        if current_user is None or not current_user.is_admin():
+            raise PermissionError('Only cron task or administrator can rebuild title index.')
+    built = wiki.rebuild_title_index()
+    logging.info('Title index of wiki is %s.' % (built and 'built' or 'partly built'))
+    kw['response'].out.write(built and 'built' or 'partial')
@@ -90,6 +90,21 @@ class TocHolder(object):
     def __str__(self):
         return '<!-- To be replaced with toc (max=%d) -->' % (self.max,)
 
+class LinkHolder(object):
+    '''
+    Internal link that is rendered after all link targets are resolved.
+    '''
+
+    def __init__(self, link, title):
+        self.link = link
+        self.title = title
+
+    def render(self, exist):
+        vars = (valid_title(self.link), self.title, self.title)
+        if exist:
+            return '<a href="/wiki/page/%s" title="%s" class="wiki-link">%s</a>' % vars
+        return '<a href="/wiki/edit?title=%s" title="Edit %s" class="wiki-link-edit">%s</a>' % vars
+
 sym_pair_dict = {
         '__' : ('<i>', '</i>'),
         '**' : ('<b>', '</b>'),
@@ -99,6 +114,9 @@ sym_pair_dict = {
 
 wiki_sym = re.compile(r'(\_\_|\*\*|\`\`|\~\~|\[\[)')
 
+# inline markup or internal link with text until ']]' or end of line:
+wiki_inline = re.compile(r'(\_\_|\*\*|\`\`|\~\~)|\[\[(.*?)(\]\]|$)')
+
 #wiki_summary = re.compile(r'^\#summary .*$')
 wiki_toc = re.compile(r'^ *\<wiki\:toc( +max\_depth\=[\"|\'](?P<max>[1-6])[\"|\'])? *(\/\> *|> *\<\/wiki\:toc\>) *$')
 wiki_heading = re.compile(r'^(\={1,6}) +(.+) +(\={1,6})$')
@@ -107,6 +125,14 @@ wiki_list_ol = re.compile(r'^( *)\# .*$')
 wiki_hr = re.compile(r'^ *\-\-\-\-\-* *$')
 wiki_empty = re.compile(r'^ *$')
 
+# all line patterns above in one regex, tried in the same order:
+wiki_line = re.compile(r'^(?:' \
+        r'(?P<heading>(?P<h_start>\={1,6}) +(?P<h_title>.+) +(?P<h_end>\={1,6}))' \
+        r'|(?P<toc> *\<wiki\:toc( +max\_depth\=[\"|\'](?P<max>[1-6])[\"|\'])? *(\/\> *|> *\<\/wiki\:toc\>) *)' \
+        r'|(?P<hr> *\-\-\-\-\-* *)' \
+        r'|(?P<empty> *)' \
+        r')$')
+
 def valid_title(title):
     '''
     Convert title to a valid title.
@@ -115,9 +141,10 @@ def valid_title(title):
         title = title.encode('utf8')
     return urllib.quote(title.strip().replace(' ', '_'), safe='')
 
-def __parse_link(text, is_exist):
+def _parse_link(text):
     '''
-    Convert '[[text]]' to a http link '<a href=xxx>link</a>'.
+    Convert '[[text]]' to a http link '<a href=xxx>link</a>', or a 
+    LinkHolder if it is an internal link.
     '''
     links = text.strip().split(' ', 1)
     link = links[0]
@@ -133,112 +160,181 @@ def __parse_link(text, is_exist):
             title = link[7:]
         return '<a href="%s" title="%s" class="wiki-link-email">%s</a>' % (link, title, title)
     # internal link:
-    vars = (valid_title(link), title, title)
-    return is_exist(link) \
-            and '<a href="/wiki/page/%s" title="%s" class="wiki-link">%s</a>' % vars \
-            or '<a href="/wiki/edit?title=%s" title="Edit %s" class="wiki-link-edit">%s</a>' % vars
+    return LinkHolder(link, title)
 
-def parse(wikicontent, is_exist):
-    buffer = ['<!-- parsed wiki page -->']
-    headings = []
-    f = StringIO.StringIO(wikicontent)
-    last_indent = 0
-    pre = False
-    has_p = False
-    for line in f:
+def _resolve_by_exist(is_exist):
+    '''
+    Make a batch resolver from a function that checks only one title.
+    '''
+    def resolve(titles):
+        return set([title for title in titles if is_exist(title)])
+    return resolve
+
+class _LineParser(object):
+    '''
+    Parse wiki content line by line. Each line is classified by one regex, 
+    and inline markups are scanned by position in the line. Positions of 
+    LinkHolder and TocHolder in buffer are recorded so they can be replaced 
+    without scanning the buffer again.
+    '''
+
+    def __init__(self):
+        self.headings = []
+        self.links = []
+        self.tocs = []
+        self.has_p = False
+
+    def feed(self, line, buffer):
+        '''
+        Parse a line and append html pieces, TocHolder or LinkHolder to buffer.
+        '''
+        append = buffer.append
         line = line.rstrip('\n').rstrip('\r')
-        # is heading:
-        m = wiki_heading.match(line)
-        if m is not None:
-            if has_p:
-                has_p = False
-                buffer.append('</p>')
-            if len(m.group(1))==len(m.group(3)):
-                n = len(m.group(1))
-                title = m.group(2)
-                href = valid_title(title)
-                headings.append((n, title, href,))
-                buffer.append('<a name="%s"></a><h%d class="wiki-heading">%s</h%d>' % (href, n, title, n))
-            else:
-                # invalid heading
-                buffer.append(line)
-            continue
-        # is toc:
-        m = wiki_toc.match(line)
-        if m is not None:
-            if has_p:
-                has_p = False
-                buffer.append('</p>')
-            max = 6
-            ms = m.group('max')
-            if ms is not None:
-                max = int(ms)
-            buffer.append(TocHolder(max))
-            continue
-        # is seperator line:
-        m = wiki_hr.match(line)
-        if m is not None:
-            if has_p:
-                has_p = False
-                buffer.append('</p>')
-            buffer.append('<hr class="wiki-hr" />')
-            continue
-        # empty line?
-        m = wiki_empty.match(line)
+        m = wiki_line.match(line)
         if m is not None:
-            if has_p:
-                has_p = False
-                buffer.append('</p>')
-            continue
-        # parse line:
-        if not has_p:
-            has_p = True
-            buffer.append('<p class="wiki-p">')
+            if self.has_p:
+                self.has_p = False
+                append('</p>')
+            if m.group('heading') is not None:
+                n = len(m.group('h_start'))
+                if n==len(m.group('h_end')):
+                    title = m.group('h_title')
+                    href = valid_title(title)
+                    self.headings.append((n, title, href,))
+                    append('<a name="%s"></a><h%d class="wiki-heading">%s</h%d>' % (href, n, title, n))
+                else:
+                    # invalid heading
+                    append(line)
+            elif m.group('toc') is not None:
+                max = 6
+                ms = m.group('max')
+                if ms is not None:
+                    max = int(ms)
+                self.tocs.append(len(buffer))
+                append(TocHolder(max))
+            elif m.group('hr') is not None:
+                append('<hr class="wiki-hr" />')
+            return
+        if not self.has_p:
+            self.has_p = True
+            append('<p class="wiki-p">')
         stack = []
-        while True:
-            m = wiki_sym.search(line)
-            if m is None:
-                buffer.append(line)
-                break
-            buffer.append(line[:m.start()])
+        pos = 0
+        for m in wiki_inline.finditer(line):
+            start, end = m.span()
+            if start > pos:
+                append(line[pos:start])
+            pos = end
             sym = m.group(1)
-            if sym in sym_pair_dict:
-                # it is __, **, ~~:
-                if stack and stack[-1]==sym:
-                    # should pop up:
-                    stack.pop()
-                    buffer.append(sym_pair_dict[sym][1])
-                else:
-                    # should push:
-                    stack.append(sym)
-                    buffer.append(sym_pair_dict[sym][0])
-                line = line[m.end():]
-            elif sym=='[[':
+            if sym is None:
                 # parse link
-                end_of_link = line.find(']]', m.end())
-                link = end_of_link==(-1) and line[m.end():] or line[m.end():end_of_link]
-                buffer.append(__parse_link(link, is_exist))
-                if end_of_link==(-1):
-                    break
-                line = line[end_of_link+2:]
-                if not line:
+                link = _parse_link(m.group(2))
+                if isinstance(link, LinkHolder):
+                    self.links.append(len(buffer))
+                append(link)
+                if not m.group(3):
+                    # link is not closed:
                     break
+            elif stack and stack[-1]==sym:
+                # it is __, **, ``, ~~ and should pop up:
+                stack.pop()
+                append(sym_pair_dict[sym][1])
+            else:
+                # should push:
+                stack.append(sym)
+                append(sym_pair_dict[sym][0])
+        if pos < len(line):
+            append(line[pos:])
         # fix stack:
         while stack:
-            sym = stack.pop()
-            buffer.append(sym_pair_dict[sym][1])
-        buffer.append('\n')
-
-    if has_p:
-        buffer.append('</p>')
-    # replace toc:
-    for index, item in enumerate(buffer):
-        if isinstance(item, TocHolder):
-            buffer[index] = __parse_toc(headings)
-            break
-    return ''.join(buffer)
-
-def __parse_toc(headings):
+            append(sym_pair_dict[stack.pop()][1])
+        append('\n')
+
+    def close(self, buffer):
+        if self.has_p:
+            self.has_p = False
+            buffer.append('</p>')
+
+    def render(self, buffer, resolve_links, links, final):
+        '''
+        Resolve internal links in buffer by one batch, replace toc if final 
+        is True, and join all pieces.
+        '''
+        if self.links:
+            targets = []
+            seen = set()
+            for index in self.links:
+                link = buffer[index].link
+                if not link in seen:
+                    seen.add(link)
+                    targets.append(link)
+            exists = resolve_links(targets)
+            for index in self.links:
+                holder = buffer[index]
+                buffer[index] = holder.render(holder.link in exists)
+            if links is not None:
+                links.extend(targets)
+            self.links = []
+        if final and self.tocs:
+            # only the first toc is replaced:
+            for index in self.tocs[1:]:
+                buffer[index] = str(buffer[index])
+            buffer[self.tocs[0]] = _parse_toc(self.headings)
+        return ''.join(buffer)
+
+def parse(wikicontent, is_exist=None, resolve_links=None, links=None):
+    '''
+    Parse wiki content to html.
+    
+    Args:
+        wikicontent: wiki content as str or unicode.
+        is_exist: function that accepts a title and returns True if page exists.
+        resolve_links: function that accepts list of titles and returns a set 
+            of existing titles. All internal links are resolved by one call, 
+            and is_exist is ignored if resolve_links is set.
+        links: list that internal link targets are appended to, default to None.
+    Returns:
+        Html as str or unicode.
+    '''
+    if resolve_links is None:
+        resolve_links = is_exist and _resolve_by_exist(is_exist) or (lambda titles: set())
+    buffer = ['<!-- parsed wiki page -->']
+    p = _LineParser()
+    feed = p.feed
+    for line in StringIO.StringIO(wikicontent):
+        feed(line, buffer)
+    p.close(buffer)
+    return p.render(buffer, resolve_links, links, True)
+
+def parse_stream(f, is_exist=None, resolve_links=None, links=None, chunk_lines=500):
+    '''
+    Parse wiki content from a file-like object, and yield html chunks. 
+    Internal links are resolved by one call for each chunk. Output after a 
+    toc is held until the end since toc needs all headings.
+    
+    Args:
+        f: file-like object that iterates lines.
+        is_exist, resolve_links, links: same as parse().
+        chunk_lines: number of lines in a chunk, default to 500.
+    Returns:
+        Generator of html chunks that the joined result equals to parse().
+    '''
+    if resolve_links is None:
+        resolve_links = is_exist and _resolve_by_exist(is_exist) or (lambda titles: set())
+    buffer = ['<!-- parsed wiki page -->']
+    p = _LineParser()
+    n = 0
+    for line in f:
+        p.feed(line, buffer)
+        n += 1
+        if n>=chunk_lines and not p.tocs:
+            yield p.render(buffer, resolve_links, links, False)
+            buffer = []
+            n = 0
+    p.close(buffer)
+    yield p.render(buffer, resolve_links, links, True)
+
+def _parse_toc(headings):
     '''
     parse headings in list which starts with '<!--@Heading%d %s-->'
     
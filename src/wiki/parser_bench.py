@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+__author__ = 'Michael Liao (askxuefeng@gmail.com)'
+
+'''
+Benchmarks of wiki parser over pages generated from words in 
+integration_test/words.txt:
+
+links: resolve internal links by is_exist per link vs. one batch lookup 
+per page, and each lookup sleeps for a simulated datastore round trip.
+
+throughput: MB/s of the regex-per-line parser with string slicing before 
+vs. the single-pass tokenizer, on normal pages and on very long lines.
+
+Usage: PYTHONPATH=. python wiki/parser_bench.py links [pages] [links_per_page] [rpc_ms]
+       PYTHONPATH=. python wiki/parser_bench.py throughput [size_kb] [loops]
+'''
+
+import os
+import sys
+import imp
+import time
+import random
+import StringIO
+
+from integration_test import integration_utils
+
+# load parser only, without importing wiki package that needs datastore:
+parser = imp.load_source('wiki_parser', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser.py'))
+
+def _make_corpus(words, pages, links):
+    '''
+    Make pages of wiki content, and half of link targets are existing pages.
+    '''
+    titles = [integration_utils.dummy_title(words, 2) for i in range(links * 2)]
+    exists = set(titles[:links])
+    corpus = []
+    for i in range(pages):
+        lines = ['= %s =' % integration_utils.dummy_title(words, 3)]
+        for j in range(links):
+            lines.append('%s [[%s]] **%s** __%s__' % (
+                    integration_utils.dummy_title(words, 8),
+                    random.choice(titles),
+                    integration_utils.dummy_title(words, 2),
+                    integration_utils.dummy_title(words, 2)
+            ))
+            if j % 10==9:
+                lines.append('')
+        corpus.append('\n'.join(lines))
+    return corpus, exists
+
+class _Lookup(object):
+
+    def __init__(self, exists, rpc):
+        self.exists = exists
+        self.rpc = rpc
+        self.calls = 0
+
+    def is_exist(self, title):
+        self.calls += 1
+        time.sleep(self.rpc)
+        return title in self.exists
+
+    def resolve_links(self, titles):
+        self.calls += 1
+        time.sleep(self.rpc)
+        return set([title for title in titles if title in self.exists])
+
+def _measure(title, corpus, func):
+    start = time.time()
+    for content in corpus:
+        func(content)
+    elapsed = time.time() - start
+    print '  %-32s %8.3f s, %6.1f ms/page' % (title, elapsed, elapsed * 1000 / len(corpus))
+
+def _legacy_parse(wikicontent, is_exist):
+    '''
+    The parser before single-pass tokenizer: try regexes one by one for each 
+    line, and slice the rest of line after each inline markup.
+    '''
+    buffer = ['<!-- parsed wiki page -->']
+    headings = []
+    has_p = False
+    for line in StringIO.StringIO(wikicontent):
+        line = line.rstrip('\n').rstrip('\r')
+        m = parser.wiki_heading.match(line)
+        if m is not None:
+            if has_p:
+                has_p = False
+                buffer.append('</p>')
+            if len(m.group(1))==len(m.group(3)):
+                n = len(m.group(1))
+                title = m.group(2)
+                href = parser.valid_title(title)
+                headings.append((n, title, href,))
+                buffer.append('<a name="%s"></a><h%d class="wiki-heading">%s</h%d>' % (href, n, title, n))
+            else:
+                buffer.append(line)
+            continue
+        if parser.wiki_toc.match(line) is not None or parser.wiki_hr.match(line) is not None or parser.wiki_empty.match(line) is not None:
+            if has_p:
+                has_p = False
+                buffer.append('</p>')
+            continue
+        if not has_p:
+            has_p = True
+            buffer.append('<p class="wiki-p">')
+        stack = []
+        while True:
+            m = parser.wiki_sym.search(line)
+            if m is None:
+                buffer.append(line)
+                break
+            buffer.append(line[:m.start()])
+            sym = m.group(1)
+            if sym in parser.sym_pair_dict:
+                if stack and stack[-1]==sym:
+                    stack.pop()
+                    buffer.append(parser.sym_pair_dict[sym][1])
+                else:
+                    stack.append(sym)
+                    buffer.append(parser.sym_pair_dict[sym][0])
+                line = line[m.end():]
+            elif sym=='[[':
+                end_of_link = line.find(']]', m.end())
+                link = end_of_link==(-1) and line[m.end():] or line[m.end():end_of_link]
+                holder = parser._parse_link(link)
+                if isinstance(holder, parser.LinkHolder):
+                    holder = holder.render(is_exist(holder.link))
+                buffer.append(holder)
+                if end_of_link==(-1):
+                    break
+                line = line[end_of_link+2:]
+                if not line:
+                    break
+        while stack:
+            buffer.append(parser.sym_pair_dict[stack.pop()][1])
+        buffer.append('\n')
+    if has_p:
+        buffer.append('</p>')
+    return ''.join(buffer)
+
+def _make_text(words, size, line_words):
+    '''
+    Make wiki content about size bytes with line_words words per line.
+    '''
+    marks = ['**%s**', '__%s__', '``%s``', '~~%s~~', '[[%s]]', '[[http://www.expressme.org %s]]']
+    lines = []
+    total = 0
+    while total < size:
+        L = []
+        for i in range(line_words):
+            w = random.choice(words)
+            if random.randint(0, 4)==0:
+                w = random.choice(marks) % w
+            L.append(w)
+        line = ' '.join(L)
+        if random.randint(0, 20)==0:
+            line = '== %s ==' % line
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)
+
+def _throughput(title, text, loops, func):
+    # use the best of loops to reduce noise:
+    best = None
+    for i in range(loops):
+        start = time.time()
+        func(text)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print '  %-32s %8.2f MB/s' % (title, len(text) / best / 1024.0 / 1024.0)
+
+def throughput(size_kb=512, loops=5):
+    words = integration_utils._load_words()
+    exist = lambda title: False
+    for desc, line_words in (('normal lines', 20), ('long lines', 40000)):
+        text = _make_text(words, size_kb * 1024, line_words)
+        print 'parse %d KB with %s:' % (len(text) // 1024, desc)
+        if _legacy_parse(text, exist)!=parser.parse(text, exist):
+            print 'ERROR: different output!'
+        _throughput('regex per line (before)', text, loops, lambda t: _legacy_parse(t, exist))
+        _throughput('parse()', text, loops, lambda t: parser.parse(t, exist))
+        _throughput('parse_stream()', text, loops, lambda t: [chunk for chunk in parser.parse_stream(StringIO.StringIO(t), exist)])
+
+def links(pages=20, links_per_page=200, rpc_ms=2):
+    words = integration_utils._load_words()
+    corpus, exists = _make_corpus(words, pages, links_per_page)
+    print 'parse %d pages with %d links each, %d ms per lookup:' % (pages, links_per_page, rpc_ms)
+    lookup = _Lookup(exists, rpc_ms / 1000.0)
+    _measure('is_exist per link', corpus, lambda content: parser.parse(content, lookup.is_exist))
+    print '    %d lookups' % lookup.calls
+    batch = _Lookup(exists, rpc_ms / 1000.0)
+    _measure('resolve_links per page', corpus, lambda content: parser.parse(content, resolve_links=batch.resolve_links))
+    print '    %d lookups' % batch.calls
+    for content in corpus:
+        if parser.parse(content, lookup.is_exist)!=parser.parse(content, resolve_links=batch.resolve_links):
+            print 'ERROR: different output!'
+            break
+
+if __name__ == '__main__':
+    func = links
+    args = sys.argv[1:]
+    if args and args[0] in ('links', 'throughput'):
+        func = globals()[args[0]]
+        args = args[1:]
+    func(*[int(arg) for arg in args])